@@ -1,8 +1,8 @@
-from flask import Flask, jsonify  # Import jsonify to return JSON responses
+from flask import Flask, jsonify, request  # Import jsonify to return JSON responses
 from flask_cors import CORS  # Import CORS
 import os
+import sys
 from dotenv import load_dotenv
-from pymongo import MongoClient
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -13,14 +13,20 @@ CORS(app)
 # Load environment variables
 load_dotenv()
 
-# Get the MongoDB URI from the environment variable
-mongo_uri = os.getenv("MONGO_URI")
+# Share the backend's lazily created, per-process MongoDB client (reads MONGO_URI)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from mongo import mongo
+from pagination import MongoJSONProvider, list_response
+import metrics
 
-# Initialize MongoDB client with URI
-client = MongoClient(mongo_uri)
+# Serialize ObjectId and datetime values in MongoDB documents
+app.json = MongoJSONProvider(app)
+
+# Request timing, exposed with the backend's stage metrics at /metrics
+metrics.instrument(app)
 
 # Connect to your database
-db = client.get_database("Database1")  # Explicitly set your database name
+db = mongo.database("Database1")  # Explicitly set your database name
 
 # Route for the homepage
 @app.route('/')
@@ -31,8 +37,8 @@ def home():
 @app.route('/api/users', methods=['GET'])
 def get_users():
     collection = db.Users  # Explicitly use your collection name
-    users = list(collection.find({}, {"_id": 0}))  # Exclude '_id' from response
-    return jsonify({"users": users})  # Convert the result to JSON and return it
+    # Newest first, paged on _id with ?limit=&after=; ?format=ndjson streams every user
+    return list_response(app, collection, request.args, key="users")
 
 # Route to add a new user to the database
 @app.route('/add_user')
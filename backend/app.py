@@ -1,8 +1,11 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
-from pymongo import MongoClient
 import os
+from pagination import MongoJSONProvider
+from mongo import mongo
+import metrics
+import utils  # Logs to app.log, including errors from background threads
 
 # Load environment variables
 load_dotenv()
@@ -10,17 +13,10 @@ load_dotenv()
 # Flask app initialization
 app = Flask(__name__)
 CORS(app)
+app.json = MongoJSONProvider(app)  # ObjectId/datetime in MongoDB documents
+metrics.instrument(app)  # Times requests to every blueprint; Prometheus text at /metrics
 
-# MongoDB configuration
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-client = None
-try:
-    client = MongoClient(MONGO_URI)
-    client.server_info()  # Validate the connection
-    print("Connected to MongoDB successfully.")
-except Exception as e:
-    print(f"Failed to connect to MongoDB: {e}")
-    client = None
+# MongoDB: blueprints share one lazily created client from mongo.py
 
 # Import Blueprints
 from module8 import module8_bp  # Import module 8 blueprint
@@ -30,6 +26,10 @@ from module9 import module9_bp  # Import module 9 blueprint
 app.register_blueprint(module8_bp, url_prefix='/api/module8')
 app.register_blueprint(module9_bp, url_prefix='/api/module9')
 
+# Create the indexes the blueprints and models declared, without holding up startup
+import models  # Declares the dataimport indexes
+mongo.ensure_indexes_in_background()
+
 # Root Route
 @app.route('/')
 def home():
@@ -0,0 +1,129 @@
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import DESCENDING, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLogger:
+    """
+    Write-behind log of dataset operations.
+    Each operation records its log entry and new status in one call. Entries
+    are buffered and appended to a separate log collection, and status
+    changes (coalesced to the latest per dataset) are applied to the dataset
+    records, both with one bulk_write per flush. A background thread flushes
+    every flush_interval seconds or as soon as max_buffer entries are
+    waiting; anything left is flushed at interpreter exit.
+    """
+
+    def __init__(self, records, entries, flush_interval=1.0, max_buffer=1000):
+        self.records = records
+        self.entries = entries
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._pending = []  # Log entries not yet written
+        self._statuses = {}  # file_id -> latest unwritten status fields
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='audit-log', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def record(self, file_id, action, details, status=None):
+        """Queue a log entry for file_id, and its new status if the operation changed it."""
+        now = datetime.now()
+        entry = {"_id": ObjectId(), "file_id": file_id, "action": action, "details": details, "timestamp": now}
+        if status is not None:
+            entry["status"] = status
+        with self._lock:
+            self._pending.append(entry)
+            if status is not None:
+                self._statuses[file_id] = {"status": status, "last_updated": now}
+            full = len(self._pending) >= self.max_buffer
+        if full:
+            self._wakeup.set()
+        if self._thread is None:
+            self.flush()
+
+    def pending_status(self, file_id):
+        """Status fields recorded for file_id but not yet written to its record."""
+        with self._lock:
+            return dict(self._statuses.get(file_id, {}))
+
+    def flush(self):
+        """Write everything buffered so far with one bulk_write per collection."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                statuses, self._statuses = self._statuses, {}
+            if pending:
+                try:
+                    self.entries.bulk_write([InsertOne(entry) for entry in pending], ordered=True)
+                except Exception as e:
+                    logger.exception("Failed to flush audit log")
+                    # Ordered inserts stop at the first failure; keep the rest for the next flush
+                    inserted = e.details.get("nInserted", 0) if isinstance(e, BulkWriteError) else 0
+                    with self._lock:
+                        self._pending[:0] = pending[inserted:]
+            if statuses:
+                try:
+                    self.records.bulk_write(
+                        [UpdateOne({"file_id": file_id}, {"$set": fields}) for file_id, fields in statuses.items()],
+                        ordered=False
+                    )
+                except Exception:
+                    logger.exception("Failed to flush dataset statuses")
+                    with self._lock:
+                        for file_id, fields in statuses.items():
+                            self._statuses.setdefault(file_id, fields)  # A newer status wins
+
+    def tail(self, file_id, limit=20, before=None):
+        """
+        Newest log entries for file_id, at most `limit`, older than the entry
+        id `before` when given. Returns (entries, id to pass as `before` for
+        the next page or None).
+        """
+        query = {"file_id": file_id}
+        if before is not None:
+            query["_id"] = {"$lt": ObjectId(before)}
+        # Hold off a flush in progress so no entry is between the buffer and the collection
+        with self._flush_lock:
+            with self._lock:
+                buffered = [
+                    entry for entry in self._pending
+                    if entry["file_id"] == file_id and (before is None or entry["_id"] < ObjectId(before))
+                ]
+            stored = list(self.entries.find(query, {"file_id": 0}).sort("_id", DESCENDING).limit(limit + 1))
+        seen = {entry["_id"] for entry in stored}
+        merged = sorted(
+            stored + [{k: v for k, v in entry.items() if k != "file_id"} for entry in buffered if entry["_id"] not in seen],
+            key=lambda entry: entry["_id"], reverse=True
+        )
+        page = merged[:limit]
+        next_before = str(page[-1]["_id"]) if len(merged) > limit else None
+        return [dict(entry, _id=str(entry["_id"])) for entry in page], next_before
+
+    def close(self):
+        """Stop the flush thread and write out whatever is still buffered."""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
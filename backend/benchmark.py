@@ -0,0 +1,319 @@
+"""
+Benchmark the ingest and cleaning endpoints.
+
+Synthetic datasets of each size tier are pushed through the real Flask
+blueprints with the test client, against mongomock (the default) or a
+MongoDB server given with --mongo-uri. For every endpoint and tier the
+run reports throughput, p50/p99 latency and peak RSS, and writes the
+results as JSON so runs can be compared:
+
+    python benchmark.py --tiers small medium --repeat 5 --output before.json
+    python benchmark.py --tiers small medium --repeat 5 --baseline before.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Optional: better RSS readings off Linux, and the in-process Mongo stand-in
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import mongomock
+    import mongomock.collection
+except ImportError:
+    mongomock = None
+
+# Rows per size tier
+TIERS = {'small': 1000, 'medium': 50000, 'large': 500000}
+
+# Endpoints in the order each repetition calls them; module9 ops run on the dataset just imported
+MODULE8_UPLOAD = 'module8_upload'
+MODULE9_ENDPOINTS = ['import', 'remove_duplicates', 'fill_missing', 'normalize', 'detect_outliers', 'export']
+MODULE9_PREFIX = '/api/module9/api/module9'
+
+CATEGORY_LEVELS = 8
+RSS_SAMPLE_INTERVAL = 0.005  # Seconds between RSS samples while a request runs
+
+
+def generate_dataset(rows, cols=8, null_ratio=0.05, dup_ratio=0.05, outlier_ratio=0.01, seed=0):
+    """
+    A synthetic dataset in the shape the ingest path expects: Series_reference
+    and Period columns followed by `cols` data columns, about a quarter of them
+    categorical and the rest numeric.
+    - null_ratio: share of data cells left empty
+    - dup_ratio: share of rows that are exact copies of another row
+    - outlier_ratio: share of numeric cells pushed 10-50 standard deviations out
+    """
+    rng = np.random.default_rng(seed)
+    data = {
+        "Series_reference": [f"BENCH.{seed}.{i:08d}" for i in range(rows)],
+        "Period": [f"{2000 + (i // 12) % 100}.{i % 12 + 1:02d}" for i in range(rows)],
+    }
+    for c in range(cols):
+        if c % 4 == 3:
+            levels = np.array([f"level_{k}" for k in range(CATEGORY_LEVELS)], dtype=object)
+            column = levels[rng.integers(0, CATEGORY_LEVELS, rows)]
+        else:
+            column = rng.normal(100.0, 15.0, rows).round(3).astype(object)
+            outliers = rng.random(rows) < outlier_ratio
+            column[outliers] = (100.0 + rng.choice([-1, 1], outliers.sum()) * rng.uniform(10, 50, outliers.sum()) * 15.0).round(3)
+        column[rng.random(rows) < null_ratio] = None
+        data[f"{'category' if c % 4 == 3 else 'value'}_{c}"] = column
+    frame = pd.DataFrame(data)
+    duplicates = int(rows * dup_ratio)
+    if duplicates and rows > 1:
+        targets = rng.choice(np.arange(1, rows), duplicates, replace=False)
+        frame.iloc[targets] = frame.iloc[rng.integers(0, targets.min(), duplicates)].to_numpy()
+    return frame
+
+
+def dataset_csv(frame):
+    return frame.to_csv(index=False).encode()
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None when it cannot be read."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+class PeakRss:
+    """Samples RSS on a background thread for the duration of a with block."""
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss()
+        if rss is not None:
+            self.peak = rss if self.peak is None else max(self.peak, rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        if self.peak is None:
+            # No live reading here: fall back to the lifetime peak (kilobytes on Linux)
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return False
+
+
+def use_mongomock(mongo):
+    """Point the shared client factory at an in-process mongomock client."""
+    if mongomock is None:
+        raise SystemExit("mongomock is not installed; pip install -r requirements-dev.txt or pass --mongo-uri.")
+    # pymongo 4.9+ passes `sort` to the bulk builder, which mongomock 4.x does not accept yet
+    for name in ('add_update', 'add_replace', 'add_delete'):
+        method = getattr(mongomock.collection.BulkOperationBuilder, name)
+        setattr(mongomock.collection.BulkOperationBuilder, name,
+                (lambda method: lambda self, *args, sort=None, **kwargs: method(self, *args, **kwargs))(method))
+    mongo.client_class = mongomock.MongoClient
+    mongo.uri = "mongodb://localhost:27017/"  # mongomock would resolve a mongodb+srv:// URI from .env
+
+
+class Recorder:
+    """Collects one sample per request and summarizes them per (endpoint, tier)."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def timed(self, endpoint, tier, rows, size, call):
+        with PeakRss() as rss:
+            started = time.perf_counter()
+            response = call()
+            elapsed = time.perf_counter() - started
+        self.samples.setdefault((endpoint, tier), []).append({
+            "seconds": elapsed, "rows": rows, "bytes": size,
+            "peak_rss": rss.peak, "status_code": response.status_code
+        })
+        return response
+
+    def summary(self):
+        results = []
+        for (endpoint, tier), samples in self.samples.items():
+            seconds = np.array([s["seconds"] for s in samples])
+            ok = [s for s in samples if s["status_code"] < 400]
+            median = float(np.median(seconds))
+            rows, size = samples[0]["rows"], samples[0]["bytes"]
+            results.append({
+                "endpoint": endpoint,
+                "tier": tier,
+                "rows": rows,
+                "bytes": size,
+                "runs": len(samples),
+                "errors": len(samples) - len(ok),
+                "p50_ms": round(median * 1000, 3),
+                "p99_ms": round(float(np.percentile(seconds, 99)) * 1000, 3),
+                "mean_ms": round(float(seconds.mean()) * 1000, 3),
+                "rows_per_second": round(rows / median, 1) if median else None,
+                "mb_per_second": round(size / median / 1e6, 3) if median and size else None,
+                "peak_rss_mb": round(max(s["peak_rss"] for s in samples) / 1e6, 1),
+            })
+        return results
+
+
+def run_tier(recorder, clients, tier, rows, args, repetition):
+    backend, module8_client = clients
+    frame = generate_dataset(rows, args.cols, args.null_ratio, args.dup_ratio, args.outlier_ratio,
+                             seed=args.seed + repetition)  # A new seed per run, so uploads are never content duplicates
+    payload = dataset_csv(frame)
+    size = len(payload)
+
+    def upload(client, url, name):
+        return client.post(url, data={'file': (io.BytesIO(payload), name)}, content_type='multipart/form-data')
+
+    name = f'bench_{tier}_{repetition}.csv'
+    response = recorder.timed(MODULE8_UPLOAD, tier, rows, size,
+                              lambda: upload(module8_client, '/api/data/upload', name))
+    check(response, MODULE8_UPLOAD)
+
+    response = recorder.timed('import', tier, rows, size,
+                              lambda: upload(backend, MODULE9_PREFIX + '/import', name))
+    file_id = check(response, 'import').get("file_id")
+    if file_id is None:
+        return  # Nothing to clean
+    bodies = {
+        'remove_duplicates': {"file_id": file_id},
+        'fill_missing': {"file_id": file_id, "strategy": "mean"},
+        'normalize': {"file_id": file_id},
+        'detect_outliers': {"file_id": file_id, "method": "zscore"},
+        'export': {"file_id": file_id},
+    }
+    for endpoint in MODULE9_ENDPOINTS[1:]:
+        response = recorder.timed(endpoint, tier, rows, size,
+                                  lambda: backend.post(f'{MODULE9_PREFIX}/{endpoint}', json=bodies[endpoint]))
+        check(response, endpoint)
+
+
+def check(response, endpoint):
+    body = response.get_json(silent=True) or {}
+    if response.status_code >= 400:
+        print(f"{endpoint} failed with {response.status_code}: {body.get('message')}", file=sys.stderr)
+    return body
+
+
+def compare(results, baseline_path):
+    """Print p50 and throughput changes against an earlier results file."""
+    with open(baseline_path) as f:
+        baseline = {(r["endpoint"], r["tier"]): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        before = baseline.get((result["endpoint"], result["tier"]))
+        if before is None or not before["p50_ms"]:
+            continue
+        change = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100
+        print(f"  {result['endpoint']:<18} {result['tier']:<7} p50 {before['p50_ms']:>10.1f} -> "
+              f"{result['p50_ms']:>10.1f} ms ({change:+.1f}%)")
+
+
+def print_table(results):
+    print(f"{'endpoint':<18} {'tier':<7} {'rows':>8} {'p50 ms':>10} {'p99 ms':>10} {'rows/s':>12} {'peak MB':>9} {'errors':>6}")
+    for r in results:
+        print(f"{r['endpoint']:<18} {r['tier']:<7} {r['rows']:>8} {r['p50_ms']:>10.1f} {r['p99_ms']:>10.1f} "
+              f"{r['rows_per_second'] or 0:>12.0f} {r['peak_rss_mb']:>9.1f} {r['errors']:>6}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tiers', nargs='+', choices=list(TIERS), default=['small', 'medium'])
+    parser.add_argument('--rows', type=int, help="Run a single custom tier of this many rows instead")
+    parser.add_argument('--cols', type=int, default=8, help="Data columns besides Series_reference and Period")
+    parser.add_argument('--null-ratio', type=float, default=0.05)
+    parser.add_argument('--dup-ratio', type=float, default=0.05)
+    parser.add_argument('--outlier-ratio', type=float, default=0.01)
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per endpoint and tier")
+    parser.add_argument('--warmup', type=int, default=1, help="Untimed runs per tier before measuring")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mongo-uri', help="Benchmark against this MongoDB server instead of mongomock")
+    parser.add_argument('--workdir', help="Where uploads and working copies go; a temporary directory by default")
+    parser.add_argument('--output', help="Results file; benchmark-<timestamp>.json by default")
+    parser.add_argument('--baseline', help="Earlier results file to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    started_at = datetime.now()
+    output = os.path.abspath(args.output or f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json")
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    if args.mongo_uri:
+        os.environ["MONGO_URI"] = args.mongo_uri
+
+    # The blueprints write uploads relative to the working directory
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(args.workdir or tempfile.mkdtemp(prefix='dataclean-bench-'))
+    os.makedirs('uploads', exist_ok=True)
+
+    from mongo import mongo
+    if not args.mongo_uri:
+        use_mongomock(mongo)
+    import app as backend_app
+    import module8
+    clients = (backend_app.app.test_client(), module8.app.test_client())
+
+    tiers = {'custom': args.rows} if args.rows else {tier: TIERS[tier] for tier in args.tiers}
+    recorder = Recorder()
+    for tier, rows in tiers.items():
+        print(f"{tier}: {rows} rows x {args.cols + 2} columns")
+        for repetition in range(args.warmup):
+            run_tier(Recorder(), clients, tier, rows, args, args.repeat + repetition)
+        for repetition in range(args.repeat):
+            run_tier(recorder, clients, tier, rows, args, repetition)
+
+    results = recorder.summary()
+    report = {
+        "started_at": started_at.isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "mongo": args.mongo_uri or "mongomock",
+            "cpu_count": os.cpu_count(),
+        },
+        "parameters": {k: v for k, v in vars(args).items() if k not in ('output', 'baseline', 'workdir')},
+        "results": results,
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print_table(results)
+    print(f"\nResults written to {output}")
+    if baseline:
+        compare(results, baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+import column_profile
+import outliers
+import versions
+from dedup import dedup_in_memory, validate_options
+
+
+class FrameStats:
+    """
+    Memoized per-column statistics for the current state of a DataFrame.
+    Pipeline steps share one instance so mean/std/median/mode are computed
+    once and carried forward across steps that do not invalidate them.
+    With a persisted column profile, mean/std/count are read from it instead
+    of scanning the frame, and each step keeps the profile up to date.
+    """
+
+    def __init__(self, data, profile=None):
+        self.profile = profile
+        self.reset(data)
+
+    def reset(self, data):
+        """Point at a new frame and forget everything computed so far."""
+        self.data = data
+        self._values = {}
+        if self.profile is not None:
+            columns = self.numeric_columns()
+            known = column_profile.known_moments(self.profile, columns)
+            if known is not None:
+                counts = {col: column_profile.find_column(self.profile, col)["count"] for col in columns}
+                self._values = {"mean": known[0], "std": known[1], "count": pd.Series(counts, dtype=float)}
+
+    def numeric_columns(self):
+        return self.data.select_dtypes(include=['number']).columns
+
+    def get(self, name):
+        if name not in self._values:
+            numeric = self.data[self.numeric_columns()]
+            if name == 'mean':
+                self._values[name] = numeric.mean()
+            elif name == 'std':
+                self._values[name] = numeric.std()
+            elif name == 'median':
+                self._values[name] = numeric.median()
+            elif name == 'count':
+                self._values[name] = numeric.count()
+            elif name == 'mode':
+                self._values[name] = self.data.mode().iloc[0]
+            else:
+                raise ValueError(f"Unknown statistic: {name}")
+        return self._values[name]
+
+    def update(self, data, **known):
+        """Move to a new frame whose statistics are already known, without rescanning it."""
+        self.data = data
+        self._values = dict(known)
+
+
+# Mutating operations take a deltas list and append the change they made
+# to it, from which the dataset's versions are stored (see versions.py).
+
+def remove_duplicates(data, stats=None, subset=None, keep='first', deltas=None):
+    original = data
+    data, dropped = dedup_in_memory(data, subset, keep)
+    if deltas is not None:
+        deltas.append(versions.drop_delta(dropped, len(original)))
+    if stats is not None:
+        if stats.profile is not None:
+            column_profile.apply_dedup(stats.profile, original.iloc[dropped], subset is None and keep is not False)
+        stats.reset(data)
+    return data, {"duplicates_removed": len(dropped)}
+
+
+def fill_missing(data, strategy='mean', stats=None, deltas=None):
+    stats = stats or FrameStats(data)
+    if strategy not in ('mean', 'median', 'mode'):
+        raise ValueError("Invalid strategy.")
+
+    # mean and median only apply to numeric columns; mode covers every column
+    fill_values = stats.get(strategy)
+    if deltas is not None:
+        filled = fill_values.dropna()
+        deltas.append(versions.patch_delta(versions.null_positions(data, filled.index), filled))
+    data = data.fillna(fill_values)
+    if stats.profile is not None:
+        column_profile.apply_fill(stats.profile, fill_values, strategy)
+
+    if strategy == 'mean':
+        # Filling with the mean keeps the mean, and the new std follows from
+        # the old one: var_new = var_old * (n - 1) / (N - 1).
+        mean, std, count = stats.get('mean'), stats.get('std'), stats.get('count')
+        total = len(data)
+        scale = np.sqrt((count - 1) / (total - 1)) if total > 1 else 1.0
+        stats.update(data, mean=mean, std=std * scale, count=count.where(count == 0, total))
+    else:
+        stats.reset(data)
+    return data, {"strategy": strategy}
+
+
+def normalize(data, stats=None, deltas=None):
+    stats = stats or FrameStats(data)
+    numeric_columns = stats.numeric_columns()
+    mean, std = stats.get('mean'), stats.get('std')
+    if deltas is not None:
+        deltas.append(versions.affine_delta(mean.reindex(numeric_columns), std.reindex(numeric_columns)))
+    data = data.copy()
+    data[numeric_columns] = (data[numeric_columns] - mean) / std
+    if stats.profile is not None:
+        column_profile.apply_normalize(stats.profile, mean, std)
+    # Normalized columns have mean 0 and std 1 (NaN where std was 0)
+    stats.update(data, mean=(mean - mean) / std, std=std / std)
+    return data, {"normalized_columns": list(numeric_columns)}
+
+
+def detect_outliers(data, stats=None, method='zscore', threshold=None, output='counts', max_indices=1000):
+    """Flag outliers in all numeric columns at once; see outliers.detect."""
+    mean = std = None
+    if method == 'zscore':
+        stats = stats or FrameStats(data)
+        mean, std = stats.get('mean'), stats.get('std')
+    return data, outliers.detect(data, method, threshold, output, max_indices, mean=mean, std=std)
+
+
+# Pipeline operations: name -> (function, mutates the dataset, progress status)
+OPERATIONS = {
+    "remove_duplicates": (remove_duplicates, True, "Duplicates Removed"),
+    "fill_missing": (fill_missing, True, "Missing Data Filled"),
+    "normalize": (normalize, True, "Data Normalized"),
+    "detect_outliers": (detect_outliers, False, "Outliers Detected"),
+}
+
+# Parameters each operation accepts in a pipeline step
+PARAMETERS = {
+    "remove_duplicates": {"subset", "keep"},
+    "fill_missing": {"strategy"},
+    "normalize": set(),
+    "detect_outliers": {"method", "threshold", "output"},
+}
+
+
+def _uses_moments(op, params):
+    """Whether a step computes (and so can share) the mean and std."""
+    return op == 'normalize' or op == 'detect_outliers' and params.get('method', 'zscore') == 'zscore'
+
+
+def build_plan(steps):
+    """
+    Validate an ordered list of {"op": ..., **params} steps and return the plan to run.
+    Repeated steps that cannot change the result (a second dedup, a second
+    normalize) are dropped, and each planned step notes which statistics it
+    can reuse from an earlier step.
+    """
+    if not isinstance(steps, list) or not steps:
+        raise ValueError("Pipeline steps must be a non-empty list.")
+
+    plan = []
+    for step in steps:
+        if not isinstance(step, dict) or step.get('op') not in OPERATIONS:
+            raise ValueError(f"Invalid pipeline step: {step}")
+        op = step['op']
+        params = {k: v for k, v in step.items() if k != 'op'}
+        unknown = set(params) - PARAMETERS[op]
+        if unknown:
+            raise ValueError(f"Unknown parameters for {op}: {sorted(unknown)}")
+        if op == 'fill_missing' and params.get('strategy', 'mean') not in ('mean', 'median', 'mode'):
+            raise ValueError("Invalid strategy.")
+        if op == 'remove_duplicates':
+            subset = validate_options(None, params.get('subset'), params.get('keep', 'first'))
+            if subset is not None:
+                params['subset'] = subset
+        if op == 'detect_outliers':
+            outliers.validate_options(params.get('method', 'zscore'), params.get('threshold'), params.get('output', 'counts'))
+
+        previous = plan[-1] if plan else None
+        if previous and previous['op'] == op and previous['params'] == params and op in ('remove_duplicates', 'normalize'):
+            previous['fused'].append(op)
+            continue
+
+        reuses = []
+        if previous and _uses_moments(op, params):
+            if previous['op'] == 'fill_missing' and previous['params'].get('strategy', 'mean') == 'mean':
+                reuses = ['mean', 'std']
+            elif _uses_moments(previous['op'], previous['params']):
+                reuses = ['mean', 'std']
+        plan.append({"op": op, "params": params, "reuses_stats": reuses, "fused": []})
+    return plan
+
+
+def run_plan(data, plan, profile=None, deltas=None):
+    """Run a plan against one loaded frame, timing every step and collecting the deltas of mutating ones."""
+    stats = FrameStats(data, profile)
+    results = []
+    for step in plan:
+        func, mutates, _ = OPERATIONS[step['op']]
+        params = dict(step['params'], deltas=deltas) if mutates else step['params']
+        started = time.perf_counter()
+        data, details = func(data, stats=stats, **params)
+        results.append({
+            "op": step['op'],
+            "details": details,
+            "seconds": round(time.perf_counter() - started, 6)
+        })
+    return data, results
@@ -0,0 +1,203 @@
+import math
+
+import pandas as pd
+
+from dataset_cache import iter_chunks
+from stats import RunningMoments
+
+# Fields of a column profile entry that only apply to numeric columns
+NUMERIC_FIELDS = ('mean', 'std', 'min', 'max')
+
+
+def _number(value):
+    """Plain Python number for MongoDB/JSON; NaN and missing become None."""
+    if value is None:
+        return None
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def build_profile(data):
+    """
+    Per-column profile of a loaded frame: dtype, non-null and null counts,
+    distinct count and, for numeric columns, mean/std/min/max.
+    Columns are kept in a list because CSV headers may not be valid MongoDB keys.
+    """
+    numeric = set(data.select_dtypes(include=['number']).columns)
+    counts = data.count()
+    distinct = data.nunique()
+    columns = []
+    for col in data.columns:
+        entry = {
+            "name": str(col),
+            "dtype": str(data[col].dtype),
+            "numeric": col in numeric,
+            "count": int(counts[col]),
+            "null_count": int(len(data) - counts[col]),
+            "distinct_count": int(distinct[col]),
+        }
+        for field in NUMERIC_FIELDS:
+            entry[field] = _number(getattr(data[col], field)()) if col in numeric else None
+        columns.append(entry)
+    return {"row_count": len(data), "columns": columns}
+
+
+def build_profile_streaming(path, chunk_rows=None):
+    """
+    Profile a dataset file chunk by chunk without loading it.
+    Distinct counts need every value, so they are left unknown (None).
+    """
+    moments = RunningMoments()
+    profile = None
+    for chunk in iter_chunks(path, chunk_rows):
+        if profile is None:
+            profile = build_profile(chunk.iloc[:0])
+            numeric_columns = [entry["name"] for entry in profile["columns"] if entry["numeric"]]
+            mins = chunk[numeric_columns].min()
+            maxs = chunk[numeric_columns].max()
+        profile["row_count"] += len(chunk)
+        counts = chunk.count()
+        for entry in profile["columns"]:
+            entry["count"] += int(counts[entry["name"]])
+            entry["null_count"] += int(len(chunk) - counts[entry["name"]])
+        moments.update(chunk[numeric_columns])
+        mins = mins.combine(chunk[numeric_columns].min(), min)
+        maxs = maxs.combine(chunk[numeric_columns].max(), max)
+    if profile is None:
+        return {"row_count": 0, "columns": []}
+    means, stds = moments.means(), moments.stds()
+    for entry in profile["columns"]:
+        entry["distinct_count"] = None
+        if entry["numeric"]:
+            name = entry["name"]
+            entry.update(mean=_number(means[name]), std=_number(stds[name]),
+                         min=_number(mins[name]), max=_number(maxs[name]))
+    return profile
+
+
+def find_column(profile, name):
+    for entry in profile["columns"]:
+        if entry["name"] == str(name):
+            return entry
+    return None
+
+
+def known_moments(profile, columns):
+    """
+    Mean and std Series for the given numeric columns, or None if the
+    profile does not know them all; used to seed cleaning.FrameStats.
+    """
+    means, stds = {}, {}
+    for col in columns:
+        entry = find_column(profile, col)
+        if entry is None or entry["count"] > 1 and (entry["mean"] is None or entry["std"] is None):
+            return None
+        means[col] = entry["mean"] if entry["mean"] is not None else float('nan')
+        stds[col] = entry["std"] if entry["std"] is not None else float('nan')
+    return pd.Series(means, dtype=float), pd.Series(stds, dtype=float)
+
+
+def _merge_moments(entry, count, mean, m2):
+    """Fold a group of `count` values with the given mean and M2 into a numeric entry."""
+    n = entry["count"]
+    if n and (entry["mean"] is None or n > 1 and entry["std"] is None):
+        return  # Moments already unknown
+    old_m2 = (entry["std"] ** 2) * (n - 1) if n > 1 else 0.0
+    old_mean = entry["mean"] if n else 0.0
+    total = n + count
+    if total <= 0:
+        entry.update(mean=None, std=None)
+        return
+    delta = mean - old_mean
+    new_mean = old_mean + delta * count / total
+    new_m2 = old_m2 + m2 + delta ** 2 * n * count / total
+    entry.update(
+        mean=_number(new_mean),
+        std=_number(math.sqrt(max(new_m2, 0.0) / (total - 1))) if total > 1 else None
+    )
+
+
+def apply_dedup(profile, dropped, full_rows=True):
+    """
+    Remove the contribution of dropped duplicate rows.
+    When whole rows were compared and one copy kept (full_rows), every
+    distinct value and extreme survives; otherwise those become unknown.
+    """
+    profile["row_count"] -= len(dropped)
+    counts = dropped.count()
+    for entry in profile["columns"]:
+        values = dropped[entry["name"]]
+        removed = int(counts[entry["name"]])
+        n = entry["count"]
+        if entry["numeric"] and removed and (entry["mean"] is None or n > 1 and entry["std"] is None):
+            entry.update(mean=None, std=None)  # Moments already unknown
+        elif entry["numeric"] and removed:
+            # Removing a group is the pairwise merge run backwards
+            mean = float(values.mean())
+            m2 = float(((values - mean) ** 2).sum())
+            remaining = n - removed
+            if remaining > 0:
+                remaining_mean = (n * entry["mean"] - removed * mean) / remaining
+                old_m2 = (entry["std"] ** 2) * (n - 1) if n > 1 else 0.0
+                delta = mean - remaining_mean
+                new_m2 = old_m2 - m2 - delta ** 2 * remaining * removed / n
+                entry.update(
+                    mean=_number(remaining_mean),
+                    std=_number(math.sqrt(max(new_m2, 0.0) / (remaining - 1))) if remaining > 1 else None
+                )
+            else:
+                entry.update(mean=None, std=None)
+        entry["count"] -= removed
+        entry["null_count"] -= len(dropped) - removed
+        if not full_rows:
+            entry["distinct_count"] = None
+            if entry["numeric"]:
+                entry.update(min=None, max=None)
+    return profile
+
+
+def apply_fill(profile, fill_values, strategy):
+    """Account for missing values replaced by a constant per column."""
+    for col, value in fill_values.items():
+        entry = find_column(profile, col)
+        if entry is None or not entry["null_count"] or pd.isna(value):
+            continue
+        filled = entry["null_count"]
+        if entry["numeric"]:
+            value = float(value)
+            _merge_moments(entry, filled, value, 0.0)
+            if entry["count"] == 0:
+                entry.update(min=value, max=value)
+            elif entry["min"] is not None:
+                entry.update(min=min(entry["min"], value), max=max(entry["max"], value))
+        if entry["count"] == 0:
+            entry["distinct_count"] = 1
+        elif strategy != 'mode':
+            # A mean or median may or may not already occur in the column
+            entry["distinct_count"] = None
+        entry["count"] += filled
+        entry["null_count"] = 0
+    return profile
+
+
+def apply_normalize(profile, mean, std):
+    """
+    Account for (x - mean) / std applied per column: normalized columns have
+    mean 0 and std 1, and a zero-variance column becomes all NaN.
+    """
+    for col in mean.index:
+        entry = find_column(profile, col)
+        if entry is None:
+            continue
+        entry["dtype"] = 'float64'
+        col_mean, col_std = _number(mean[col]), _number(std[col])
+        if col_std:
+            entry.update(
+                mean=0.0, std=1.0,
+                min=_number((entry["min"] - col_mean) / col_std) if entry["min"] is not None else None,
+                max=_number((entry["max"] - col_mean) / col_std) if entry["max"] is not None else None
+            )
+        else:
+            entry.update(mean=None, std=None, min=None, max=None, distinct_count=0,
+                         null_count=profile["row_count"], count=0)
+    return profile
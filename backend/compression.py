@@ -0,0 +1,88 @@
+import gzip
+import os
+import shutil
+import tempfile
+import zipfile
+
+# zstandard is optional: pyarrow (already used for working copies) can decode zstd too
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Compressed upload extensions and the magic bytes each codec's streams start with
+CODEC_EXTENSIONS = {'.gz': 'gzip', '.gzip': 'gzip', '.zst': 'zstd', '.zstd': 'zstd', '.zip': 'zip'}
+MAGIC = {b'\x1f\x8b': 'gzip', b'\x28\xb5\x2f\xfd': 'zstd', b'PK\x03\x04': 'zip'}
+# Data formats taken at their word, never sniffed: an .xlsx file is itself a zip archive
+DATA_EXTENSIONS = ('.csv', '.json', '.ndjson', '.jsonl', '.xlsx')
+
+
+def upload_codec(filename, stream=None):
+    """
+    The codec an upload is compressed with, or None: by its extension, else
+    by its first bytes when the stream can be rewound to sniff them and the
+    extension is not a data format of its own.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    codec = CODEC_EXTENSIONS.get(extension)
+    if codec is None and extension not in DATA_EXTENSIONS and stream is not None and stream.seekable():
+        head = stream.read(4)
+        stream.seek(0)
+        codec = next((name for magic, name in MAGIC.items() if head.startswith(magic)), None)
+    return codec
+
+
+def _zip_member(archive, allowed):
+    """The one data file in a zip archive; macOS resource forks and hidden files are ignored."""
+    members = [
+        info for info in archive.infolist()
+        if not info.is_dir() and not info.filename.startswith('__MACOSX/')
+        and not os.path.basename(info.filename).startswith('.')
+    ]
+    data_files = [info for info in members if allowed(info.filename)]
+    if len(data_files) != 1:
+        raise ValueError("A zip upload must hold exactly one data file.")
+    return data_files[0]
+
+
+def _seekable(stream):
+    """The stream itself if it can seek (zip needs its central directory), else a spooled copy."""
+    if stream.seekable():
+        return stream
+    spool = tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024)
+    shutil.copyfileobj(stream, spool)
+    spool.seek(0)
+    return spool
+
+
+def open_upload(filename, stream, allowed=lambda name: True):
+    """
+    Decompressing view of an upload: (name of the data inside, readable
+    binary stream). gzip and zstd are decoded block by block as the caller
+    reads, so the data goes straight on to storage and parsing without the
+    compressed file ever being kept. Uncompressed uploads pass through.
+    allowed checks the inner file name (e.g. the accepted formats).
+    """
+    codec = upload_codec(filename, stream)
+    if codec is None:
+        return filename, stream
+    if codec == 'zip':
+        archive = zipfile.ZipFile(_seekable(stream))
+        member = _zip_member(archive, allowed)
+        return os.path.basename(member.filename), archive.open(member)
+
+    inner = filename
+    if os.path.splitext(filename)[1].lower() in CODEC_EXTENSIONS:
+        inner = os.path.splitext(filename)[0]
+    if codec == 'gzip':
+        return inner, gzip.GzipFile(fileobj=stream, mode='rb')
+    if zstandard is not None:
+        return inner, zstandard.ZstdDecompressor().stream_reader(stream)
+    if pa is not None and pa.Codec.is_available('zstd'):
+        return inner, pa.CompressedInputStream(pa.PythonFile(stream, mode='r'), 'zstd')
+    raise ValueError("zstd uploads need the zstandard package (or pyarrow) installed.")
@@ -6,3 +6,35 @@ load_dotenv()
 class Config:
     MONGO_URI = os.getenv("MONGO_URI", "mongodb+srv://Ummara:<ummara7860>@datacleanai.oxc3l.mongodb.net/datafiles?retryWrites=true&w=majority&appName=DataCleanAI")
     UPLOAD_FOLDER = './uploads'  # Folder for locally saved uploads
+    DATASET_CACHE_MAX_BYTES = int(os.getenv("DATASET_CACHE_MAX_BYTES", 1024 * 1024 * 1024))  # In-memory DataFrame cache budget
+    CHUNK_ROWS = int(os.getenv("CHUNK_ROWS", 100000))  # Rows per chunk when streaming a dataset file
+    DEDUP_IN_MEMORY_MAX_BYTES = int(os.getenv("DEDUP_IN_MEMORY_MAX_BYTES", 512 * 1024 * 1024))  # Larger datasets are deduplicated out of core
+    DEDUP_PARTITIONS = int(os.getenv("DEDUP_PARTITIONS", 64))  # Hash partitions spilled to disk by out-of-core dedup
+    FUZZY_THRESHOLD = float(os.getenv("FUZZY_THRESHOLD", 0.7))  # 3-gram Jaccard similarity at which rows count as near duplicates
+    FUZZY_NUM_PERM = int(os.getenv("FUZZY_NUM_PERM", 64))  # MinHash signature length; longer finds candidates more reliably but costs more
+    FUZZY_MAX_BLOCK_SIZE = int(os.getenv("FUZZY_MAX_BLOCK_SIZE", 1000))  # LSH buckets larger than this are skipped rather than paired up
+    FUZZY_MAX_CANDIDATE_PAIRS = int(os.getenv("FUZZY_MAX_CANDIDATE_PAIRS", 5000000))  # Candidate pairs verified at most per request
+    IN_MEMORY_MAX_BYTES = int(os.getenv("IN_MEMORY_MAX_BYTES", 512 * 1024 * 1024))  # Larger datasets are filled/normalized/scanned in streaming passes
+    AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", 1.0))  # Seconds between write-behind audit log flushes
+    AUDIT_MAX_BUFFER = int(os.getenv("AUDIT_MAX_BUFFER", 1000))  # Buffered audit entries that trigger an early flush
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))  # Connections per process in the shared MongoDB pool
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))  # Connections kept open while idle
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))  # Timeout for opening a connection
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))  # How long an operation waits for a reachable server
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 0))  # Timeout for a reply on an open connection; 0 waits indefinitely
+    MONGO_HEALTH_TTL = float(os.getenv("MONGO_HEALTH_TTL", 30))  # Seconds a cached database health state is trusted
+    EXTERNAL_MONGO_MAX_CLIENTS = int(os.getenv("EXTERNAL_MONGO_MAX_CLIENTS", 8))  # External connection pools open at once
+    EXTERNAL_MONGO_IDLE_SECONDS = float(os.getenv("EXTERNAL_MONGO_IDLE_SECONDS", 300))  # Unused external pools are closed after this long
+    EXTERNAL_MONGO_MAX_POOL_SIZE = int(os.getenv("EXTERNAL_MONGO_MAX_POOL_SIZE", 10))  # Connections per external pool
+    SOURCE_BATCH_SIZE = int(os.getenv("SOURCE_BATCH_SIZE", 5000))  # Documents per cursor batch when importing from an external database
+    SLOW_LOG_FILE = os.getenv("SLOW_LOG_FILE", "app.log")  # Where the slow_ops logger writes
+    SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", 2.0))  # Requests slower than this are logged to the slow_ops logger
+    SLOW_STAGE_SECONDS = float(os.getenv("SLOW_STAGE_SECONDS", 1.0))  # Default threshold for logging a slow processing stage
+    SLOW_STAGE_THRESHOLDS = {  # Per-stage overrides, e.g. SLOW_STAGE_THRESHOLDS="parse=5,insert=2"
+        stage.strip(): float(seconds) for stage, seconds in
+        (item.split('=', 1) for item in os.getenv("SLOW_STAGE_THRESHOLDS", "").split(',') if '=' in item)
+    }
+    PARALLEL_WORKERS = int(os.getenv("PARALLEL_WORKERS", os.cpu_count() or 1))  # Processes for chunk-parallel fill/normalize; 1 disables
+    PARALLEL_MIN_BYTES = int(os.getenv("PARALLEL_MIN_BYTES", 256 * 1024 * 1024))  # Smaller working copies keep the single-process path
+    WORKING_COPY_COMPRESSION = os.getenv("WORKING_COPY_COMPRESSION", "lz4")  # Feather working copy codec: lz4 (fast), zstd (smaller) or none
+    VERSION_MAX_DELTAS = int(os.getenv("VERSION_MAX_DELTAS", 10))  # Versions kept as deltas before older ones are folded into the base
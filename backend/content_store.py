@@ -0,0 +1,46 @@
+import hashlib
+import os
+import tempfile
+
+# Bytes read from the upload stream per hash/write step
+BLOCK_SIZE = 1024 * 1024
+
+
+def object_path(folder, digest, extension=''):
+    """Where content with this SHA-256 digest lives: <folder>/objects/<first two hex digits>/<digest><ext>."""
+    return os.path.join(folder, 'objects', digest[:2], digest + extension)
+
+
+def store_stream(stream, folder, extension='', on_block=None):
+    """
+    Copy a stream to content-addressed storage, hashing it on the way.
+    The bytes go to a temporary file next to their destination; if content
+    with the same hash is already stored the copy is dropped, so each
+    distinct file is kept on disk once. on_block, when given, sees every
+    block too (e.g. to index rows without reading the file again).
+    Returns (sha256 hex digest, path, size in bytes, whether it was new).
+    """
+    staging = os.path.join(folder, 'objects')
+    os.makedirs(staging, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=staging, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for block in iter(lambda: stream.read(BLOCK_SIZE), b''):
+                digest.update(block)
+                out.write(block)
+                size += len(block)
+                if on_block is not None:
+                    on_block(block)
+        path = object_path(folder, digest.hexdigest(), extension)
+        if os.path.exists(path):
+            os.remove(temp_path)
+            return digest.hexdigest(), path, size, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        return digest.hexdigest(), path, size, True
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -0,0 +1,259 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+
+from config import Config
+import metrics
+from schema import apply_schema
+
+# Feather (Arrow IPC) is the preferred working copy format. It needs pyarrow,
+# so fall back to pandas' own pickle format when pyarrow is not installed.
+try:
+    import pyarrow as pa
+    WORKING_COPY_FORMAT = 'feather'
+except ImportError:
+    pa = None
+    WORKING_COPY_FORMAT = 'pickle'
+
+WORKING_COPY_EXTENSIONS = {'feather': '.feather', 'pickle': '.pkl'}
+
+
+def feather_compression():
+    """Codec for Feather working copies, or None to keep them uncompressed (and zero-copy when memory-mapped)."""
+    codec = (Config.WORKING_COPY_COMPRESSION or '').lower()
+    return None if codec in ('', 'none', 'uncompressed') else codec
+
+
+def ipc_write_options():
+    """Arrow IPC options that compress each record batch's buffers with the working copy codec."""
+    return pa.ipc.IpcWriteOptions(compression=feather_compression())
+
+
+class DatasetCache:
+    """Size-bounded LRU cache of loaded DataFrames keyed by file_id."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # file_id -> (DataFrame, size in bytes)
+        self._lock = threading.Lock()
+
+    def get(self, file_id):
+        """Return the cached DataFrame for file_id, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(file_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(file_id)
+            return entry[0]
+
+    def put(self, file_id, data):
+        """Cache a DataFrame, evicting least recently used entries to stay under max_bytes."""
+        size = int(data.memory_usage(deep=True).sum())
+        with self._lock:
+            self._discard(file_id)
+            # A frame larger than the whole budget is never cached.
+            if size > self.max_bytes:
+                return
+            while self._entries and self.current_bytes + size > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+            self._entries[file_id] = (data, size)
+            self.current_bytes += size
+
+    def invalidate(self, file_id):
+        """Drop a file_id from the cache."""
+        with self._lock:
+            self._discard(file_id)
+
+    def _discard(self, file_id):
+        entry = self._entries.pop(file_id, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+
+
+dataset_cache = DatasetCache(Config.DATASET_CACHE_MAX_BYTES)
+
+
+def working_copy_path(file_path):
+    """Path of the binary working copy kept next to an uploaded CSV."""
+    return os.path.splitext(file_path)[0] + WORKING_COPY_EXTENSIONS[WORKING_COPY_FORMAT]
+
+
+@contextmanager
+def replacing(path):
+    """
+    Yield a temporary path next to path and rename it over path once the
+    block completes. Readers see the old file or the new one, never half of
+    one, and a file shared by a hard link (a version base) is left alone.
+    """
+    base, ext = os.path.splitext(path)
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or '.', prefix=os.path.basename(base) + '.', suffix='.part' + ext
+    )
+    os.close(fd)
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def write_working_copy(data, path):
+    """Write a DataFrame to the columnar working copy format, replacing any old file atomically."""
+    # Feather needs a default RangeIndex; the CSV export never kept the index either.
+    data = data.reset_index(drop=True)
+    with replacing(path) as temp_path:
+        if path.endswith('.feather'):
+            data.to_feather(temp_path, compression=feather_compression() or 'uncompressed')
+        else:
+            data.to_pickle(temp_path)
+    return data
+
+
+def read_working_copy(path):
+    """Read a working copy written by write_working_copy; compressed Feather is decoded transparently."""
+    if path.endswith('.feather'):
+        return pd.read_feather(path)
+    return pd.read_pickle(path)
+
+
+def dataset_path(file_record):
+    """Path of the file holding the current state of a dataset."""
+    working_path = file_record.get('working_path')
+    if working_path and os.path.exists(working_path):
+        return working_path
+    return file_record['file_path']
+
+
+def can_stream(path):
+    """Whether iter_chunks can read a file without loading all of it."""
+    return path.endswith('.feather') or path.endswith('.csv')
+
+
+def iter_chunks(path, chunk_rows=None):
+    """
+    Yield a dataset file as a sequence of DataFrames.
+    Feather files are memory-mapped and read one record batch at a time;
+    CSV files are parsed chunk_rows rows at a time. Pickles are read whole.
+    """
+    chunk_rows = chunk_rows or Config.CHUNK_ROWS
+    if path.endswith('.feather'):
+        reader = pa.ipc.open_file(pa.memory_map(path))
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i).to_pandas()
+    elif path.endswith('.csv'):
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+    else:
+        yield read_working_copy(path)
+
+
+class ChunkWriter:
+    """
+    Writes DataFrame chunks to a new file in the same format as a source file.
+    The Feather schema comes from the first chunk written, since a transform
+    may change column types (normalizing turns integers into floats), unless
+    a schema is given up front (e.g. for a file built from parsed rows).
+    """
+
+    def __init__(self, path, source_path=None, schema=None):
+        self.path = path
+        self.source_path = source_path
+        self._writer = None
+        self._schema = schema
+        self._csv_header = True
+        if not (path.endswith('.feather') or path.endswith('.csv')):
+            raise ValueError(f"Cannot stream chunks to {path}")
+
+    def write(self, chunk):
+        if self.path.endswith('.feather'):
+            if self._writer is None:
+                self._schema = self._schema or self._output_schema(chunk)
+                self._writer = pa.ipc.new_file(self.path, self._schema, options=ipc_write_options())
+            self._writer.write_batch(pa.RecordBatch.from_pandas(chunk, schema=self._schema, preserve_index=False))
+        else:
+            chunk.to_csv(self.path, mode='w' if self._csv_header else 'a', header=self._csv_header, index=False)
+            self._csv_header = False
+
+    def _output_schema(self, chunk):
+        schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+        if self.source_path is None:
+            return schema
+        source = pa.ipc.open_file(pa.memory_map(self.source_path)).schema
+        # A column that is all null in the first chunk has no type of its own yet
+        for i, field in enumerate(schema):
+            if pa.types.is_null(field.type) and field.name in source.names:
+                schema = schema.set(i, source.field(field.name))
+        return schema
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        elif self.path.endswith('.feather'):
+            # No chunks written: keep the given or source schema with zero rows
+            schema = self._schema or pa.ipc.open_file(pa.memory_map(self.source_path)).schema
+            pa.ipc.new_file(self.path, schema, options=ipc_write_options()).close()
+        elif self._csv_header:
+            open(self.path, 'w').close()
+
+
+def should_stream(file_record, max_bytes):
+    """Whether an op should stream the dataset file from disk rather than load it into memory."""
+    if dataset_cache.get(file_record['file_id']) is not None:
+        return False
+    path = dataset_path(file_record)
+    return can_stream(path) and os.path.getsize(path) > max_bytes
+
+
+def replace_dataset_file(file_record, new_path):
+    """Swap a streamed rewrite into place as the dataset's current file."""
+    os.replace(new_path, dataset_path(file_record))
+    dataset_cache.invalidate(file_record['file_id'])
+
+
+def load_dataset(file_record, copy=True):
+    """
+    Load the DataFrame for a module9 file record.
+    Looks in the in-memory cache first, then the working copy, and only parses
+    the original CSV for records imported before working copies existed.
+    Pass copy=False for read-only access to the cached frame.
+    """
+    file_id = file_record['file_id']
+    data = dataset_cache.get(file_id)
+    if data is None:
+        path = dataset_path(file_record)
+        with metrics.span('load', size=os.path.getsize(path)) as span:
+            if path != file_record['file_path']:
+                data = read_working_copy(path)
+            elif file_record.get('schema'):
+                # Parse as text and apply the schema recorded at import
+                data = apply_schema(pd.read_csv(path, dtype=str), file_record['schema'])
+            else:
+                data = pd.read_csv(path)
+            span.rows = len(data)
+        dataset_cache.put(file_id, data)
+    return data.copy() if copy else data
+
+
+def save_dataset(file_record, data):
+    """Persist a transformed DataFrame to the working copy and refresh the cache."""
+    working_path = file_record.get('working_path') or working_copy_path(file_record['file_path'])
+    data = write_working_copy(data, working_path)
+    file_record['working_path'] = working_path
+    dataset_cache.put(file_record['file_id'], data)
+    return data
+
+
+def export_csv(file_record, path=None):
+    """Write the current state of a dataset out as CSV, by default over (or next to) the uploaded file."""
+    path = path or os.path.splitext(file_record['file_path'])[0] + '.csv'
+    data = load_dataset(file_record, copy=False)
+    with metrics.span('write', rows=len(data)) as span:
+        with replacing(path) as temp_path:
+            data.to_csv(temp_path, index=False)
+        span.size = os.path.getsize(path)
+    return path
@@ -0,0 +1,121 @@
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Many readers or one writer. A waiting writer holds back new readers, so
+    a stream of read-only requests cannot starve a mutation.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writer or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._condition.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class DatasetExecutor:
+    """
+    Runs dataset operations under a reader/writer lock per file_id:
+    read-only ops on a dataset run side by side, mutations run one at a
+    time, and different datasets never wait on each other. Identical
+    requests (same key) that arrive while one is in flight wait for it and
+    share its result instead of repeating the work (single-flight).
+    Locks are per process; run one worker per dataset store, or put a
+    shared lock in front, when serving with several processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}  # file_id -> [ReadWriteLock, users]
+        self._flights = {}  # key -> _Flight
+
+    @contextmanager
+    def _dataset_lock(self, file_id):
+        with self._lock:
+            entry = self._locks.setdefault(file_id, [ReadWriteLock(), 0])
+            entry[1] += 1
+        try:
+            yield entry[0]
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[file_id]
+
+    def _locked(self, file_id, func, write):
+        with self._dataset_lock(file_id) as lock:
+            with lock.write() if write else lock.read():
+                return func()
+
+    def run(self, file_id, key, func, write=True):
+        """
+        Call func() under the dataset's lock, exclusive when write is set.
+        Returns (result, shared), shared being True when the result came
+        from an identical request already in flight; its error is raised
+        here too.
+        """
+        if key is None:
+            return self._locked(file_id, func, write), False
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            flight.result = self._locked(file_id, func, write)
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+dataset_executor = DatasetExecutor()
@@ -0,0 +1,144 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from dataset_cache import ChunkWriter, iter_chunks
+
+# (row hash, row position) pairs spilled to partition files
+PARTITION_DTYPE = np.dtype([('hash', '<u8'), ('row', '<i8')])
+
+KEEP_OPTIONS = ('first', 'last', False)
+
+
+def validate_options(columns, subset=None, keep='first'):
+    """Check the subset/keep options, and subset against a dataset's columns unless columns is None."""
+    if keep not in KEEP_OPTIONS:
+        raise ValueError("keep must be 'first', 'last' or false.")
+    if subset is not None:
+        if isinstance(subset, str):
+            subset = [subset]
+        if not isinstance(subset, list) or not all(isinstance(col, str) for col in subset):
+            raise ValueError("subset must be a column name or a list of column names.")
+        if columns is None:
+            return subset
+        missing = [col for col in subset if col not in columns]
+        if missing:
+            raise ValueError(f"Unknown columns: {missing}")
+    return subset
+
+
+def hash_rows(frame, subset=None):
+    """64-bit hash of every row (restricted to subset columns), ignoring the index."""
+    if subset is not None:
+        frame = frame[subset]
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+
+def duplicate_mask(hashes, keep='first'):
+    """Boolean mask of rows to drop, given row hashes in dataset order."""
+    return pd.Series(hashes).duplicated(keep=keep).to_numpy()
+
+
+def dedup_in_memory(data, subset=None, keep='first'):
+    """
+    Drop duplicate rows from a loaded frame, comparing values exactly.
+    Returns the deduplicated frame and the positions of dropped rows.
+    """
+    subset = validate_options(data.columns, subset, keep)
+    mask = data.duplicated(subset, keep=keep).to_numpy()
+    return data[~mask], np.flatnonzero(mask)
+
+
+def rows_at(path, positions, columns=None, chunk_rows=None):
+    """The rows of a dataset file at sorted positions, in one pass."""
+    picked, offset = [], 0
+    for chunk in iter_chunks(path, chunk_rows):
+        lo, hi = np.searchsorted(positions, [offset, offset + len(chunk)])
+        if lo < hi:
+            rows = chunk.iloc[positions[lo:hi] - offset]
+            picked.append(rows[columns] if columns is not None else rows)
+        offset += len(chunk)
+    return pd.concat(picked, ignore_index=True)
+
+
+def dedup_file(path, subset=None, keep='first', partitions=None, chunk_rows=None):
+    """
+    Deduplicate a dataset file that may not fit in memory.
+    Pass 1 hashes each chunk and spills (hash, row) pairs into hash
+    partitions on disk. Each partition is then small enough to search on
+    its own for rows sharing a hash. Those rows are read back and compared
+    by value, so a hash collision never drops a distinct row; this holds
+    every row that has a copy (in the compared columns) in memory at once.
+    Pass 2 streams the file again and writes the surviving rows to a new
+    file next to the original.
+    Returns (new file path, dropped row positions, total rows).
+    """
+    partitions = partitions or Config.DEDUP_PARTITIONS
+    spill_dir = tempfile.mkdtemp(prefix='dedup-', dir=os.path.dirname(path) or None)
+    try:
+        # Pass 1: hash and partition
+        total_rows = 0
+        spill_files = [open(os.path.join(spill_dir, f'{p}.bin'), 'wb') for p in range(partitions)]
+        try:
+            for chunk in iter_chunks(path, chunk_rows):
+                if total_rows == 0:
+                    subset = validate_options(chunk.columns, subset, keep)
+                pairs = np.empty(len(chunk), dtype=PARTITION_DTYPE)
+                pairs['hash'] = hash_rows(chunk, subset)
+                pairs['row'] = np.arange(total_rows, total_rows + len(chunk))
+                total_rows += len(chunk)
+
+                # Group the chunk by partition with one stable sort, keeping row order within each group
+                part = pairs['hash'] % partitions
+                order = np.argsort(part, kind='stable')
+                bounds = np.searchsorted(part[order], np.arange(partitions + 1))
+                for p in range(partitions):
+                    if bounds[p] < bounds[p + 1]:
+                        pairs[order[bounds[p]:bounds[p + 1]]].tofile(spill_files[p])
+        finally:
+            for spill in spill_files:
+                spill.close()
+
+        # Rows sharing a hash within each partition; equal rows always land in the same one
+        members = []
+        for p in range(partitions):
+            pairs = np.fromfile(os.path.join(spill_dir, f'{p}.bin'), dtype=PARTITION_DTYPE)
+            if len(pairs):
+                members.append(pairs['row'][duplicate_mask(pairs['hash'], keep=False)])
+        members = np.sort(np.concatenate(members)) if members else np.empty(0, dtype=np.int64)
+
+        # Exact duplicates are all among those rows, in the same order, so comparing their values finds them
+        dropped = np.empty(0, dtype=np.int64)
+        if len(members):
+            candidates = rows_at(path, members, subset, chunk_rows)
+            dropped = members[candidates.duplicated(keep=keep).to_numpy()]
+
+        # Pass 2: stream the surviving rows out
+        return drop_rows_file(path, dropped, chunk_rows), dropped, total_rows
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+def drop_rows_file(path, dropped, chunk_rows=None):
+    """
+    Stream a dataset file into a new file next to it without the rows at
+    the given sorted positions. Returns the new file's path.
+    """
+    base, ext = os.path.splitext(path)
+    out_path = f'{base}.dedup{ext}'
+    writer = ChunkWriter(out_path, path)
+    offset = 0
+    try:
+        for chunk in iter_chunks(path, chunk_rows):
+            lo, hi = np.searchsorted(dropped, [offset, offset + len(chunk)])
+            keep_mask = np.ones(len(chunk), dtype=bool)
+            keep_mask[dropped[lo:hi] - offset] = False
+            writer.write(chunk[keep_mask])
+            offset += len(chunk)
+    finally:
+        writer.close()
+    return out_path
@@ -0,0 +1,158 @@
+import os
+import queue
+import threading
+import time
+
+from pymongo.errors import BulkWriteError
+
+import metrics
+from readers import open_rows
+
+# Rows without these fields are skipped during ingest
+REQUIRED_FIELDS = ('Series_reference', 'Period')
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_MAX_PENDING_BATCHES = 4
+
+
+def is_valid_row(row, required_fields=REQUIRED_FIELDS):
+    """A row is valid when it is an object with every required field and no overflow columns."""
+    # JSON arrays may hold non-objects; DictReader puts surplus values under the key None, which BSON cannot store
+    if not isinstance(row, dict) or None in row:
+        return False
+    return all(field in row for field in required_fields)
+
+
+class BatchInserter:
+    """
+    Inserts batches into a collection from a background thread.
+    At most max_pending batches wait in the queue; submit() blocks once it is
+    full, so parsing never runs further ahead of MongoDB than that.
+    """
+
+    _STOP = object()
+
+    def __init__(self, collection, max_pending=DEFAULT_MAX_PENDING_BATCHES, on_batch=None):
+        self.collection = collection
+        self.on_batch = on_batch
+        self.operation = metrics.current_operation()  # Spans on the writer thread keep the caller's label
+        self.inserted = 0
+        self.error = None
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, batch):
+        if self.error is not None:
+            raise self.error
+        self._queue.put(batch)
+
+    def close(self):
+        """Wait for queued batches to be written and re-raise any insert failure."""
+        self._queue.put(self._STOP)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.inserted
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is self._STOP:
+                return
+            if self.error is not None:
+                continue  # Drain the queue so submit() never blocks forever
+            try:
+                with metrics.span('insert', rows=len(batch), operation=self.operation):
+                    try:
+                        inserted = len(self.collection.insert_many(batch, ordered=False).inserted_ids)
+                    except BulkWriteError as e:
+                        # Unordered inserts keep going past bad documents
+                        inserted = e.details.get('nInserted', 0)
+                self.inserted += inserted
+                if self.on_batch is not None:
+                    self.on_batch(inserted)
+            except Exception as e:
+                self.error = e
+
+
+def iter_valid_batches(rows, batch_size, stats, required_fields=REQUIRED_FIELDS, transform=None):
+    """
+    Group rows into lists of batch_size, counting parsed and invalid rows in
+    stats. Valid rows are passed through transform(row) when one is given.
+    Time spent validating and converting is recorded as the 'validate' stage.
+    """
+    batch = []
+    checked, validate_seconds = 0, 0.0
+    for row in rows:
+        stats['parsed_rows'] += 1
+        checked += 1
+        started = time.perf_counter()
+        if is_valid_row(row, required_fields):
+            batch.append(transform(row) if transform is not None else row)
+        else:
+            stats['invalid_rows'] += 1
+        validate_seconds += time.perf_counter() - started
+        if len(batch) >= batch_size:
+            metrics.record('validate', validate_seconds, rows=checked)
+            checked, validate_seconds = 0, 0.0
+            yield batch
+            batch = []
+    if checked:
+        metrics.record('validate', validate_seconds, rows=checked)
+    if batch:
+        yield batch
+
+
+def ingest_rows(rows, collection, batch_size=DEFAULT_BATCH_SIZE,
+                max_pending=DEFAULT_MAX_PENDING_BATCHES, on_batch=None, on_parsed=None,
+                required_fields=REQUIRED_FIELDS, transform=None):
+    """
+    Validate an iterable of row dicts and insert them in unordered batches.
+    Only one batch is built at a time plus at most max_pending waiting to be
+    written, so memory stays flat however many rows the iterable yields.
+    on_batch(inserted) is called after each batch is written and
+    on_parsed(stats) after each batch is parsed. transform(row) converts each
+    valid row before insert, e.g. a schema.row_converter.
+    """
+    stats = {'parsed_rows': 0, 'invalid_rows': 0}
+    inserter = BatchInserter(collection, max_pending=max_pending, on_batch=on_batch)
+    batches = iter_valid_batches(rows, batch_size, stats, required_fields, transform)
+    try:
+        while True:
+            # Reading and validating one batch; inserts run on the writer thread
+            with metrics.span('parse') as parse:
+                batch = next(batches, None)
+                parse.rows = len(batch) if batch is not None else None
+            if batch is None:
+                break
+            inserter.submit(batch)
+            if on_parsed is not None:
+                on_parsed(stats)
+    finally:
+        stats['row_count'] = inserter.close()
+    return stats
+
+
+def ingest_file(filepath, collection, job=None, sheet=None, **kwargs):
+    """
+    Stream a CSV, XLSX or JSON/NDJSON file into a collection; see
+    ingest_rows for the options. The reader is chosen by extension and
+    yields one row at a time, so no format is loaded whole.
+    When a background job is given, rows processed and (where the format
+    allows) bytes read are reported to it.
+    """
+    with open_rows(filepath, sheet) as (rows, bytes_read):
+        if job is not None:
+            job.update(stage="parsing", total_bytes=os.path.getsize(filepath))
+
+            def report(stats):
+                # The raw file position runs at most one read buffer ahead of the parser
+                progress = {"rows_processed": stats['parsed_rows'], "invalid_rows": stats['invalid_rows']}
+                if bytes_read is not None:
+                    progress["bytes_read"] = bytes_read()
+                job.update(**progress)
+
+            kwargs['on_parsed'] = report
+        return ingest_rows(rows, collection, **kwargs)
+
@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between progress writes to the job store for one job
+STORE_INTERVAL = 1.0
+
+
+class Job:
+    """Progress handle passed to background work so it can report rows, bytes and stage."""
+
+    def __init__(self, registry, job_id, kind, details):
+        self.registry = registry
+        self.state = {
+            "job_id": job_id,
+            "kind": kind,
+            "details": details,
+            "status": "queued",
+            "stage": "queued",
+            "rows_processed": 0,
+            "bytes_read": 0,
+            "total_bytes": None,
+            "eta_seconds": None,
+            "result": None,
+            "error": None,
+            "created_at": datetime.utcnow(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        self._started = None
+        self._last_stored = 0.0
+
+    @property
+    def job_id(self):
+        return self.state["job_id"]
+
+    def update(self, stage=None, **progress):
+        """Record progress (rows_processed, bytes_read, total_bytes) and optionally a new stage."""
+        stage_changed = stage is not None and stage != self.state["stage"]
+        if stage is not None:
+            self.state["stage"] = stage
+        self.state.update(progress)
+        self.state["eta_seconds"] = self._eta()
+        self.registry._store(self, force=stage_changed)
+
+    def _eta(self):
+        read, total = self.state["bytes_read"], self.state["total_bytes"]
+        if not self._started or not total or not read:
+            return None
+        elapsed = time.monotonic() - self._started
+        return round(elapsed * max(total - read, 0) / read, 1)
+
+    def _run(self, func, args, kwargs):
+        self._started = time.monotonic()
+        self.state.update(status="running", stage="running", started_at=datetime.utcnow())
+        self.registry._store(self, force=True)
+        try:
+            self.state["result"] = func(self, *args, **kwargs)
+            self.state.update(status="complete", stage="complete", eta_seconds=0)
+        except Exception as e:
+            self.state.update(status="failed", error=str(e))
+        self.state["finished_at"] = datetime.utcnow()
+        self.registry._store(self, force=True)
+        self.registry._finished(self)
+
+
+class JobRegistry:
+    """
+    Local worker pool for import and cleaning work.
+    Job state lives in memory for cheap polling and is mirrored to a MongoDB
+    collection (when one is attached) so any gunicorn worker can answer.
+    Finished jobs are dropped from memory after finished_ttl seconds, or
+    oldest first once more than max_finished are kept; get() then answers
+    from the store.
+    """
+
+    def __init__(self, max_workers=None, finished_ttl=3600, max_finished=1000):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count(), thread_name_prefix='job')
+        self.store = None
+        self.finished_ttl = finished_ttl
+        self.max_finished = max_finished
+        self._jobs = {}
+        self._done = OrderedDict()  # job_id -> monotonic finish time, oldest first
+        self._lock = threading.Lock()
+
+    def attach_store(self, collection):
+        """Mirror job state into a MongoDB collection."""
+        if self.store is None:
+            self.store = collection
+
+    def submit(self, kind, func, *args, details=None, **kwargs):
+        """Queue func(job, *args, **kwargs) on the pool and return the new job id."""
+        job = Job(self, uuid.uuid4().hex, kind, details or {})
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._evict()
+        self._store(job, force=True)
+        self.executor.submit(job._run, func, args, kwargs)
+        return job.job_id
+
+    def get(self, job_id):
+        """Current state of a job, or None if it is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return dict(job.state)
+        if self.store is not None:
+            return self.store.find_one({"job_id": job_id}, {"_id": 0})
+        return None
+
+    def active(self, kind=None):
+        """States of queued and running jobs in this process."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [
+            dict(job.state) for job in jobs
+            if job.state["status"] in ("queued", "running") and (kind is None or job.state["kind"] == kind)
+        ]
+
+    def _finished(self, job):
+        with self._lock:
+            self._done[job.job_id] = time.monotonic()
+            self._evict()
+
+    def _evict(self):
+        """Drop expired finished jobs, then the oldest beyond max_finished; the lock must be held."""
+        cutoff = time.monotonic() - self.finished_ttl
+        while self._done:
+            job_id, finished = next(iter(self._done.items()))
+            if finished > cutoff and len(self._done) <= self.max_finished:
+                break
+            del self._done[job_id]
+            self._jobs.pop(job_id, None)
+
+    def _store(self, job, force=False):
+        if self.store is None:
+            return
+        now = time.monotonic()
+        if not force and now - job._last_stored < STORE_INTERVAL:
+            return
+        job._last_stored = now
+        try:
+            self.store.update_one({"job_id": job.job_id}, {"$set": dict(job.state)}, upsert=True)
+        except Exception:
+            logger.exception("Failed to store job progress")
+
+
+job_registry = JobRegistry(
+    int(os.getenv("JOB_WORKERS", 0)) or None,
+    finished_ttl=float(os.getenv("JOB_FINISHED_TTL", 3600)),  # Seconds a finished job stays in memory
+    max_finished=int(os.getenv("JOB_MAX_FINISHED", 1000))  # Finished jobs kept in memory at most
+)
@@ -0,0 +1,241 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+
+from config import Config
+
+# Latency buckets in seconds, from a cache hit to a large streaming rewrite
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Operations slower than their threshold are logged here, to app.log (Config.SLOW_LOG_FILE). The
+# logger has its own handler, opened on first write, so the file can be moved apart from the
+# rest of the app's log; it does not propagate, so while both are app.log (where utils sends the
+# root logger) no line is written twice.
+slow_log = logging.getLogger('slow_ops')
+if not slow_log.handlers:
+    _slow_handler = logging.FileHandler(Config.SLOW_LOG_FILE, delay=True)
+    _slow_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    slow_log.addHandler(_slow_handler)
+    slow_log.setLevel(logging.INFO)
+    slow_log.propagate = False
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, _label_text(self.labels, key), value
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set, as Prometheus histograms expose them."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}  # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            snapshot = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket', _label_text(self.labels, key, [('le', _number(bound))]), cumulative
+            yield f'{self.name}_sum', _label_text(self.labels, key), total
+            yield f'{self.name}_count', _label_text(self.labels, key), count
+
+
+class MetricsRegistry:
+    """
+    In-process metrics rendered in the Prometheus text format. Each process
+    (e.g. each gunicorn worker) keeps its own, so scrape every worker or run
+    one per container.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+REQUEST_SECONDS = registry.register(Histogram(
+    'http_request_duration_seconds', 'Time to handle an HTTP request.', ('method', 'endpoint', 'status')
+))
+STAGE_SECONDS = registry.register(Histogram(
+    'stage_duration_seconds', 'Time spent in a named processing stage.', ('stage', 'operation')
+))
+STAGE_ROWS = registry.register(Counter(
+    'stage_rows_total', 'Rows handled by a named processing stage.', ('stage', 'operation')
+))
+STAGE_BYTES = registry.register(Counter(
+    'stage_bytes_total', 'Bytes handled by a named processing stage.', ('stage', 'operation')
+))
+SLOW_OPERATIONS = registry.register(Counter(
+    'slow_operations_total', 'Requests and stages slower than their configured threshold.', ('kind', 'name')
+))
+
+_context = threading.local()
+
+
+def current_operation():
+    """The operation the current thread is working on, for labelling its spans."""
+    return getattr(_context, 'operation', '')
+
+
+@contextmanager
+def operation(name):
+    """Label the spans recorded by this thread inside the block with an operation name."""
+    previous = current_operation()
+    _context.operation = name
+    try:
+        yield
+    finally:
+        _context.operation = previous
+
+
+def stage_threshold(stage):
+    """Seconds after which a stage is logged as slow: a per-stage override or the default."""
+    return Config.SLOW_STAGE_THRESHOLDS.get(stage, Config.SLOW_STAGE_SECONDS)
+
+
+def _log_slow(kind, name, seconds, rows=None, size=None, **context):
+    SLOW_OPERATIONS.inc(kind=kind, name=name)
+    fields = [f"{kind}={name}", f"seconds={seconds:.3f}"]
+    if rows is not None:
+        fields.append(f"rows={rows}")
+        fields.append(f"rows_per_second={rows / seconds:.1f}" if seconds else "rows_per_second=inf")
+    if size is not None:
+        fields.append(f"bytes={size}")
+    fields.extend(f"{key}={value}" for key, value in context.items() if value not in (None, ''))
+    slow_log.warning("Slow %s: %s", kind, ' '.join(fields))
+
+
+def record(stage, seconds, rows=None, size=None, operation=None):
+    """Record a stage that has already been timed."""
+    operation = current_operation() if operation is None else operation
+    STAGE_SECONDS.observe(seconds, stage=stage, operation=operation)
+    if rows:
+        STAGE_ROWS.inc(rows, stage=stage, operation=operation)
+    if size:
+        STAGE_BYTES.inc(size, stage=stage, operation=operation)
+    if seconds >= stage_threshold(stage):
+        _log_slow('stage', stage, seconds, rows, size, operation=operation)
+
+
+class Span:
+    """Timing of one stage; set rows and size inside the block once they are known."""
+
+    def __init__(self, stage, rows=None, size=None, operation=None):
+        self.stage = stage
+        self.rows = rows
+        self.size = size
+        self.operation = operation
+        self.seconds = None
+
+
+@contextmanager
+def span(stage, rows=None, size=None, operation=None):
+    """Time a named stage (parse, validate, insert, load, transform, write, ...)."""
+    current = Span(stage, rows, size, operation)
+    started = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.seconds = time.perf_counter() - started
+        record(stage, current.seconds, current.rows, current.size, current.operation)
+
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+
+def _observe_request(response):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+    seconds = time.perf_counter() - started
+    # The route pattern, not the raw path, so ids in the URL do not explode the label set
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUEST_SECONDS.observe(seconds, method=request.method, endpoint=endpoint, status=response.status_code)
+    if seconds >= Config.SLOW_REQUEST_SECONDS:
+        _log_slow('request', f'{request.method} {endpoint}', seconds,
+                  size=request.content_length, status=response.status_code)
+    return response
+
+
+def instrument(app, path='/metrics'):
+    """Time every request the app (and so each of its blueprints) serves and expose /metrics."""
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
+    app.add_url_rule(path, 'metrics', lambda: Response(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE))
+    return app
@@ -1,9 +1,18 @@
-from pymongo import MongoClient
-from config import Config
+from pymongo import DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
-# MongoDB Client
-client = MongoClient(Config.MONGO_URI)
-db = client.datafiles  # Use the `datafiles` database
+from mongo import mongo
+from pagination import DEFAULT_PAGE_SIZE, fetch_page
+
+# Shared MongoDB client
+db = mongo.database("datafiles")  # Use the `datafiles` database
+
+# One record per filename; listings page on upload_time
+mongo.declare_index(db.dataimport, "filename", unique=True)
+mongo.declare_index(db.dataimport, [("upload_time", DESCENDING), ("_id", DESCENDING)])
+
+# Duplicate key error code
+DUPLICATE_KEY = 11000
 
 # FileUpload model
 class FileUpload:
@@ -12,21 +21,55 @@ class FileUpload:
         self.file_path = file_path
         self.upload_time = upload_time
 
-    def save_to_db(self):
-        collection = db.dataimport  # Use the `dataimport` collection
-        file_data = {
+    def to_document(self):
+        return {
             "filename": self.filename,
             "file_path": self.file_path,
             "upload_time": self.upload_time
         }
-        # Handle duplicates based on filename
-        if not collection.find_one({"filename": self.filename}):
-            collection.insert_one(file_data)
+
+    def upsert(self):
+        """Insert-if-absent by filename, as a single atomic operation."""
+        return UpdateOne({"filename": self.filename}, {"$setOnInsert": self.to_document()}, upsert=True)
+
+    def save_to_db(self):
+        collection = db.dataimport  # Use the `dataimport` collection
+        # Handle duplicates based on filename: one upsert, backed by the unique index
+        try:
+            result = collection.update_one({"filename": self.filename}, {"$setOnInsert": self.to_document()}, upsert=True)
+        except DuplicateKeyError:
+            result = None  # A concurrent upload of the same filename won the race
+        if result is not None and result.upserted_id is not None:
             return {"status": "success", "message": "File uploaded successfully"}
         else:
             return {"status": "error", "message": "Duplicate record detected"}
 
     @staticmethod
-    def get_all_files():
+    def save_many(files):
+        """
+        Register many FileUploads with one unordered bulk_write.
+        Files whose filename is already recorded are counted as duplicates.
+        """
+        files = list(files)
+        if not files:
+            return {"status": "success", "inserted": 0, "duplicates": 0}
+        collection = db.dataimport
+        try:
+            inserted = collection.bulk_write([f.upsert() for f in files], ordered=False).upserted_count
+        except BulkWriteError as e:
+            if any(error.get("code") != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                raise
+            inserted = e.details.get("nUpserted", 0)
+        return {"status": "success", "inserted": inserted, "duplicates": len(files) - inserted}
+
+    @staticmethod
+    def get_all_files(limit=DEFAULT_PAGE_SIZE, after=None):
+        """
+        One page of uploaded files, newest first.
+        Returns (files, cursor to pass as `after` for the next page or None).
+        """
         collection = db.dataimport
-        return list(collection.find({}, {"_id": 0, "filename": 1, "file_path": 1, "upload_time": 1}))
+        return fetch_page(
+            collection, sort_field="upload_time", limit=limit, after=after,
+            projection={"filename": 1, "file_path": 1, "upload_time": 1}
+        )
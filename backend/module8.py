@@ -2,13 +2,26 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING
 from werkzeug.utils import secure_filename
 from datetime import datetime
-import csv  # For CSV processing
-import json  # Importing json module
-from bson import ObjectId  # For ObjectId serialization
 from flask import Blueprint
+from ingest import ingest_file
+import metrics
+import utils  # Logs to app.log, including errors from background threads
+from readers import infer_file_schema
+from schema import row_converter
+from jobs import job_registry
+from scheduler import ImportScheduler
+from mongo import mongo, external_clients
+import content_store
+import compression
+import preview
+import row_index
+from bson import ObjectId
+from bson.errors import InvalidId
+from zipfile import BadZipFile
+from pagination import MongoJSONProvider, list_response
 
 module8_bp = Blueprint('module8', __name__)
 CORS(module8_bp)  # Enable CORS for this blueprint
@@ -18,44 +31,36 @@ load_dotenv()
 # Initialize Flask app and enable CORS
 app = Flask(__name__)
 CORS(app)
+metrics.instrument(app)  # Request timing and /metrics
 
 # Configurations
 app.config['UPLOAD_FOLDER'] = './uploads'  # Ensure this folder exists
-app.config['ALLOWED_EXTENSIONS'] = {'csv', 'xlsx', 'json'}
-
-# MongoDB Client
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-
-# Initialize MongoDB client and check the connection
-client = None
-db = None
-files_collection = None
-
-try:
-    client = MongoClient(MONGO_URI)
-    client.server_info()  # Validate connection on startup
-    db = client["dataclean_ai"]  # Database name
-    files_collection = db["files"]  # Collection for storing file metadata
-    print("Connected to MongoDB successfully.")
-except Exception as e:
-    print(f"Failed to connect to MongoDB: {e}")
-    db, files_collection = None, None
+app.config['ALLOWED_EXTENSIONS'] = {'csv', 'xlsx', 'json', 'ndjson', 'jsonl'}
+app.config['INGEST_BATCH_SIZE'] = int(os.getenv("INGEST_BATCH_SIZE", 5000))  # Rows per insert_many call
+app.config['INGEST_MAX_PENDING_BATCHES'] = int(os.getenv("INGEST_MAX_PENDING_BATCHES", 4))  # Parsed batches waiting on MongoDB
+app.config['SCHEDULER_SOURCE_CONCURRENCY'] = int(os.getenv("SCHEDULER_SOURCE_CONCURRENCY", 1))  # Concurrent scheduled runs per source
+app.config['SCHEDULER_LEASE_SECONDS'] = int(os.getenv("SCHEDULER_LEASE_SECONDS", 300))  # A running schedule whose process stops renewing this is run again
+
+# MongoDB: the shared per-process client connects on first use
+db = mongo.database("dataclean_ai")  # Database name
+files_collection = db["files"]  # Collection for storing file metadata
+uploads_collection = db["uploads"]  # Content hash (_id) -> file metadata of its import
+job_registry.attach_store(db["jobs"])  # Background job progress
+
+# Indexes for the lookups and listings below
+mongo.declare_index(files_collection, [("uploaded_at", DESCENDING), ("_id", DESCENDING)])
+mongo.declare_index(files_collection, [("filename", ASCENDING), ("uploaded_at", DESCENDING)])  # Latest upload by name
+mongo.declare_index(db.scheduled_imports, [("time", DESCENDING), ("_id", DESCENDING)])
+mongo.declare_index(db.scheduled_imports, [("status", ASCENDING), ("time", ASCENDING)])
+mongo.declare_index(db["jobs"], "job_id", unique=True)
 
 # Utility Functions
 def allowed_file(filename):
     """Check if file type is allowed."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
-# Custom JSON serializer for ObjectId
-class JSONEncoderCustom(json.JSONEncoder):
-    def default(self, obj):
-        """Convert ObjectId to string for JSON serialization."""
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        return super().default(obj)
-
-# Set custom JSON encoder globally
-app.json_encoder = JSONEncoderCustom
+# Serialize ObjectId and datetime values in MongoDB documents
+app.json = MongoJSONProvider(app)
 
 
 # Example route for module 8
@@ -64,6 +69,78 @@ def example():
     return jsonify({"message": "Module 8 works!"}), 200
 
 
+def import_file(job, metadata_id, filepath):
+    """Ingest a saved upload into MongoDB, keeping its metadata document up to date."""
+    # Stream CSV, XLSX or JSON rows into MongoDB in fixed-size batches
+    def record_batch(inserted):
+        files_collection.update_one({"_id": metadata_id}, {"$inc": {"row_count": inserted}})
+
+    try:
+        with metrics.operation('import'):
+            # Settle column types first so every batch is stored with the same types
+            if job is not None:
+                job.update(stage="inferring schema")
+            with metrics.span('infer_schema', size=os.path.getsize(filepath)):
+                # Malformed lines are left for ingest to count as invalid rows
+                dataset_schema = infer_file_schema(filepath, on_bad_lines='skip')
+            files_collection.update_one({"_id": metadata_id}, {"$set": {"schema": dataset_schema}})
+            with metrics.span('ingest', size=os.path.getsize(filepath)) as span:
+                ingest_stats = ingest_file(
+                    filepath,
+                    db.dataimport,
+                    job=job,
+                    batch_size=app.config['INGEST_BATCH_SIZE'],
+                    max_pending=app.config['INGEST_MAX_PENDING_BATCHES'],
+                    on_batch=record_batch,
+                    transform=row_converter(dataset_schema)
+                )
+                span.rows = ingest_stats['row_count']
+    except Exception:
+        files_collection.update_one({"_id": metadata_id}, {"$set": {"status": "failed"}})
+        raise
+
+    # Skipped rows are counted in the stats kept on the metadata document and returned to the caller
+    ingest_stats["status"] = "complete"
+    files_collection.update_one({"_id": metadata_id}, {"$set": ingest_stats})
+    return ingest_stats
+
+
+def find_uploaded(sha256):
+    """Metadata of the import that owns this content hash, unless that import failed."""
+    entry = uploads_collection.find_one({"_id": sha256})
+    if entry is None:
+        return None
+    metadata = files_collection.find_one({"_id": entry["file_metadata_id"]})
+    if metadata is None or metadata.get("status") == "failed":
+        return None
+    return metadata
+
+
+def claim_upload(sha256, metadata_id):
+    """
+    Point a content hash at a new import, atomically. Succeeds for an unseen
+    hash, or to take over from an import that failed or vanished; returns
+    False when another live import owns it.
+    """
+    result = uploads_collection.update_one(
+        {"_id": sha256},
+        {"$setOnInsert": {"file_metadata_id": metadata_id, "created_at": datetime.utcnow()}},
+        upsert=True
+    )
+    if result.upserted_id is not None:
+        return True
+    entry = uploads_collection.find_one({"_id": sha256})
+    owner = files_collection.find_one({"_id": entry["file_metadata_id"]}, {"status": 1})
+    if owner is not None and owner.get("status") != "failed":
+        return False
+    # Only replace the owner we just saw, in case another upload takes over first
+    result = uploads_collection.update_one(
+        {"_id": sha256, "file_metadata_id": entry["file_metadata_id"]},
+        {"$set": {"file_metadata_id": metadata_id}}
+    )
+    return result.modified_count == 1
+
+
 # M8-UC1: Upload Dataset
 @app.route('/api/data/upload', methods=['POST'])
 def upload_dataset():
@@ -80,50 +157,73 @@ def upload_dataset():
     if file.filename == '':
         return jsonify({"status": "error", "message": "No file selected"}), 400
 
-    if allowed_file(file.filename):
+    try:
+        # gzip/zstd/zip uploads are decompressed block by block as they stream to storage
+        upload_name, upload_stream = compression.open_upload(file.filename, file.stream, allowed_file)
+    except (ValueError, BadZipFile) as e:
+        return jsonify({"status": "error", "message": f"Invalid compressed upload: {str(e)}"}), 400
+
+    if allowed_file(upload_name):
         try:
-            # Save the file locally
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-
-            # Parse CSV file and insert data into MongoDB
-            rows = []
-            if filename.lower().endswith('.csv'):
-                with open(filepath, 'r') as csvfile:
-                    csvreader = csv.DictReader(csvfile)
-                    rows = list(csvreader)  # Read all rows into a list of dictionaries
-
-                    # Debugging: Log parsed rows
-                    print("Parsed CSV rows:", rows)
-
-                    # Validate and insert data into MongoDB
-                    for row in rows:
-                        # Simple validation: Check for required fields
-                        if 'Series_reference' not in row or 'Period' not in row:
-                            print(f"Invalid row: {row}")
-                            continue  # Skip invalid rows
-
-                    # Ensure the collection exists before inserting data
-                    if rows:
-                        # Make sure db and dataimport collection are valid
-                        if db is not None and db.get_collection('dataimport') is not None:
-                            db.dataimport.insert_many(rows)
-                        else:
-                            print("Database or collection is not properly initialized.")
-                            return jsonify({"status": "error", "message": "Database or collection is not initialized."}), 500
-
-            # Save file metadata in MongoDB
+            # Hash the upload while it streams into content-addressed storage
+            filename = secure_filename(upload_name)
+            # CSV/NDJSON rows are indexed from the same blocks, for random-access previews
+            index_format = row_index.index_format(filename)
+            indexer = row_index.RowIndexBuilder(index_format) if index_format else None
+            sha256, filepath, size, is_new = content_store.store_stream(
+                upload_stream, app.config['UPLOAD_FOLDER'], os.path.splitext(filename)[1].lower(),
+                on_block=indexer.feed if indexer else None
+            )
+            if indexer is not None and (is_new or not os.path.exists(row_index.index_path(filepath))):
+                indexer.finish().save(filepath)
+
+            # Identical content already imported (or importing): hand back that dataset
+            existing = find_uploaded(sha256)
+            if existing is not None:
+                return jsonify({
+                    "status": "success",
+                    "message": "Identical file already imported",
+                    "duplicate": True,
+                    "metadata": existing
+                }), 200
+
+            # Save file metadata first so row_count can be tracked while rows stream in
             file_metadata = {
                 "filename": filename,
                 "filepath": filepath,
+                "sha256": sha256,
+                "size": size,
                 "uploaded_at": datetime.utcnow(),
-                "row_count": len(rows) if filename.lower().endswith('.csv') else 0
+                "row_count": 0,
+                "status": "importing"
             }
-
-            if db is not None:
-                result = files_collection.insert_one(file_metadata)
-                file_metadata["_id"] = str(result.inserted_id)  # Convert ObjectId to string
+            result = files_collection.insert_one(file_metadata)
+            file_metadata["_id"] = str(result.inserted_id)  # Convert ObjectId to string
+
+            # Claim the hash; a concurrent upload of the same content may have won
+            if not claim_upload(sha256, result.inserted_id):
+                files_collection.delete_one({"_id": result.inserted_id})
+                return jsonify({
+                    "status": "success",
+                    "message": "Identical file already imported",
+                    "duplicate": True,
+                    "metadata": find_uploaded(sha256)
+                }), 200
+
+            # Large files can be ingested by the worker pool instead of inside the request
+            if request.form.get('async', '').lower() in ('1', 'true'):
+                job_id = job_registry.submit(
+                    'import', import_file, result.inserted_id, filepath,
+                    details={"filename": filename, "file_metadata_id": file_metadata["_id"]}
+                )
+                return jsonify({
+                    "status": "accepted",
+                    "message": "File uploaded; import is running in the background",
+                    "job_id": job_id,
+                    "metadata": file_metadata
+                }), 202
+
+            file_metadata.update(import_file(None, result.inserted_id, filepath))
 
             return jsonify({
                 "status": "success",
@@ -134,18 +234,55 @@ def upload_dataset():
         except Exception as e:
             return jsonify({"status": "error", "message": f"File upload failed: {str(e)}"}), 500
     else:
-        return jsonify({"status": "error", "message": "Invalid file type. Allowed types: csv, xlsx, json."}), 400
+        return jsonify({"status": "error", "message": "Invalid file type. Allowed types: csv, xlsx, json, ndjson, jsonl, optionally gzip, zstd or zip compressed."}), 400
+
+def run_scheduled_import(job, entry):
+    """Import the uploaded file named by a schedule entry."""
+    source = entry.get("source")
+    if not source:
+        raise Exception("Scheduled import has no source file.")
+    # Uploads live in content-addressed storage; use the latest upload of that name
+    latest = files_collection.find_one(
+        {"filename": source, "sha256": {"$exists": True}}, {"filepath": 1}, sort=[("uploaded_at", DESCENDING)]
+    )
+    filepath = latest["filepath"] if latest else os.path.join(app.config['UPLOAD_FOLDER'], source)
+    if not os.path.exists(filepath):
+        raise Exception(f"Source file not found: {source}")
+
+    result = files_collection.insert_one({
+        "filename": source,
+        "filepath": filepath,
+        "uploaded_at": datetime.utcnow(),
+        "row_count": 0,
+        "status": "importing",
+        "schedule_id": entry["_id"]
+    })
+    return import_file(job, result.inserted_id, filepath)
+
+# Fires due entries from db.scheduled_imports on the job pool
+import_scheduler = ImportScheduler(
+    db.scheduled_imports, run_scheduled_import,
+    default_concurrency=app.config['SCHEDULER_SOURCE_CONCURRENCY'],
+    lease_seconds=app.config['SCHEDULER_LEASE_SECONDS']
+)
+import_scheduler.start()
 
 # M8-UC2: Connect to External Databases
 @app.route('/api/data/connect-database', methods=['POST'])
 def connect_to_database():
-    """Connect to an external MongoDB database."""
+    """Connect to an external MongoDB database; the pooled client is kept for later imports from it."""
     connection_string = request.json.get('connection_string')
+    if not connection_string:
+        return jsonify({"status": "error", "message": "connection_string is required."}), 400
     try:
         # Test connection to the external database
-        external_client = MongoClient(connection_string)
-        external_client.server_info()  # Validate connection
-        return jsonify({"status": "success", "message": "Connected to external database"}), 200
+        with external_clients.lease(connection_string) as external_client:
+            external_client.admin.command('ping')  # Validate connection
+        return jsonify({
+            "status": "success",
+            "message": "Connected to external database",
+            "connections": external_clients.stats()
+        }), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 400
 
@@ -153,13 +290,22 @@ def connect_to_database():
 @app.route('/api/data/import-progress', methods=['GET'])
 def track_import_progress():
     try:
-        if not files_collection:
+        # Progress of a single background import
+        job_id = request.args.get('job_id')
+        if job_id:
+            job = job_registry.get(job_id)
+            if job is None:
+                return jsonify({"status": "error", "message": "Job not found."}), 404
+            return jsonify({"status": "success", "data": job}), 200
+
+        if files_collection is None:
             raise Exception("Database not initialized.")
         
         total_files = files_collection.count_documents({})
         progress = {
             "status": "complete" if total_files > 0 else "no_import",
-            "total_files": total_files
+            "total_files": total_files,
+            "active_jobs": job_registry.active('import')
         }
         return jsonify({"status": "success", "data": progress}), 200
     except Exception as e:
@@ -179,11 +325,9 @@ def import_failures():
 # M8-UC5: View Imported Data
 @app.route('/api/data/view-imported', methods=['GET'])
 def view_imported_data():
+    """Imported files, newest first; paged with ?limit=&after=, ?fields= to project, ?format=ndjson to stream."""
     try:
-        files = list(files_collection.find({}, {"_id": 0}))  # Fetch all files without MongoDB's _id field
-        for file in files:
-            file['document_id'] = str(file.get('_id'))  # Convert _id to string manually if not already done
-        return jsonify({"status": "success", "data": files}), 200
+        return list_response(app, files_collection, request.args, sort_field="uploaded_at", status="success")
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
@@ -199,10 +343,24 @@ def schedule_import():
         schedule_entry = {
             "time": datetime.strptime(time, "%Y-%m-%dT%H:%M:%S"),
             "scheduled_at": datetime.utcnow(),
+            "status": "scheduled",
         }
 
+        # Optional: an uploaded file to import, a repeat interval and a per-source concurrency limit
+        source = request.json.get('source')
+        if source:
+            schedule_entry["source"] = secure_filename(source)
+        for option in ('interval_seconds', 'max_concurrency'):
+            value = request.json.get(option)
+            if value is None:
+                continue
+            if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+                return jsonify({"status": "error", "message": f"{option} must be a positive integer."}), 400
+            schedule_entry[option] = value
+
         if db is not None:
-            db.scheduled_imports.insert_one(schedule_entry)  # Save schedule
+            result = db.scheduled_imports.insert_one(schedule_entry)  # Save schedule
+            import_scheduler.add(result.inserted_id, schedule_entry["time"])
 
         return jsonify({"status": "success", "message": "Import scheduled successfully."}), 200
     except Exception as e:
@@ -216,22 +374,89 @@ def view_scheduled_imports():
         if db is None:
             return jsonify({"status": "error", "message": "Database connection is not initialized."}), 500
 
-        schedules = list(db.scheduled_imports.find())
-        return jsonify({"status": "success", "data": schedules}), 200
+        # Latest run time first, paged like view-imported
+        return list_response(app, db.scheduled_imports, request.args, sort_field="time", status="success")
     except Exception as e:
         return jsonify({"status": "error", "message": f"Error fetching schedules: {str(e)}"}), 500
 
+def uploaded_file(file_id):
+    """(metadata, error response) for the upload whose files metadata _id is file_id."""
+    if not file_id:
+        return None, (jsonify({"status": "error", "message": "file_id is required"}), 400)
+    try:
+        metadata = files_collection.find_one({"_id": ObjectId(file_id)})
+    except InvalidId:
+        return None, (jsonify({"status": "error", "message": "Invalid file_id"}), 400)
+    if metadata is None or not os.path.exists(metadata.get("filepath", "")):
+        return None, (jsonify({"status": "error", "message": "File not found"}), 404)
+    return metadata, None
+
+# Preview a page of an uploaded file straight from disk
+@app.route('/api/data/preview', methods=['GET'])
+def preview_upload():
+    """Rows [offset, offset + limit) of an upload; CSV/NDJSON pages seek through the row index."""
+    try:
+        offset, limit = preview.page_params(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    metadata, error = uploaded_file(request.args.get('file_id'))
+    if error:
+        return error
+
+    try:
+        path = metadata["filepath"]
+        rows = preview.typed(preview.read_rows(path, offset, limit), metadata.get("schema"))
+        return jsonify({
+            "status": "success",
+            "file_id": str(metadata["_id"]),
+            "total_rows": preview.row_count(path),
+            "offset": offset,
+            "limit": limit,
+            "rows": preview.records(rows)
+        }), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Preview failed: {str(e)}"}), 500
+
+# Random or stratified sample of an uploaded file
+@app.route('/api/data/sample', methods=['GET'])
+def sample_upload():
+    """A reservoir (uniform) or stratified sample of an upload's rows, in file order."""
+    try:
+        size, method, by, seed = preview.sample_params(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    metadata, error = uploaded_file(request.args.get('file_id'))
+    if error:
+        return error
+
+    try:
+        rows = preview.sample_rows(metadata["filepath"], size, method, by, seed)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Sampling failed: {str(e)}"}), 500
+    return jsonify({
+        "status": "success",
+        "file_id": str(metadata["_id"]),
+        "method": method,
+        "size": len(rows),
+        "row_numbers": [int(i) for i in rows.index],
+        "rows": preview.records(preview.typed(rows, metadata.get("schema")))
+    }), 200
+
 # M8-UC8: Database Connection Status
 @app.route('/api/data/database-status', methods=['GET'])
 def database_status():
     """Check the database connection status."""
-    try:
-        if client is None:
-            return jsonify({"status": "error", "message": "Database connection is not established."}), 500
-        client.server_info()  # Will raise an exception if MongoDB is down
-        return jsonify({"status": "success", "message": "Database connection is healthy."}), 200
-    except Exception as e:
-        return jsonify({"status": "error", "message": f"Failed to connect to the database: {str(e)}"}), 500
+    # Cached from driver heartbeats; only pings when the state is stale
+    health = mongo.health()
+    if health["connected"]:
+        return jsonify({"status": "success", "message": "Database connection is healthy.", "health": health}), 200
+    return jsonify({
+        "status": "error",
+        "message": f"Failed to connect to the database: {health['error']}",
+        "health": health
+    }), 500
 
 # Add a Home Route
 @app.route('/')
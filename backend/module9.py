@@ -1,35 +1,189 @@
 from flask import Blueprint, jsonify, request
 from flask_cors import CORS
 import pandas as pd
+import numpy as np
 import os
+import json
 from datetime import datetime
-from pymongo import MongoClient
-import numpy as np
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING
+import time
+import cleaning
+import outliers
+import dedup
+import near_dedup
+from config import Config
+from jobs import job_registry
+from audit_log import AuditLogger
+from mongo import mongo, external_clients, redact
+from dataset_cache import (
+    dataset_cache, working_copy_path, read_working_copy, load_dataset, save_dataset, export_csv,
+    dataset_path, should_stream, replace_dataset_file, iter_chunks
+)
+import stats
+import parallel
+import column_profile
+import readers
+import compression
+from zipfile import BadZipFile
+import metrics
+import preview
+import source_import
+import row_index
+import versions
+from dataset_executor import dataset_executor
+from werkzeug.utils import secure_filename
 
 module9_bp = Blueprint('module9', __name__)
 CORS(module9_bp)  # Enable CORS for this blueprint
 
-# MongoDB client setup
-client = MongoClient("mongodb://localhost:27017/")
-db = client["data_cleaning_db"]
+# MongoDB: the shared per-process client connects on first use
+db = mongo.database("data_cleaning_db")
 module9_collection = db["module9"]
+mongo.declare_index(module9_collection, "file_id", unique=True)
 
 UPLOAD_FOLDER = "uploads"
 
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
-def log_action(file_id, action, details):
+# Operation log entries live in their own collection, written behind in batches
+audit_log = AuditLogger(
+    module9_collection, db["module9_actions"],
+    flush_interval=Config.AUDIT_FLUSH_INTERVAL, max_buffer=Config.AUDIT_MAX_BUFFER
+)
+audit_log.start()
+mongo.declare_index(db["module9_actions"], [("file_id", ASCENDING), ("_id", DESCENDING)])  # Log tail per dataset
+
+def log_action(file_id, action, details, status=None):
+    """Record an operation and, when given, the dataset's new status in one buffered write."""
+    audit_log.record(file_id, action, details, status)
+
+def store_dataset(file_record, data):
+    """Save a transformed dataset to its working copy instead of rewriting the CSV."""
+    had_working_copy = 'working_path' in file_record
+    with metrics.span('write', rows=len(data)):
+        save_dataset(file_record, data)
+    if not had_working_copy:
+        # Records imported before working copies existed get one on first write.
+        module9_collection.update_one(
+            {"file_id": file_record['file_id']},
+            {"$set": {"working_path": file_record['working_path']}}
+        )
+
+def save_profile(file_id, profile):
+    """Persist a column profile; None drops it so it is rebuilt on next use."""
+    if profile is None:
+        module9_collection.update_one({"file_id": file_id}, {"$unset": {"profile": ""}})
+    else:
+        module9_collection.update_one({"file_id": file_id}, {"$set": {"profile": profile}})
+
+def save_versions(file_record):
+    """Persist the record's version list, head and base."""
     module9_collection.update_one(
-        {"file_id": file_id},
-        {"$push": {"actions_log": {"action": action, "details": details, "timestamp": datetime.now()}}}
+        {"file_id": file_record['file_id']},
+        {"$set": {field: file_record[field] for field in versions.RECORD_FIELDS}}
     )
 
-def update_progress(file_id, status):
-    module9_collection.update_one(
-        {"file_id": file_id},
-        {"$set": {"status": status, "last_updated": datetime.now()}}
-    )
+def ensure_versioned(file_record):
+    """Make the current state version 0 of a record imported before versioning, before an op changes it."""
+    base_path = file_record.get('version_base_path')
+    if not base_path or not os.path.exists(base_path):
+        versions.create_base(file_record)
+        save_versions(file_record)
+
+def commit_version(file_record, operation, deltas):
+    """Store an op's deltas as the dataset's next version; the oldest are folded into the base as the chain grows."""
+    entry = versions.add_version(file_record, operation, deltas)
+    versions.compact(file_record)
+    save_versions(file_record)
+    return entry["version"]
+
+def get_profile(file_record, refresh=False):
+    """The record's column profile, building and saving it first if it is missing."""
+    profile = file_record.get('profile')
+    if profile is None or refresh:
+        if should_stream(file_record, Config.IN_MEMORY_MAX_BYTES):
+            profile = column_profile.build_profile_streaming(dataset_path(file_record))
+        else:
+            profile = column_profile.build_profile(load_dataset(file_record, copy=False))
+        save_profile(file_record['file_id'], profile)
+        file_record['profile'] = profile
+    return profile
+
+def known_moments(file_record):
+    """Numeric column mean/std from the stored profile, if it has them."""
+    profile = file_record.get('profile')
+    if profile is None:
+        return None
+    numeric_columns = [entry["name"] for entry in profile["columns"] if entry["numeric"]]
+    return column_profile.known_moments(profile, numeric_columns)
+
+def report(job, stage, **progress):
+    """Forward progress to a background job; a no-op for inline requests."""
+    if job is not None:
+        job.update(stage, **progress)
+
+def count_option(name, default):
+    """A non-negative whole-number option from the request body, e.g. a cap on listed indices."""
+    value = request.json.get(name, default)
+    try:
+        if isinstance(value, bool) or int(value) != value or value < 0:
+            raise ValueError
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"{name} must be a non-negative integer.")
+    return int(value)
+
+def check_columns(file_record, columns):
+    """Raise ValueError if a request names columns the dataset does not have."""
+    schema = file_record.get('schema')
+    if schema is None or not columns:
+        return
+    missing = [col for col in columns if col not in {entry["name"] for entry in schema}]
+    if missing:
+        raise ValueError(f"Unknown columns: {missing}")
+
+def refresh_record(file_record):
+    """Reload a record in place, e.g. once a lock is held, as an op that ran before may have changed it."""
+    fresh = module9_collection.find_one({"file_id": file_record['file_id']})
+    if fresh is not None:
+        file_record.clear()
+        file_record.update(fresh)
+
+def run_operation(file_id, operation, work, mutates=True, file_record=None):
+    """
+    Run work(job) for a request and return its response fields as JSON.
+    Requests that ask for "async" get a job id straight away while a pool
+    worker runs the same work and reports progress. Stage spans recorded by
+    the work are labelled with the operation either way.
+    Work runs under the dataset's lock, shared for read-only ops and
+    exclusive for mutations, with file_record reloaded once it is held. An
+    identical request already in flight is waited for and its result
+    shared rather than computed again.
+    """
+    params = request.get_json(silent=True) or request.form
+    key = (file_id, operation, json.dumps(
+        {name: value for name, value in params.items() if name != 'async'}, sort_keys=True, default=str
+    ))
+
+    def locked(job):
+        if file_record is not None:
+            refresh_record(file_record)
+        return work(job)
+
+    def traced(job):
+        with metrics.operation(operation.lower().replace(' ', '_')):
+            result, shared = dataset_executor.run(file_id, key, lambda: locked(job), write=mutates)
+        return dict(result, coalesced=True) if shared else result
+
+    if str(params.get('async', '')).lower() in ('1', 'true'):
+        job_id = job_registry.submit('module9', traced, details={"file_id": file_id, "operation": operation})
+        return jsonify({"status": "accepted", "file_id": file_id, "job_id": job_id}), 202
+
+    try:
+        return jsonify({"status": "success", **traced(None)}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
 
 @module9_bp.route('/api/module9/import', methods=['POST'])
 def import_data():
@@ -37,28 +191,129 @@ def import_data():
     if not file:
         return jsonify({"status": "error", "message": "No file provided."}), 400
 
-    file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(file_path)
+    def supported(name):
+        try:
+            return bool(readers.file_format(name))
+        except ValueError:
+            return False
 
     try:
-        data = pd.read_csv(file_path)
-        file_id = str(datetime.timestamp(datetime.now()))
-
-        module9_collection.insert_one({
-            "file_id": file_id,
-            "file_path": file_path,
-            "imported_at": datetime.now(),
-            "status": "Imported",
-            "actions_log": []
-        })
-
-        update_progress(file_id, "Imported")
-        log_action(file_id, "Import", {"file_name": file.filename})
-
-        return jsonify({"status": "success", "file_id": file_id}), 200
-
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+        # gzip/zstd/zip uploads are decompressed as they are saved
+        file_name, stream = compression.open_upload(file.filename, file.stream, supported)
+        readers.file_format(file_name)
+    except (ValueError, BadZipFile) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    request_sheet = request.form.get('sheet')  # XLSX worksheet; the first one by default
+
+    # Saved under the dataset's own id, so its working copy and versions never meet another dataset's
+    file_id = str(datetime.timestamp(datetime.now()))
+    file_path = os.path.join(UPLOAD_FOLDER, f'{file_id}-{secure_filename(file_name)}')
+    row_index.save_stream(stream, file_path)  # Indexes CSV/NDJSON rows for random access as it saves
+
+    def work(job):
+        build_dataset(job, file_id, file_path, {"file_name": file_name}, sheet=request_sheet)
+        return {"file_id": file_id}
+
+    return run_operation(file_id, "Import", work)
+
+def build_dataset(job, file_id, file_path, details, sheet=None, **fields):
+    """
+    Turn a saved file into a dataset: infer its schema, write the typed
+    working copy, profile it and record it as version 0. fields are stored
+    on the record too (e.g. where it came from).
+    """
+    report(job, "parsing", total_bytes=os.path.getsize(file_path))
+    working_path = working_copy_path(file_path)
+
+    # One pass settles the narrowest dtype of every column, a second
+    # streams the file into a working copy in those dtypes
+    with metrics.span('infer_schema', size=os.path.getsize(file_path)):
+        dataset_schema = readers.infer_file_schema(file_path, sheet=sheet)
+    report(job, "writing working copy")
+    with metrics.span('write', size=os.path.getsize(file_path)) as span:
+        span.rows = readers.write_typed_working_copy(
+            file_path, working_path, dataset_schema, sheet=sheet,
+            on_chunk=lambda rows: report(job, "writing working copy", rows_processed=rows)
+        )
+    data = None
+    if os.path.getsize(working_path) <= Config.IN_MEMORY_MAX_BYTES:
+        data = read_working_copy(working_path)
+
+    # Column profile kept with the record and maintained by every later op
+    report(job, "profiling")
+    with metrics.span('profile', rows=span.rows):
+        if data is not None:
+            dataset_cache.put(file_id, data)
+            profile = column_profile.build_profile(data)
+        else:
+            profile = column_profile.build_profile_streaming(working_path)
+
+    file_record = {
+        "file_id": file_id,
+        "file_path": file_path,
+        "working_path": working_path,
+        "imported_at": datetime.now(),
+        "status": "Imported",
+        "schema": dataset_schema,
+        "profile": profile,
+        **fields
+    }
+    versions.create_base(file_record)  # The import is version 0
+    module9_collection.insert_one(file_record)
+
+    log_action(file_id, "Import", details, status="Imported")
+    return file_record
+
+@module9_bp.route('/api/module9/import_source', methods=['POST'])
+def import_source():
+    """
+    Import a collection (or the documents a query matches) from an external
+    MongoDB as a dataset. Documents stream through batched cursors into an
+    NDJSON file and on through the same pipeline as an upload; the client
+    comes from the pooled registry, so repeated imports reuse connections.
+    """
+    params = request.get_json(silent=True) or {}
+    connection_string = params.get('connection_string')
+    database, collection = params.get('database'), params.get('collection')
+    if not connection_string or not database or not collection:
+        return jsonify({"status": "error", "message": "connection_string, database and collection are required."}), 400
+    query = params.get('query') or {}
+    projection = params.get('projection')
+    sort = params.get('sort')  # e.g. [["created_at", -1]]
+    try:
+        limit = int(params.get('limit', 0))
+        batch_size = int(params.get('batch_size', Config.SOURCE_BATCH_SIZE))
+        if not isinstance(query, dict) or limit < 0 or batch_size < 1:
+            raise ValueError
+        sort = [(field, int(direction)) for field, direction in sort] if sort else None
+    except (TypeError, ValueError):
+        return jsonify({"status": "error", "message": "Invalid query, sort, limit or batch_size."}), 400
+
+    file_name = secure_filename(params.get('name') or f'{database}.{collection}') + '.ndjson'
+    file_id = str(datetime.timestamp(datetime.now()))
+    file_path = os.path.join(UPLOAD_FOLDER, f'{file_id}-{file_name}')
+    source = {"connection": redact(connection_string), "database": database, "collection": collection, "query": query}
+
+    def work(job):
+        def progress(rows, size):
+            report(job, "reading source", rows_processed=rows, bytes_read=size,
+                   **source_import.throughput(rows, size, time.perf_counter() - started))
+
+        report(job, "reading source")
+        started = time.perf_counter()
+        with external_clients.lease(connection_string) as client, metrics.span('read_source') as span:
+            rows, size, seconds = source_import.export_query(
+                client[database][collection], file_path, query, projection, sort, limit, batch_size, progress
+            )
+            span.rows, span.size = rows, size
+        if not rows:
+            os.remove(file_path)
+            raise ValueError("The source query matched no documents.")
+        build_dataset(job, file_id, file_path, {"file_name": file_name, "source": source}, source=source)
+        return {"file_id": file_id, "rows": rows, "bytes": size, "seconds": round(seconds, 3),
+                **source_import.throughput(rows, size, seconds)}
+
+    return run_operation(file_id, "Import Source", work)
 
 
 
@@ -77,31 +332,158 @@ def remove_duplicates():
     if not file_id:
         return jsonify({"status": "error", "message": "File ID is required."}), 400
 
+    subset = request.json.get('subset')  # Columns to compare; all columns by default
+    keep = request.json.get('keep', 'first')  # 'first', 'last' or false to drop every copy
+    match = request.json.get('match', 'exact')  # 'exact', or 'fuzzy' for near duplicates
+    try:
+        max_indices = count_option('max_indices', 1000)  # Cap on dropped row indices returned
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if match not in ('exact', 'fuzzy'):
+        return jsonify({"status": "error", "message": "match must be 'exact' or 'fuzzy'."}), 400
+    try:
+        subset = dedup.validate_options(None, subset, keep)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
     file_record = module9_collection.find_one({"file_id": file_id})
     if not file_record:
         return jsonify({"status": "error", "message": "File not found."}), 404
-
     try:
-        data = pd.read_csv(file_record['file_path'])
-        before_count = len(data)
-        data = data.drop_duplicates()
-        after_count = len(data)
-        duplicate_count = before_count - after_count
-
-        data.to_csv(file_record['file_path'], index=False)
-
-        update_progress(file_id, "Duplicates Removed")
-        log_action(file_id, "Remove Duplicates", {"duplicates_removed": duplicate_count})
-
-        return jsonify({"status": "success", "duplicates_removed": duplicate_count}), 200
-
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+        check_columns(file_record, subset)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    if match == 'fuzzy':
+        return remove_near_duplicates(file_id, file_record, subset, max_indices)
+
+    def work(job):
+        ensure_versioned(file_record)
+        path = dataset_path(file_record)
+        in_memory = not should_stream(file_record, Config.DEDUP_IN_MEMORY_MAX_BYTES)
+        if in_memory:
+            report(job, "loading")
+            data = load_dataset(file_record, copy=False)
+            report(job, "removing duplicates", rows_processed=len(data))
+            original = data
+            with metrics.span('transform', rows=len(data)):
+                data, dropped = dedup.dedup_in_memory(data, subset, keep)
+            total_rows = len(original)
+            profile = file_record.get('profile')
+            if profile is not None:
+                column_profile.apply_dedup(profile, original.iloc[dropped], subset is None and keep is not False)
+
+            report(job, "saving")
+            store_dataset(file_record, data)
+        else:
+            # Larger than the in-memory budget: hash-partition on disk and stream the result
+            report(job, "removing duplicates out of core", total_bytes=os.path.getsize(path))
+            with metrics.span('transform', size=os.path.getsize(path)) as span:
+                out_path, dropped, total_rows = dedup.dedup_file(path, subset, keep)
+                span.rows = total_rows
+            replace_dataset_file(file_record, out_path)
+            report(job, "saved", rows_processed=total_rows)
+            # Dropped rows were never loaded, so the profile is rebuilt on next use
+            profile = None
+        duplicate_count = len(dropped)
+        save_profile(file_id, profile)
+        version = commit_version(file_record, "Remove Duplicates", [versions.drop_delta(dropped, total_rows)])
+
+        log_action(file_id, "Remove Duplicates", {"duplicates_removed": duplicate_count}, status="Duplicates Removed")
+
+        return {
+            "duplicates_removed": duplicate_count,
+            "dropped_indices": dropped[:max_indices].tolist(),
+            "mode": "in_memory" if in_memory else "out_of_core",
+            "version": version
+        }
+
+    return run_operation(file_id, "Remove Duplicates", work, file_record=file_record)
+
+def remove_near_duplicates(file_id, file_record, subset, max_indices):
+    """
+    The fuzzy half of remove_duplicates: cluster rows whose subset columns
+    (text columns by default) are near-identical and keep one row of each
+    cluster. With dry_run the clusters are only reported.
+    """
+    try:
+        threshold, max_block_size, max_candidate_pairs = near_dedup.validate_options(
+            request.json.get('threshold'), request.json.get('max_block_size'), request.json.get('max_candidate_pairs')
+        )
+        max_clusters = count_option('max_clusters', 100)  # Cap on clusters listed in the response
+        block_by = request.json.get('block_by')  # Columns that must match exactly, e.g. a postcode
+        if isinstance(block_by, str):
+            block_by = [block_by]
+        if block_by is not None and (not isinstance(block_by, list)
+                                     or not all(isinstance(col, str) for col in block_by)):
+            raise ValueError("block_by must be a column name or a list of column names.")
+        check_columns(file_record, block_by)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    dry_run = bool(request.json.get('dry_run', False))
+
+    def work(job):
+        if not dry_run:
+            ensure_versioned(file_record)
+        path = dataset_path(file_record)
+        in_memory = not should_stream(file_record, Config.DEDUP_IN_MEMORY_MAX_BYTES)
+        if in_memory:
+            report(job, "loading")
+            data = load_dataset(file_record, copy=False)
+            chunks = lambda: iter([data])
+        else:
+            chunks = lambda: iter_chunks(path)
+        report(job, "finding near duplicates")
+        with metrics.span('transform') as span:
+            found = near_dedup.find_near_duplicates(
+                chunks, subset, threshold, block_by, max_block_size, max_candidate_pairs
+            )
+            span.rows = found.stats["rows_scanned"]
+        shown = found.summary(max_clusters)
+        shown_rows = near_dedup.rows_at(chunks, [cluster["representative"] for cluster in shown["clusters"]],
+                                        found.stats["columns"])
+        for cluster in shown["clusters"]:
+            cluster["representative_row"] = shown_rows.get(cluster["representative"])
+        dropped = found.dropped
+        response = {
+            **shown,
+            "match": "fuzzy",
+            "dry_run": dry_run,
+            "mode": "in_memory" if in_memory else "out_of_core",
+            "dropped_indices": dropped[:max_indices].tolist()
+        }
+        if dry_run:
+            log_action(file_id, "Find Near Duplicates", {"clusters_found": shown["clusters_found"],
+                                                         "duplicates_found": len(dropped)})
+            return response
+
+        total_rows = found.stats["rows_scanned"]
+        if in_memory:
+            profile = file_record.get('profile')
+            if profile is not None:
+                column_profile.apply_dedup(profile, data.iloc[dropped], False)
+            report(job, "saving")
+            store_dataset(file_record, data[~np.isin(np.arange(len(data)), dropped)])
+        else:
+            report(job, "writing survivors", rows_processed=total_rows)
+            with metrics.span('write', rows=total_rows):
+                out_path = dedup.drop_rows_file(path, dropped)
+            replace_dataset_file(file_record, out_path)
+            profile = None
+        save_profile(file_id, profile)
+        version = commit_version(file_record, "Remove Near Duplicates", [versions.drop_delta(dropped, total_rows)])
+        log_action(file_id, "Remove Near Duplicates", {"duplicates_removed": len(dropped),
+                                                       "clusters": shown["clusters_found"]},
+                   status="Duplicates Removed")
+        return dict(response, duplicates_removed=len(dropped), version=version)
+
+    return run_operation(file_id, "Remove Duplicates", work, mutates=not dry_run, file_record=file_record)
 
 @module9_bp.route('/api/module9/fill_missing', methods=['POST'])
 def fill_missing():
     file_id = request.json.get('file_id')
     strategy = request.json.get('strategy', 'mean')  # Default to 'mean'
+    exact = bool(request.json.get('exact', False))  # Exact median/mode when streaming large files
 
     if not file_id:
         return jsonify({"status": "error", "message": "File ID is required."}), 400
@@ -110,31 +492,52 @@ def fill_missing():
     if not file_record:
         return jsonify({"status": "error", "message": "File not found."}), 404
 
-    try:
-        # Load the dataset
-        data = pd.read_csv(file_record['file_path'])
-
-        # Handle missing data based on the strategy
-        if strategy == 'mean':
-            data.fillna(data.mean(), inplace=True)
-        elif strategy == 'median':
-            data.fillna(data.median(), inplace=True)
-        elif strategy == 'mode':
-            data.fillna(data.mode().iloc[0], inplace=True)
+    if strategy not in ('mean', 'median', 'mode'):
+        return jsonify({"status": "error", "message": "Invalid strategy."}), 400
+
+    def work(job):
+        ensure_versioned(file_record)
+        deltas = []
+        path = dataset_path(file_record)
+        in_parallel = parallel.should_parallelize(path)
+        if in_parallel or should_stream(file_record, Config.IN_MEMORY_MAX_BYTES):
+            # Two passes: gather statistics, then apply them chunk by chunk,
+            # split across worker processes for large working copies
+            engine = parallel if in_parallel else stats
+            report(job, f"filling missing values in {'parallel' if in_parallel else 'streaming'} passes",
+                   total_bytes=os.path.getsize(path))
+            with metrics.span('transform', size=os.path.getsize(path)):
+                out_path, fill_values = engine.fill_missing_file(path, strategy, exact)
+            # The cells filled are the nulls of the file being replaced
+            deltas.append(versions.patch_delta(versions.file_null_positions(path, fill_values.index), fill_values))
+            replace_dataset_file(file_record, out_path)
+            if file_record.get('profile') is not None:
+                column_profile.apply_fill(file_record['profile'], fill_values, strategy)
         else:
-            return jsonify({"status": "error", "message": "Invalid strategy."}), 400
+            # Load the dataset
+            report(job, "loading")
+            data = load_dataset(file_record, copy=False)
+
+            # Handle missing data based on the strategy
+            report(job, "filling missing values", rows_processed=len(data))
+            with metrics.span('transform', rows=len(data)):
+                data, _ = cleaning.fill_missing(
+                    data, strategy, cleaning.FrameStats(data, file_record.get('profile')), deltas=deltas
+                )
 
-        # Save the updated data
-        data.to_csv(file_record['file_path'], index=False)
+            # Save the updated data
+            report(job, "saving")
+            store_dataset(file_record, data)
 
         # Log the action
-        update_progress(file_id, "Missing Data Filled")
-        log_action(file_id, "Fill Missing", {"strategy": strategy})
+        if file_record.get('profile') is not None:
+            save_profile(file_id, file_record['profile'])
+        version = commit_version(file_record, "Fill Missing", deltas)
+        log_action(file_id, "Fill Missing", {"strategy": strategy, "version": version}, status="Missing Data Filled")
 
-        return jsonify({"status": "success", "message": f"Missing data filled using {strategy} strategy."}), 200
+        return {"message": f"Missing data filled using {strategy} strategy.", "version": version}
 
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+    return run_operation(file_id, "Fill Missing", work, file_record=file_record)
 
 
 @module9_bp.route('/api/module9/normalize', methods=['POST'])
@@ -148,23 +551,206 @@ def normalize_data():
     if not file_record:
         return jsonify({"status": "error", "message": "File not found."}), 404
 
+    def work(job):
+        ensure_versioned(file_record)
+        deltas = []
+        path = dataset_path(file_record)
+        in_parallel = parallel.should_parallelize(path)
+        if in_parallel or should_stream(file_record, Config.IN_MEMORY_MAX_BYTES):
+            engine = parallel if in_parallel else stats
+            report(job, f"normalizing in {'parallel' if in_parallel else 'streaming'} passes",
+                   total_bytes=os.path.getsize(path))
+            # A known mean/std from the profile saves the statistics pass
+            with metrics.span('transform', size=os.path.getsize(path)):
+                out_path, mean, std = engine.normalize_file(path, known_moments(file_record))
+            deltas.append(versions.affine_delta(mean, std))
+            replace_dataset_file(file_record, out_path)
+            if file_record.get('profile') is not None:
+                column_profile.apply_normalize(file_record['profile'], mean, std)
+            details = {"normalized_columns": list(mean.index)}
+        else:
+            report(job, "loading")
+            data = load_dataset(file_record, copy=False)
+            report(job, "normalizing", rows_processed=len(data))
+            with metrics.span('transform', rows=len(data)):
+                data, details = cleaning.normalize(
+                    data, cleaning.FrameStats(data, file_record.get('profile')), deltas=deltas
+                )
+
+            report(job, "saving")
+            store_dataset(file_record, data)
+
+        if file_record.get('profile') is not None:
+            save_profile(file_id, file_record['profile'])
+        version = commit_version(file_record, "Normalize Data", deltas)
+        log_action(file_id, "Normalize Data", dict(details, version=version), status="Data Normalized")
+
+        return {"normalized_columns": details["normalized_columns"], "version": version}
+
+    return run_operation(file_id, "Normalize Data", work, file_record=file_record)
+
+@module9_bp.route('/api/module9/detect_outliers', methods=['POST'])
+def detect_outliers():
+    file_id = request.json.get('file_id')
+    if not file_id:
+        return jsonify({"status": "error", "message": "File ID is required."}), 400
+
+    method = request.json.get('method', 'zscore')
+    threshold = request.json.get('threshold')
+    output = request.json.get('output', 'counts')
+    exact = bool(request.json.get('exact', False))
+    try:
+        outliers.validate_options(method, threshold, output)
+        max_indices = count_option('max_indices', 1000)
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    file_record = module9_collection.find_one({"file_id": file_id})
+    if not file_record:
+        return jsonify({"status": "error", "message": "File not found."}), 404
+
+    def work(job):
+        if should_stream(file_record, Config.IN_MEMORY_MAX_BYTES):
+            report(job, "detecting outliers in streaming passes")
+            with metrics.span('transform', size=os.path.getsize(dataset_path(file_record))):
+                result = outliers.detect_file(
+                    dataset_path(file_record), method, threshold, output, max_indices,
+                    known=known_moments(file_record) if method == 'zscore' else None, exact=exact
+                )
+        else:
+            report(job, "loading")
+            data = load_dataset(file_record, copy=False)
+            report(job, "detecting outliers", rows_processed=len(data))
+            with metrics.span('transform', rows=len(data)):
+                _, result = cleaning.detect_outliers(
+                    data, cleaning.FrameStats(data, file_record.get('profile')),
+                    method, threshold, output, max_indices
+                )
+
+        log_action(file_id, "Detect Outliers", {
+            "method": method,
+            "threshold": outliers.validate_options(method, threshold),
+            "outliers_detected": result["outliers_detected"]
+        }, status="Outliers Detected")
+
+        return {"method": method, **result}
+
+    return run_operation(file_id, "Detect Outliers", work, mutates=False, file_record=file_record)
+
+@module9_bp.route('/api/module9/pipeline', methods=['POST'])
+def run_pipeline():
+    file_id = request.json.get('file_id')
+    if not file_id:
+        return jsonify({"status": "error", "message": "File ID is required."}), 400
+
+    try:
+        plan = cleaning.build_plan(request.json.get('steps'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    file_record = module9_collection.find_one({"file_id": file_id})
+    if not file_record:
+        return jsonify({"status": "error", "message": "File not found."}), 404
     try:
-        data = pd.read_csv(file_record['file_path'])
-        numeric_columns = data.select_dtypes(include=['number']).columns
-        data[numeric_columns] = (data[numeric_columns] - data[numeric_columns].mean()) / data[numeric_columns].std()
+        for step in plan:
+            check_columns(file_record, step['params'].get('subset'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    def work(job):
+        # One load, every step against the same frame, one write
+        ensure_versioned(file_record)
+        deltas = []
+        started = time.perf_counter()
+        report(job, "loading")
+        data = load_dataset(file_record, copy=False)
+        load_seconds = time.perf_counter() - started
+
+        report(job, "running pipeline", rows_processed=len(data))
+        with metrics.span('transform', rows=len(data)):
+            data, results = cleaning.run_plan(data, plan, file_record.get('profile'), deltas=deltas)
+
+        write_seconds = 0.0
+        version = file_record['version']
+        if deltas:
+            write_started = time.perf_counter()
+            report(job, "saving")
+            store_dataset(file_record, data)
+            version = commit_version(file_record, "Pipeline", deltas)
+            write_seconds = time.perf_counter() - write_started
+
+        timings = {
+            "load_seconds": round(load_seconds, 6),
+            "write_seconds": round(write_seconds, 6),
+            "total_seconds": round(time.perf_counter() - started, 6)
+        }
+
+        # One status update and one log entry for the whole pipeline
+        if file_record.get('profile') is not None:
+            save_profile(file_id, file_record['profile'])
+        log_action(file_id, "Pipeline", {"steps": results, **timings}, status=cleaning.OPERATIONS[plan[-1]['op']][2])
+
+        return {"plan": plan, "steps": results, "version": version, **timings}
+
+    mutates = any(cleaning.OPERATIONS[step['op']][1] for step in plan)
+    return run_operation(file_id, "Pipeline", work, mutates=mutates, file_record=file_record)
+
+@module9_bp.route('/api/module9/export', methods=['POST'])
+def export_data():
+    file_id = request.json.get('file_id')
+    if not file_id:
+        return jsonify({"status": "error", "message": "File ID is required."}), 400
 
-        data.to_csv(file_record['file_path'], index=False)
+    file_record = module9_collection.find_one({"file_id": file_id})
+    if not file_record:
+        return jsonify({"status": "error", "message": "File not found."}), 404
+
+    def export():
+        refresh_record(file_record)
+        return export_csv(file_record)
 
-        update_progress(file_id, "Data Normalized")
-        log_action(file_id, "Normalize Data", {"normalized_columns": list(numeric_columns)})
+    try:
+        # Cleaning ops only touch the working copy; write the CSV on request,
+        # alongside other reads but never while a mutation is mid-way
+        with metrics.operation('export'):
+            file_path, _ = dataset_executor.run(file_id, (file_id, "Export CSV"), export, write=False)
+        log_action(file_id, "Export CSV", {"file_path": file_path})
 
-        return jsonify({"status": "success", "normalized_columns": list(numeric_columns)}), 200
+        return jsonify({"status": "success", "file_path": file_path}), 200
 
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@module9_bp.route('/api/module9/detect_outliers', methods=['POST'])
-def detect_outliers():
+@module9_bp.route('/api/module9/versions', methods=['GET'])
+def list_versions():
+    file_id = request.args.get('file_id')
+    if not file_id:
+        return jsonify({"status": "error", "message": "File ID is required."}), 400
+
+    file_record = module9_collection.find_one({"file_id": file_id}, {field: 1 for field in versions.RECORD_FIELDS})
+    if not file_record:
+        return jsonify({"status": "error", "message": "File not found."}), 404
+
+    return jsonify({
+        "status": "success",
+        "file_id": file_id,
+        "version": file_record.get('version', 0),
+        "base_version": file_record.get('base_version', 0),
+        "versions": file_record.get('versions', [])
+    }), 200
+
+def requested_version(file_record):
+    """The version named in the request body, checked against what the record can still rebuild."""
+    version = request.json.get('version')
+    if isinstance(version, bool) or not isinstance(version, int):
+        raise ValueError("version must be an integer.")
+    if 'version_base_path' not in file_record or not versions.restorable(file_record, version):
+        raise ValueError(f"Version {version} is not available; "
+                         f"versions {file_record.get('base_version', 0)} to {file_record.get('version', 0)} are.")
+    return version
+
+@module9_bp.route('/api/module9/rollback', methods=['POST'])
+def rollback_version():
     file_id = request.json.get('file_id')
     if not file_id:
         return jsonify({"status": "error", "message": "File ID is required."}), 400
@@ -172,33 +758,184 @@ def detect_outliers():
     file_record = module9_collection.find_one({"file_id": file_id})
     if not file_record:
         return jsonify({"status": "error", "message": "File not found."}), 404
+    try:
+        version = requested_version(file_record)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    def work(job):
+        working_path = file_record.get('working_path') or working_copy_path(file_record['file_path'])
+        base, ext = os.path.splitext(working_path)
+        temp_path = f'{base}.rollback{ext}'
+        base_path = file_record['version_base_path']
+        if version == file_record['base_version'] and base_path.endswith(ext):
+            # Back to the base itself: share its file instead of rewriting it
+            versions.link_or_copy(base_path, temp_path)
+        else:
+            report(job, f"rebuilding version {version}")
+            with metrics.span('rebuild') as span:
+                versions.rebuild(file_record, version, temp_path)
+                span.size = os.path.getsize(temp_path)
+        os.replace(temp_path, working_path)
+        dataset_cache.invalidate(file_id)
+        versions.discard_after(file_record, version)
+
+        file_record['working_path'] = working_path
+        module9_collection.update_one({"file_id": file_id}, {"$set": {"working_path": working_path}})
+        save_versions(file_record)
+        save_profile(file_id, None)  # Rebuilt from the restored data on next use
+        log_action(file_id, "Rollback", {"version": version}, status="Rolled Back")
+
+        return {"version": version}
+
+    return run_operation(file_id, "Rollback", work, file_record=file_record)
+
+@module9_bp.route('/api/module9/rebuild', methods=['POST'])
+def rebuild_version():
+    file_id = request.json.get('file_id')
+    if not file_id:
+        return jsonify({"status": "error", "message": "File ID is required."}), 400
 
+    file_record = module9_collection.find_one({"file_id": file_id})
+    if not file_record:
+        return jsonify({"status": "error", "message": "File not found."}), 404
     try:
-        data = pd.read_csv(file_record['file_path'])
-        numeric_columns = data.select_dtypes(include=['number']).columns
-        outlier_info = {}
+        version = requested_version(file_record)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
 
-        for col in numeric_columns:
-            z_scores = np.abs((data[col] - data[col].mean()) / data[col].std())
-            outliers = data[z_scores > 3]
-            outlier_info[col] = len(outliers)
+    def work(job):
+        # Written out as CSV next to the upload, like an export; the dataset itself is untouched
+        file_path = f"{os.path.splitext(file_record['file_path'])[0]}.v{version}.csv"
+        report(job, f"rebuilding version {version}")
+        with metrics.span('rebuild') as span:
+            versions.rebuild(file_record, version, file_path)
+            span.size = os.path.getsize(file_path)
+        log_action(file_id, "Rebuild Version", {"version": version, "file_path": file_path})
 
-        log_action(file_id, "Detect Outliers", {"outliers_detected": outlier_info})
-        update_progress(file_id, "Outliers Detected")
+        return {"version": version, "file_path": file_path}
 
-        return jsonify({"status": "success", "outliers_detected": outlier_info}), 200
+    return run_operation(file_id, "Rebuild Version", work, mutates=False, file_record=file_record)
+
+@module9_bp.route('/api/module9/profile', methods=['GET'])
+def get_column_profile():
+    file_id = request.args.get('file_id')
+    if not file_id:
+        return jsonify({"status": "error", "message": "File ID is required."}), 400
+
+    file_record = module9_collection.find_one({"file_id": file_id})
+    if not file_record:
+        return jsonify({"status": "error", "message": "File not found."}), 404
 
+    try:
+        # Served from the stored profile; the dataset is only read to (re)build it
+        profile = get_profile(file_record, refresh=request.args.get('refresh', '').lower() in ('1', 'true'))
+
+        column = request.args.get('column')
+        if column:
+            entry = column_profile.find_column(profile, column)
+            if entry is None:
+                return jsonify({"status": "error", "message": f"Unknown column: {column}"}), 404
+            return jsonify({"status": "success", "row_count": profile["row_count"], "column": entry}), 200
+
+        return jsonify({"status": "success", "profile": profile}), 200
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+def read_preview(file_record, read):
+    """
+    Run read(path) on the file holding the dataset's current state. Rows of a
+    record still on its original upload are raw text, so its import schema
+    is applied to them.
+    """
+    path = dataset_path(file_record)
+    frame = read(path)
+    if path == file_record['file_path']:
+        frame = preview.typed(frame, file_record.get('schema'))
+    return frame
+
+@module9_bp.route('/api/module9/preview', methods=['GET'])
+def preview_rows():
+    file_id = request.args.get('file_id')
+    if not file_id:
+        return jsonify({"status": "error", "message": "File ID is required."}), 400
+    try:
+        offset, limit = preview.page_params(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    file_record = module9_collection.find_one({"file_id": file_id}, {"profile": 0, "actions_log": 0})
+    if not file_record:
+        return jsonify({"status": "error", "message": "File not found."}), 404
+
+    try:
+        data = dataset_cache.get(file_id)
+        if data is not None:
+            total_rows, rows = len(data), data.iloc[offset:offset + limit]
+        else:
+            # Seek straight to the page: a Feather slice or a row-index lookup
+            path = dataset_path(file_record)
+            total_rows = preview.row_count(path)
+            rows = read_preview(file_record, lambda path: preview.read_rows(path, offset, limit))
+        return jsonify({
+            "status": "success", "file_id": file_id, "total_rows": total_rows,
+            "offset": offset, "limit": limit, "rows": preview.records(rows)
+        }), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@module9_bp.route('/api/module9/sample', methods=['GET'])
+def sample_rows():
+    file_id = request.args.get('file_id')
+    if not file_id:
+        return jsonify({"status": "error", "message": "File ID is required."}), 400
+    try:
+        size, method, by, seed = preview.sample_params(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    file_record = module9_collection.find_one({"file_id": file_id}, {"profile": 0, "actions_log": 0})
+    if not file_record:
+        return jsonify({"status": "error", "message": "File not found."}), 404
+
+    try:
+        rows = read_preview(file_record, lambda path: preview.sample_rows(path, size, method, by, seed))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
+    return jsonify({
+        "status": "success", "file_id": file_id, "method": method, "size": len(rows),
+        "row_numbers": [int(i) for i in rows.index], "rows": preview.records(rows)
+    }), 200
 
 @module9_bp.route('/api/module9/progress', methods=['GET'])
 def track_cleaning_progress():
+    # Progress of a single background operation
+    job_id = request.args.get('job_id')
+    if job_id:
+        job = job_registry.get(job_id)
+        if job is None:
+            return jsonify({"status": "error", "message": "Job not found."}), 404
+        return jsonify({"status": "success", "progress": job}), 200
+
     file_id = request.args.get('file_id')
     if not file_id:
         return jsonify({"status": "error", "message": "File ID is required."}), 400
 
-    progress = module9_collection.find_one({"file_id": file_id})
+    # The record without its profile; the log is paged from its own collection
+    progress = module9_collection.find_one({"file_id": file_id}, {"_id": 0, "profile": 0, "actions_log": 0})
     if not progress:
         return jsonify({"status": "error", "message": "No progress found for this file."}), 404
+    progress.update(audit_log.pending_status(file_id))
+
+    try:
+        limit = min(max(int(request.args.get('log_limit', 20)), 1), 200)
+        entries, next_before = audit_log.tail(file_id, limit, request.args.get('log_before'))
+    except (ValueError, InvalidId) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    progress["actions_log"] = entries
+    progress["actions_log_next"] = next_before
 
     return jsonify({"status": "success", "progress": progress}), 200
@@ -0,0 +1,277 @@
+import atexit
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+from pymongo import MongoClient, monitoring
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Shared by every blueprint; each process gets one client and one connection pool
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+
+
+class HealthListener(monitoring.ServerHeartbeatListener):
+    """Keeps the factory's health state current from the driver's own server heartbeats."""
+
+    def __init__(self, factory):
+        self.factory = factory
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.factory._set_health(True, latency_ms=round(event.duration * 1000, 2))
+
+    def failed(self, event):
+        self.factory._set_health(False, error=str(event.reply))
+
+
+class MongoClientFactory:
+    """
+    Lazily created, process-wide MongoClient.
+    Nothing touches the network at import time: the client is built on
+    first use with connect=False, and rebuilt after a fork (e.g. gunicorn
+    --preload) since a client must not be shared across processes.
+    Health is cached from heartbeats, so status checks rarely need a round trip.
+    client_class may be swapped for a stand-in such as mongomock.MongoClient
+    (see benchmark.py) before the first client is made.
+    """
+
+    def __init__(self, uri, client_class=MongoClient, **options):
+        self.uri = uri
+        self.client_class = client_class
+        self.options = options
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._health = {"connected": None, "checked_at": None, "latency_ms": None, "error": None}
+        self._checked = 0.0
+        self._indexes = []  # (collection, keys, options) declared by the modules that query them
+
+    def client(self):
+        """The MongoClient for this process, created on first call."""
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                self._client = self.client_class(
+                    self.uri, connect=False, event_listeners=[HealthListener(self)], **self.options
+                )
+                self._pid = os.getpid()
+            return self._client
+
+    def database(self, name):
+        """A handle on a database that resolves the client only when used."""
+        return LazyDatabase(self, name)
+
+    def declare_index(self, collection, keys, **options):
+        """Register an index for ensure_indexes to create; modules declare the ones their queries need."""
+        self._indexes.append((collection, keys, options))
+
+    def ensure_indexes(self):
+        """
+        Create every declared index; existing ones are left alone. A failure
+        (e.g. duplicates blocking a unique index) is reported and skipped.
+        Returns the number of indexes in place.
+        """
+        created = 0
+        for collection, keys, options in self._indexes:
+            try:
+                collection.create_index(keys, **options)
+                created += 1
+            except Exception:
+                logger.exception("Failed to create index %s on %s", keys, collection.full_name)
+        return created
+
+    def ensure_indexes_in_background(self):
+        """Run ensure_indexes off the startup path so booting never waits on MongoDB."""
+        threading.Thread(target=self.ensure_indexes, name='mongo-indexes', daemon=True).start()
+
+    def health(self, max_age=None):
+        """
+        Cached connection health. A ping is only sent when no heartbeat or
+        ping has been seen for max_age seconds (Config.MONGO_HEALTH_TTL).
+        """
+        max_age = Config.MONGO_HEALTH_TTL if max_age is None else max_age
+        if self._health["connected"] is None or time.monotonic() - self._checked > max_age:
+            started = time.perf_counter()
+            try:
+                self.client().admin.command('ping')
+                self._set_health(True, latency_ms=round((time.perf_counter() - started) * 1000, 2))
+            except Exception as e:
+                self._set_health(False, error=str(e))
+        return dict(self._health)
+
+    def _set_health(self, connected, latency_ms=None, error=None):
+        self._health = {
+            "connected": connected,
+            "checked_at": datetime.utcnow(),
+            "latency_ms": latency_ms,
+            "error": error,
+        }
+        self._checked = time.monotonic()
+
+
+class LazyDatabase:
+    """Stand-in for a pymongo Database bound to the factory's current client."""
+
+    def __init__(self, factory, name):
+        self._factory = factory
+        self._name = name
+
+    def __getitem__(self, name):
+        return LazyCollection(self._factory, self._name, name)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+
+class LazyCollection:
+    """Stand-in for a pymongo Collection; every call goes to the current process's client."""
+
+    def __init__(self, factory, database, name):
+        self._factory = factory
+        self._database = database
+        self._name = name
+
+    @property
+    def full_name(self):
+        return f"{self._database}.{self._name}"
+
+    def __getattr__(self, attr):
+        return getattr(self._factory.client()[self._database][self._name], attr)
+
+
+def redact(connection_string):
+    """A connection string with its password masked, safe to log or return."""
+    return re.sub(r'(://[^:/@]+:)[^@/]*@', r'\1***@', connection_string)
+
+
+class ConnectionRegistry:
+    """
+    Pooled MongoClients for external databases, one per connection string,
+    reused across requests instead of opening (and leaking) a client each
+    time. At most max_clients are open: the least recently used idle one is
+    closed to make room, and a background thread closes any left idle for
+    idle_seconds. Clients are leased while in use and never closed under a
+    caller. Like MongoClientFactory, clients are rebuilt after a fork.
+    """
+
+    def __init__(self, max_clients=8, idle_seconds=300, client_class=MongoClient, **options):
+        self.max_clients = max_clients
+        self.idle_seconds = idle_seconds
+        self.client_class = client_class
+        self.options = options
+        self._clients = OrderedDict()  # connection string -> [client, leases, last used], least recent first
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='mongo-registry', daemon=True)
+            self._thread.start()
+            atexit.register(self.close_all)
+
+    def _acquire(self, connection_string):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._clients.clear()  # The parent's clients must not be used (or closed) here
+                self._pid = os.getpid()
+                self._thread = None  # Nor is its eviction thread running here
+            entry = self._clients.get(connection_string)
+            if entry is None:
+                if len(self._clients) >= self.max_clients:
+                    idle = next((key for key, value in self._clients.items() if value[1] == 0), None)
+                    if idle is None:
+                        raise RuntimeError(f"All {self.max_clients} external connection pools are in use.")
+                    self._clients.pop(idle)[0].close()
+                # connect=False: a bad address surfaces on first use, not while the lock is held
+                entry = self._clients[connection_string] = [
+                    self.client_class(connection_string, connect=False, **self.options), 0, 0.0
+                ]
+                self._start()
+            self._clients.move_to_end(connection_string)
+            entry[1] += 1
+            return entry[0]
+
+    def _release(self, connection_string):
+        with self._lock:
+            entry = self._clients.get(connection_string)
+            if entry is not None:
+                entry[1] -= 1
+                entry[2] = time.monotonic()
+
+    @contextmanager
+    def lease(self, connection_string):
+        """The pooled client for a connection string, held open for the with block."""
+        client = self._acquire(connection_string)
+        try:
+            yield client
+        finally:
+            self._release(connection_string)
+
+    def evict_idle(self, max_idle=None):
+        """Close the clients nobody has used for max_idle seconds. Returns how many were closed."""
+        max_idle = self.idle_seconds if max_idle is None else max_idle
+        cutoff = time.monotonic() - max_idle
+        with self._lock:
+            stale = [key for key, (_, leases, used) in self._clients.items() if leases == 0 and used <= cutoff]
+            closing = [self._clients.pop(key)[0] for key in stale]
+        for client in closing:
+            client.close()
+        return len(closing)
+
+    def close_all(self):
+        with self._lock:
+            closing = [entry[0] for entry in self._clients.values()]
+            self._clients.clear()
+        for client in closing:
+            client.close()
+
+    def stats(self):
+        """Open pools, most recently used last, with passwords masked."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {"connection": redact(key), "in_use": leases, "idle_seconds": round(now - used, 1) if not leases else 0}
+                for key, (_, leases, used) in self._clients.items()
+            ]
+
+    def _run(self):
+        while True:
+            time.sleep(max(self.idle_seconds / 4, 1))
+            self.evict_idle()
+
+
+mongo = MongoClientFactory(
+    MONGO_URI,
+    maxPoolSize=Config.MONGO_MAX_POOL_SIZE,
+    minPoolSize=Config.MONGO_MIN_POOL_SIZE,
+    connectTimeoutMS=Config.MONGO_CONNECT_TIMEOUT_MS,
+    serverSelectionTimeoutMS=Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    socketTimeoutMS=Config.MONGO_SOCKET_TIMEOUT_MS or None,
+)
+
+
+# External databases named by users, e.g. as import sources
+external_clients = ConnectionRegistry(
+    max_clients=Config.EXTERNAL_MONGO_MAX_CLIENTS,
+    idle_seconds=Config.EXTERNAL_MONGO_IDLE_SECONDS,
+    maxPoolSize=Config.EXTERNAL_MONGO_MAX_POOL_SIZE,
+    connectTimeoutMS=Config.MONGO_CONNECT_TIMEOUT_MS,
+    serverSelectionTimeoutMS=Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+)
+
+
+def get_database(name):
+    """Shorthand for mongo.database(name)."""
+    return mongo.database(name)
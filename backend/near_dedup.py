@@ -0,0 +1,308 @@
+import numpy as np
+import pandas as pd
+
+from config import Config
+from preview import records
+
+# Separates the chosen columns in a row's key; punctuation is stripped from values, so it cannot occur in them
+COLUMN_SEPARATOR = ' | '
+# Rows hashed per step when building signatures
+SIGNATURE_CHUNK_ROWS = 20000
+# Row positions listed per cluster in a summary
+MAX_CLUSTER_ROWS = 100
+
+
+def validate_options(threshold=None, max_block_size=None, max_candidate_pairs=None):
+    """Check the fuzzy options and fill in the configured defaults."""
+    threshold = Config.FUZZY_THRESHOLD if threshold is None else threshold
+    max_block_size = Config.FUZZY_MAX_BLOCK_SIZE if max_block_size is None else max_block_size
+    max_candidate_pairs = Config.FUZZY_MAX_CANDIDATE_PAIRS if max_candidate_pairs is None else max_candidate_pairs
+    if isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or not 0 < threshold <= 1:
+        raise ValueError("threshold must be a number in (0, 1].")
+    for name, value in (("max_block_size", max_block_size), ("max_candidate_pairs", max_candidate_pairs)):
+        if isinstance(value, bool) or not isinstance(value, int) or value < 2:
+            raise ValueError(f"{name} must be an integer of at least 2.")
+    return float(threshold), max_block_size, max_candidate_pairs
+
+
+def text_columns(frame):
+    """Columns worth comparing when none are chosen: the text and categorical ones."""
+    return [column for column in frame.columns
+            if not pd.api.types.is_numeric_dtype(frame[column]) and not pd.api.types.is_datetime64_any_dtype(frame[column])]
+
+
+def normalize_text(values):
+    """Case, accents, punctuation and runs of whitespace folded away, so typos are what is left to compare."""
+    # Python-backed strings, so the patterns run with re's Unicode classes whichever string storage is default
+    text = values.astype(pd.StringDtype('python')).fillna('')
+    text = text.str.normalize('NFKD').str.replace('[\u0300-\u036f]', '', regex=True).str.lower()
+    text = text.str.replace(r'[^\w\s]', ' ', regex=True).str.replace(r'\s+', ' ', regex=True).str.strip()
+    return text
+
+
+def row_keys(frame, columns):
+    """One normalized string per row from the chosen columns; empty when all of them are."""
+    parts = [normalize_text(frame[column]) for column in columns]
+    keys = parts[0]
+    for part in parts[1:]:
+        keys = keys + COLUMN_SEPARATOR + part
+    blank = np.logical_and.reduce([part == '' for part in parts])
+    return keys.where(~blank, '').to_numpy(dtype=object)
+
+
+def shingles(key):
+    """Character 3-grams of a key, padded so one-letter values still have one."""
+    padded = f' {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _gram_codes(keys):
+    """
+    Every byte 3-gram of the padded UTF-8 keys as a 24-bit integer, with the
+    offset where each key's grams start: the input MinHash reduces per row.
+    """
+    encoded = [f' {key} '.encode('utf-8') for key in keys]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    flat = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    counts = lengths - 2
+    starts = np.repeat(np.cumsum(lengths) - lengths, counts)
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    index = starts + within
+    codes = (flat[index].astype(np.uint64) << np.uint64(16)) | (flat[index + 1].astype(np.uint64) << np.uint64(8)) \
+        | flat[index + 2].astype(np.uint64)
+    return codes, np.cumsum(counts) - counts
+
+
+def minhash_signatures(keys, multipliers, increments):
+    """
+    MinHash signature of each key's 3-gram set: for every hash function
+    (multiply-shift, a * x + b mod 2^64, high 32 bits) the smallest value
+    over the key's grams. Two signatures agree in a position with
+    probability equal to the keys' Jaccard similarity.
+    """
+    signatures = np.empty((len(keys), len(multipliers)), dtype=np.uint32)
+    if not len(keys):
+        return signatures
+    codes, offsets = _gram_codes(keys)
+    with np.errstate(over='ignore'):
+        for i, (a, b) in enumerate(zip(multipliers, increments)):
+            hashed = ((codes * a + b) >> np.uint64(32)).astype(np.uint32)
+            signatures[:, i] = np.minimum.reduceat(hashed, offsets)
+    return signatures
+
+
+def lsh_parameters(threshold, num_perm):
+    """
+    Bands and rows per band, using at most num_perm signature positions.
+    Keys collide in some band with high probability once their similarity
+    passes roughly (1 / bands) ** (1 / rows); pick the split whose bend sits
+    closest below the threshold, so candidates are rarely missed and few
+    dissimilar pairs need verifying.
+    """
+    best = (num_perm, 1)
+    best_bend = 0.0
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        bend = (1 / bands) ** (1 / rows)
+        if best_bend < bend <= threshold:
+            best, best_bend = (bands, rows), bend
+    return best
+
+
+def _bucket_pairs(keys, max_block_size):
+    """
+    Pairs of positions sharing a bucket key, as i * 2^32 + j with i < j.
+    Buckets larger than max_block_size are skipped: their pairs would cost
+    more than they are worth (e.g. a key shared by every blank address).
+    """
+    order = np.argsort(keys, kind='stable')
+    ordered = keys[order]
+    bounds = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1], True])
+    sizes = np.diff(bounds)
+    skipped = int(np.count_nonzero(sizes > max_block_size))
+    pairs = []
+    for size in np.unique(sizes[(sizes >= 2) & (sizes <= max_block_size)]):
+        starts = bounds[:-1][sizes == size]
+        members = order[starts[:, None] + np.arange(size)]  # One row of positions per bucket
+        first, second = np.triu_indices(size, 1)
+        left, right = members[:, first].ravel(), members[:, second].ravel()
+        low, high = np.minimum(left, right), np.maximum(left, right)
+        pairs.append((low.astype(np.int64) << 32) | high.astype(np.int64))
+    return (np.concatenate(pairs) if pairs else np.empty(0, dtype=np.int64)), skipped
+
+
+class _DisjointSets:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        root = item
+        while self.parent.get(root, root) != root:
+            root = self.parent[root]
+        while item != root:
+            self.parent[item], item = root, self.parent.get(item, item)
+        return root
+
+    def union(self, left, right):
+        left, right = self.find(left), self.find(right)
+        if left != right:
+            self.parent[max(left, right)] = min(left, right)
+
+
+class NearDuplicates:
+    """Clusters of near-duplicate rows found by find_near_duplicates, with what it cost to find them."""
+
+    def __init__(self, clusters, representatives, stats):
+        self.clusters = clusters  # Row positions of each cluster, representative included
+        self.representatives = representatives  # Position of the row kept from each cluster
+        self.stats = stats
+
+    @property
+    def dropped(self):
+        """Positions of every clustered row but the representatives, sorted."""
+        if not self.clusters:
+            return np.empty(0, dtype=np.int64)
+        members = np.concatenate(self.clusters)
+        return np.sort(np.setdiff1d(members, np.asarray(self.representatives, dtype=np.int64)))
+
+    def summary(self, max_clusters=100):
+        """JSON-ready result: the largest clusters first, each listing its rows."""
+        order = sorted(range(len(self.clusters)), key=lambda i: (-len(self.clusters[i]), self.representatives[i]))
+        clusters = []
+        for i in order[:max_clusters]:
+            entry = {
+                "representative": int(self.representatives[i]),
+                "size": len(self.clusters[i]),
+                "rows": [int(row) for row in self.clusters[i][:MAX_CLUSTER_ROWS]]
+            }
+            clusters.append(entry)
+        return {
+            "clusters_found": len(self.clusters),
+            "duplicates_found": int(len(self.dropped)),
+            "clusters": clusters,
+            **self.stats
+        }
+
+
+def rows_at(chunks, positions, columns=None):
+    """JSON-ready rows at the given positions, keyed by position, in one pass over chunks()."""
+    positions = np.sort(np.asarray(positions, dtype=np.int64))
+    found, offset = {}, 0
+    for chunk in chunks():
+        lo, hi = np.searchsorted(positions, [offset, offset + len(chunk)])
+        if lo < hi:
+            picked = chunk.iloc[positions[lo:hi] - offset]
+            for position, row in zip(positions[lo:hi].tolist(), records(picked[columns] if columns else picked)):
+                found[position] = row
+        offset += len(chunk)
+        if hi == len(positions):
+            break
+    return found
+
+
+def find_near_duplicates(chunks, columns=None, threshold=None, block_by=None, max_block_size=None,
+                         max_candidate_pairs=None, num_perm=None, seed=0):
+    """
+    Cluster rows whose chosen columns are near-identical once normalized.
+    One pass over chunks() builds a MinHash signature per row and keeps
+    only that and its normalized key; candidate pairs then come from rows
+    sharing an LSH bucket, in roughly linear time instead of comparing all
+    pairs.
+    block_by columns must match exactly for rows to be compared. Candidates
+    are verified by the exact Jaccard similarity of their 3-gram sets and
+    joined into clusters; each keeps the row with the most values filled
+    (the first on ties). Stops adding candidates at max_candidate_pairs and
+    reports that it did.
+    """
+    threshold, max_block_size, max_candidate_pairs = validate_options(threshold, max_block_size, max_candidate_pairs)
+    num_perm = num_perm or Config.FUZZY_NUM_PERM
+    bands, rows_per_band = lsh_parameters(threshold, num_perm)
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)  # Odd, for multiply-shift
+    increments = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    keys, signatures, blocks, rows, filled, total = [], [], [], [], [], 0  # All but filled cover compared rows only
+    for chunk in chunks():
+        if columns is None:
+            columns = text_columns(chunk)
+            if not columns:
+                raise ValueError("No text columns to compare; choose columns with 'subset'.")
+        missing = [column for column in list(columns) + list(block_by or []) if column not in chunk.columns]
+        if missing:
+            raise ValueError(f"Unknown columns: {missing}")
+        for start in range(0, len(chunk), SIGNATURE_CHUNK_ROWS):
+            piece = chunk.iloc[start:start + SIGNATURE_CHUNK_ROWS]
+            piece_keys = row_keys(piece, columns)
+            indexed = piece_keys != ''  # Rows with nothing to compare never match
+            keys.append(piece_keys[indexed])
+            filled.append(piece[columns].notna().sum(axis=1).to_numpy())
+            signatures.append(minhash_signatures(piece_keys[indexed], multipliers, increments))
+            if block_by:
+                blocks.append(pd.util.hash_pandas_object(piece[block_by][indexed], index=False).to_numpy())
+            rows.append(np.flatnonzero(indexed) + total + start)
+        total += len(chunk)
+
+    keys = np.concatenate(keys) if keys else np.empty(0, dtype=object)
+    filled = np.concatenate(filled) if filled else np.empty(0, dtype=np.int64)
+    signatures = np.concatenate(signatures) if signatures else np.empty((0, num_perm), dtype=np.uint32)
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+
+    # Candidates: pairs sharing a bucket in any band (and the same block_by values)
+    candidates, skipped, truncated = np.empty(0, dtype=np.int64), 0, False
+    for band in range(bands):
+        frame = pd.DataFrame(signatures[:, band * rows_per_band:(band + 1) * rows_per_band])
+        if block_by:
+            frame['block'] = np.concatenate(blocks)
+        pairs, band_skipped = _bucket_pairs(pd.util.hash_pandas_object(frame, index=False).to_numpy(), max_block_size)
+        skipped += band_skipped
+        candidates = np.sort(np.concatenate([candidates, pairs]))
+        candidates = candidates[np.r_[True, candidates[1:] != candidates[:-1]]] if len(candidates) else candidates
+        if len(candidates) > max_candidate_pairs:
+            candidates, truncated = candidates[:max_candidate_pairs], True
+            break
+
+    # The signatures estimate each pair's similarity in bulk; only pairs the
+    # estimate leaves in reach of the threshold (two standard errors) get the exact check
+    lefts, rights = candidates >> 32, candidates & 0xFFFFFFFF
+    estimate = np.empty(len(candidates))
+    for start in range(0, len(candidates), SIGNATURE_CHUNK_ROWS):
+        part = slice(start, start + SIGNATURE_CHUNK_ROWS)
+        estimate[part] = (signatures[lefts[part]] == signatures[rights[part]]).mean(axis=1)
+    margin = 2 * np.sqrt(threshold * (1 - threshold) / num_perm)
+    likely = np.flatnonzero(estimate >= threshold - margin)
+    likely = likely[np.argsort(-estimate[likely], kind='stable')]  # Strongest first, so clusters form early
+
+    sets = _DisjointSets()
+    grams, verified = {}, 0
+    for left, right in zip(lefts[likely].tolist(), rights[likely].tolist()):
+        if sets.find(int(rows[left])) == sets.find(int(rows[right])):
+            continue  # Already joined through other pairs; checking would not change the clusters
+        for row in (left, right):
+            if row not in grams:
+                grams[row] = shingles(keys[row])
+        a, b = grams[left], grams[right]
+        if len(a & b) >= threshold * len(a | b):
+            verified += 1
+            sets.union(int(rows[left]), int(rows[right]))
+
+    members = {}
+    for row in set(sets.parent) | set(sets.parent.values()):
+        members.setdefault(sets.find(row), []).append(row)
+    clusters, representatives = [], []
+    for cluster in sorted(members.values(), key=min):
+        cluster = np.sort(np.asarray(cluster, dtype=np.int64))
+        clusters.append(cluster)
+        representatives.append(int(cluster[np.argmax(filled[cluster])]))  # argmax keeps the first of equals
+
+    return NearDuplicates(clusters, representatives, {
+        "columns": list(columns or []),
+        "threshold": threshold,
+        "rows_scanned": total,
+        "bands": bands,
+        "rows_per_band": rows_per_band,
+        "candidate_pairs": int(len(candidates)),
+        "estimated_pairs": int(len(likely)),
+        "verified_pairs": verified,
+        "blocks_skipped": skipped,
+        "candidates_truncated": truncated
+    })
@@ -0,0 +1,189 @@
+import base64
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from dataset_cache import iter_chunks
+from stats import gather_statistics
+
+METHODS = ('zscore', 'modified_zscore', 'iqr')
+DEFAULT_THRESHOLDS = {'zscore': 3.0, 'modified_zscore': 3.5, 'iqr': 1.5}
+OUTPUTS = ('counts', 'indices', 'bitmap')
+
+# Columns per block; wider tables are split into blocks processed on a thread pool
+BLOCK_COLUMNS = 64
+# Scales the MAD so the modified z-score matches the z-score for normal data
+MAD_SCALE = 0.6745
+
+
+def validate_options(method='zscore', threshold=None, output='counts'):
+    """Check the request options and fill in the method's default threshold."""
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {', '.join(METHODS)}.")
+    if output not in OUTPUTS:
+        raise ValueError(f"output must be one of {', '.join(OUTPUTS)}.")
+    try:
+        threshold = DEFAULT_THRESHOLDS[method] if threshold is None else float(threshold)
+    except (TypeError, ValueError):
+        raise ValueError("threshold must be a number.")
+    if not math.isfinite(threshold) or threshold <= 0:
+        raise ValueError("threshold must be positive.")
+    return threshold
+
+
+def fences(matrix, method, threshold, mean=None, std=None):
+    """
+    Lower and upper fences per column of a float matrix; values strictly
+    outside them are outliers. Every method reduces to fences:
+    zscore is |x - mean| > t * std, modified_zscore is
+    |x - median| > t * MAD / 0.6745, and iqr is outside [Q1 - t*IQR, Q3 + t*IQR].
+    """
+    if method == 'zscore':
+        if mean is None:
+            mean = np.nanmean(matrix, axis=0)
+            std = np.nanstd(matrix, axis=0, ddof=1)
+        return mean - threshold * std, mean + threshold * std
+    if method == 'modified_zscore':
+        median = np.nanmedian(matrix, axis=0)
+        mad = np.nanmedian(np.abs(matrix - median), axis=0)
+        return _mad_fences(median, mad, threshold)
+    q1, q3 = np.nanpercentile(matrix, [25, 75], axis=0)
+    return q1 - threshold * (q3 - q1), q3 + threshold * (q3 - q1)
+
+
+def _mad_fences(median, mad, threshold):
+    # A zero MAD leaves the modified z-score undefined; flag nothing in that column
+    spread = np.where(mad > 0, threshold * mad / MAD_SCALE, np.inf)
+    return median - spread, median + spread
+
+
+class BitmapBuilder:
+    """Packs a boolean row mask into bits as it arrives in pieces."""
+
+    def __init__(self):
+        self.parts = []
+        self.carry = np.empty(0, dtype=bool)
+
+    def add(self, mask):
+        mask = np.concatenate([self.carry, mask])
+        whole = len(mask) // 8 * 8
+        self.parts.append(np.packbits(mask[:whole]))
+        self.carry = mask[whole:]
+
+    def encode(self):
+        return base64.b64encode(np.concatenate(self.parts + [np.packbits(self.carry)]).tobytes()).decode('ascii')
+
+
+class OutlierReport:
+    """Collects per-column counts and, depending on output, row indices or bitmaps."""
+
+    def __init__(self, columns, output='counts', max_indices=1000):
+        self.columns = list(columns)
+        self.output = output
+        self.max_indices = max_indices
+        self.counts = np.zeros(len(self.columns), dtype=np.int64)
+        self.rows_flagged = 0
+        self.indices = {col: [] for col in self.columns} if output == 'indices' else None
+        self.bitmaps = {col: BitmapBuilder() for col in self.columns} if output == 'bitmap' else None
+
+    def add(self, mask, offset=0):
+        """Fold in a (rows x columns) outlier mask starting at row `offset`."""
+        self.counts += mask.sum(axis=0)
+        self.rows_flagged += int(mask.any(axis=1).sum())
+        for j, col in enumerate(self.columns):
+            if self.indices is not None:
+                room = self.max_indices - len(self.indices[col])
+                if room > 0:
+                    self.indices[col].extend((np.flatnonzero(mask[:, j])[:room] + offset).tolist())
+            if self.bitmaps is not None:
+                self.bitmaps[col].add(mask[:, j])
+
+    def result(self):
+        result = {
+            "outliers_detected": {col: int(count) for col, count in zip(self.columns, self.counts)},
+            "rows_flagged": self.rows_flagged
+        }
+        if self.indices is not None:
+            result["outlier_indices"] = self.indices
+        if self.bitmaps is not None:
+            result["outlier_bitmaps"] = {col: bitmap.encode() for col, bitmap in self.bitmaps.items()}
+        return result
+
+
+def _detect_block(data, columns, method, threshold, mean, std):
+    matrix = data[columns].to_numpy(dtype=float, na_value=np.nan)
+    block_mean = mean[columns].to_numpy(dtype=float) if mean is not None else None
+    block_std = std[columns].to_numpy(dtype=float) if std is not None else None
+    lower, upper = fences(matrix, method, threshold, block_mean, block_std)
+    return (matrix < lower) | (matrix > upper)
+
+
+def detect(data, method='zscore', threshold=None, output='counts', max_indices=1000,
+           mean=None, std=None, max_workers=None):
+    """
+    Flag outliers in every numeric column of a loaded frame at once.
+    Columns are processed as float matrices in blocks of BLOCK_COLUMNS, on a
+    thread pool when there is more than one block (NumPy releases the GIL).
+    A known mean/std (e.g. from the column profile) skips recomputing them
+    for the zscore method.
+    """
+    threshold = validate_options(method, threshold, output)
+    columns = list(data.select_dtypes(include=['number']).columns)
+    report = OutlierReport(columns, output, max_indices)
+    if not columns:
+        return report.result()
+    blocks = [columns[i:i + BLOCK_COLUMNS] for i in range(0, len(columns), BLOCK_COLUMNS)]
+    if method != 'zscore':
+        mean = std = None
+    if len(blocks) == 1:
+        masks = [_detect_block(data, blocks[0], method, threshold, mean, std)]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+            masks = list(pool.map(lambda block: _detect_block(data, block, method, threshold, mean, std), blocks))
+    report.add(np.hstack(masks) if len(masks) > 1 else masks[0])
+    return report.result()
+
+
+def detect_file(path, method='zscore', threshold=None, output='counts', max_indices=1000,
+                known=None, exact=False, chunk_rows=None):
+    """
+    Flag outliers in a dataset file streamed chunk by chunk.
+    Fences come from streaming statistics: Welford moments for zscore (or a
+    known mean/std), t-digest quartiles for iqr, and for modified_zscore a
+    median pass followed by a pass for the median absolute deviation.
+    Pass exact=True for exact quantiles at the cost of memory.
+    """
+    threshold = validate_options(method, threshold, output)
+    if method == 'zscore':
+        if known is not None:
+            mean, std = known
+        else:
+            stats = gather_statistics(path, ['mean', 'std'], chunk_rows=chunk_rows)
+            mean = stats.get('mean')
+            std = stats.get('std')
+        columns = list(mean.index)
+        lower, upper = fences(None, method, threshold, mean.to_numpy(dtype=float), std.to_numpy(dtype=float))
+    else:
+        stats = gather_statistics(path, ['median'], exact, chunk_rows)
+        columns = stats.numeric_columns or []
+        if method == 'iqr':
+            q1, q3 = stats.quantile(0.25), stats.quantile(0.75)
+            lower, upper = q1 - threshold * (q3 - q1), q3 + threshold * (q3 - q1)
+        else:
+            median = stats.get('median')
+            deviations = gather_statistics(
+                path, ['median'], exact, chunk_rows,
+                transform=lambda chunk: (chunk[columns] - median).abs()
+            )
+            lower, upper = _mad_fences(median, deviations.get('median'), threshold)
+        lower, upper = np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)
+
+    report = OutlierReport(columns, output, max_indices)
+    offset = 0
+    for chunk in iter_chunks(path, chunk_rows):
+        matrix = chunk[columns].to_numpy(dtype=float, na_value=np.nan)
+        report.add((matrix < lower) | (matrix > upper), offset)
+        offset += len(chunk)
+    return report.result()
@@ -0,0 +1,144 @@
+import base64
+from datetime import date, datetime
+
+from bson import ObjectId, json_util
+from flask import Response, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from pymongo import DESCENDING
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Documents fetched per round trip while streaming NDJSON
+STREAM_BATCH_SIZE = 500
+
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """
+    Flask 3 JSON provider that understands MongoDB documents: ObjectIds
+    become strings and datetimes ISO 8601. (Flask 3 ignores app.json_encoder.)
+    Install with app.json = MongoJSONProvider(app).
+    """
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, ObjectId):
+            return str(o)
+        if isinstance(o, (datetime, date)):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+
+def encode_cursor(doc, sort_field=None):
+    """Opaque token marking the position just after doc in a keyset-paginated listing."""
+    key = {"id": doc["_id"]}
+    if sort_field:
+        key["v"] = doc.get(sort_field)
+    return base64.urlsafe_b64encode(json_util.dumps(key).encode()).decode('ascii')
+
+
+def decode_cursor(token):
+    try:
+        key = json_util.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor.")
+    if not isinstance(key, dict) or "id" not in key:
+        raise ValueError("Invalid cursor.")
+    return key
+
+
+def keyset_query(query, sort_field, after):
+    """
+    Add the keyset condition for documents that sort after the cursor.
+    Listings are newest first on (sort_field, _id). Documents without
+    sort_field sort last, so they follow every dated page.
+    """
+    if after is None:
+        return query
+    key = decode_cursor(after)
+    if not sort_field:
+        condition = {"_id": {"$lt": key["id"]}}
+    elif key.get("v") is None:
+        condition = {sort_field: None, "_id": {"$lt": key["id"]}}
+    else:
+        condition = {"$or": [
+            {sort_field: {"$lt": key["v"]}},
+            {sort_field: key["v"], "_id": {"$lt": key["id"]}},
+            {sort_field: None},
+        ]}
+    return {"$and": [query, condition]} if query else condition
+
+
+def page_args(args, default_limit=DEFAULT_PAGE_SIZE):
+    """Parse limit, after, fields and format from request args."""
+    limit = args.get('limit')
+    limit = default_limit if limit in (None, '') else int(limit)
+    if limit < 1:
+        raise ValueError("limit must be positive.")
+    fields = [f.strip() for f in args.get('fields', '').split(',') if f.strip()]
+    if any(f.startswith('$') for f in fields):
+        raise ValueError("Invalid field name.")
+    after = args.get('after') or None
+    if after is not None:
+        decode_cursor(after)  # Reject a bad cursor with the other arguments, before any query runs
+    return {
+        "limit": min(limit, MAX_PAGE_SIZE),
+        "after": after,
+        "fields": fields or None,
+        "format": args.get('format', 'json'),
+    }
+
+
+def find_page(collection, query=None, sort_field=None, limit=DEFAULT_PAGE_SIZE, after=None,
+              fields=None, projection=None, batch_size=None):
+    """
+    Cursor over one page of a keyset-paginated listing (limit=None for no limit).
+    fields narrows the projection; _id and the sort field are always
+    fetched because the next cursor is built from them.
+    """
+    if fields:
+        projection = {f: 1 for f in fields}
+        projection.update({"_id": 1, **({sort_field: 1} if sort_field else {})})
+    sort = [(sort_field, DESCENDING), ("_id", DESCENDING)] if sort_field else [("_id", DESCENDING)]
+    cursor = collection.find(keyset_query(query or {}, sort_field, after), projection).sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    if batch_size:
+        cursor = cursor.batch_size(batch_size)
+    return cursor
+
+
+def fetch_page(collection, query=None, sort_field=None, limit=DEFAULT_PAGE_SIZE, after=None,
+               fields=None, projection=None):
+    """One page as (documents, cursor for the next page or None)."""
+    docs = list(find_page(collection, query, sort_field, limit + 1, after, fields, projection))
+    next_cursor = encode_cursor(docs[limit - 1], sort_field) if len(docs) > limit else None
+    return docs[:limit], next_cursor
+
+
+def ndjson_response(app, cursor):
+    """Stream documents as newline-delimited JSON while the cursor yields them."""
+    def generate():
+        for doc in cursor:
+            yield app.json.dumps(doc) + '\n'
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def list_response(app, collection, args, key='data', query=None, sort_field=None, projection=None, **extra):
+    """
+    Response for a list endpoint: a JSON page with next_cursor, or with
+    format=ndjson every matching document (up to an explicit limit) streamed.
+    """
+    try:
+        params = page_args(args)
+        if params["format"] == 'ndjson':
+            limit = int(args['limit']) if args.get('limit') else None
+            cursor = find_page(collection, query, sort_field, limit, params["after"], params["fields"],
+                               projection, batch_size=STREAM_BATCH_SIZE)
+            return ndjson_response(app, cursor)
+        if params["format"] != 'json':
+            raise ValueError("format must be json or ndjson.")
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    docs, next_cursor = fetch_page(collection, query, sort_field, params["limit"], params["after"],
+                                   params["fields"], projection)
+    return jsonify({**extra, key: docs, "next_cursor": next_cursor}), 200
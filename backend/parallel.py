@@ -0,0 +1,176 @@
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+import row_index
+import stats
+from config import Config
+from dataset_cache import ChunkWriter, ipc_write_options, pa
+
+
+class WorkerPool:
+    """
+    Process pool for chunk-parallel transforms, created on first use.
+    Workers come from a forkserver (spawn where there is none), so they
+    start clean instead of inheriting the web process's threads, MongoDB
+    client and cached frames. Like the MongoDB client, the pool is rebuilt
+    in a forked child.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    context.set_forkserver_preload(['parallel'])  # Not __main__, which would boot the app again
+                else:
+                    context = multiprocessing.get_context('spawn')
+                self._executor = ProcessPoolExecutor(max_workers=Config.PARALLEL_WORKERS, mp_context=context)
+                self._pid = os.getpid()
+            return self._executor
+
+    def run(self, func, tasks, *args):
+        """Call func(*task, *args) for every task tuple in the pool and return the results in task order."""
+        executor = self.executor()
+        futures = [executor.submit(func, *task, *args) for task in tasks]
+        return [future.result() for future in futures]
+
+
+worker_pool = WorkerPool()
+
+
+def should_parallelize(path):
+    """
+    Whether to split a transform across processes: only Feather working
+    copies, which workers can memory-map, of at least PARALLEL_MIN_BYTES,
+    and only with more than one worker configured.
+    """
+    return (
+        pa is not None and path.endswith('.feather') and Config.PARALLEL_WORKERS > 1
+        and os.path.getsize(path) >= Config.PARALLEL_MIN_BYTES
+    )
+
+
+def row_partitions(path, workers=None):
+    """Contiguous [start, stop) row ranges, one per worker, covering a Feather file."""
+    workers = workers or Config.PARALLEL_WORKERS
+    total = int(row_index.batch_offsets(path)[-1])  # Counted once here; workers reuse the saved offsets
+    size = max(math.ceil(total / workers), 1)
+    return [(start, min(start + size, total)) for start in range(0, total, size)]
+
+
+def iter_partition(path, start, stop, chunk_rows=None):
+    """
+    Rows [start, stop) of a Feather file as DataFrame chunks. The file is
+    memory-mapped and only the record batches overlapping the range are
+    read (and decompressed), so a worker touches just its own rows;
+    nothing is pickled between processes but the row range.
+    """
+    chunk_rows = chunk_rows or Config.CHUNK_ROWS
+    offsets = row_index.batch_offsets(path)
+    first = int(np.searchsorted(offsets, start, side='right')) - 1
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(max(first, 0), reader.num_record_batches):
+            if offsets[i] >= stop:
+                break
+            batch = reader.get_batch(i)
+            batch = batch.slice(int(max(start - offsets[i], 0)), int(stop - max(start, offsets[i])))
+            for piece in pa.Table.from_batches([batch]).to_batches(max_chunksize=chunk_rows):
+                yield piece.to_pandas()
+
+
+def _gather_partition(start, stop, path, need, exact, chunk_rows):
+    partition_stats = stats.ColumnStatistics(need, exact)
+    for chunk in iter_partition(path, start, stop, chunk_rows):
+        partition_stats.update(chunk)
+    return partition_stats
+
+
+def _rewrite_partition(start, stop, out_path, path, transform, chunk_rows):
+    writer = ChunkWriter(out_path, path)
+    try:
+        for chunk in iter_partition(path, start, stop, chunk_rows):
+            writer.write(transform(chunk))
+    finally:
+        writer.close()
+    return out_path
+
+
+def gather_statistics(path, need, exact=False, chunk_rows=None):
+    """stats.gather_statistics with each worker summarizing its partition, merged here in row order."""
+    result = stats.ColumnStatistics(need, exact)
+    for partition_stats in worker_pool.run(_gather_partition, row_partitions(path), path, need, exact, chunk_rows):
+        result.merge(partition_stats)
+    return result
+
+
+def concatenate(parts, out_path):
+    """Join partition files into one Feather file, in order, under the first part's schema."""
+    writer = schema = None
+    try:
+        for part in parts:
+            with pa.memory_map(part) as source:
+                reader = pa.ipc.open_file(source)
+                if writer is None:
+                    schema = reader.schema
+                    writer = pa.ipc.new_file(out_path, schema, options=ipc_write_options())
+                for i in range(reader.num_record_batches):
+                    batch = reader.get_batch(i)
+                    if not batch.schema.equals(schema):
+                        batch = batch.cast(schema)  # e.g. a column that was all null in one partition
+                    writer.write_batch(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return out_path
+
+
+def _rewrite(path, transform, suffix, chunk_rows=None):
+    """Apply transform to every partition in parallel, each worker writing its own part, then join the parts."""
+    base, ext = os.path.splitext(path)
+    out_path = f'{base}.{suffix}{ext}'
+    partitions = row_partitions(path)
+    parts = [f'{base}.{suffix}.part{i}{ext}' for i in range(len(partitions))]
+    try:
+        tasks = [(start, stop, part) for (start, stop), part in zip(partitions, parts)]
+        worker_pool.run(_rewrite_partition, tasks, path, transform, chunk_rows)
+        if parts:
+            concatenate(parts, out_path)
+        else:
+            ChunkWriter(out_path, path).close()  # No rows: an empty file with the source schema
+    finally:
+        for part in parts:
+            if os.path.exists(part):
+                os.remove(part)
+    return out_path
+
+
+def fill_missing_file(path, strategy='mean', exact=False, chunk_rows=None):
+    """stats.fill_missing_file across the worker pool; returns (new file path, fill values)."""
+    if strategy not in ('mean', 'median', 'mode'):
+        raise ValueError("Invalid strategy.")
+    fill_values = gather_statistics(path, [strategy], exact, chunk_rows).get(strategy).dropna()
+    return _rewrite(path, partial(stats.fill_chunk, fill_values=fill_values), 'filled', chunk_rows), fill_values
+
+
+def normalize_file(path, known=None, chunk_rows=None):
+    """stats.normalize_file across the worker pool; returns (new file path, mean, std)."""
+    if known is not None:
+        mean, std = known
+        columns = list(mean.index)
+    else:
+        moments = gather_statistics(path, ['mean', 'std'], chunk_rows=chunk_rows)
+        columns, mean, std = moments.numeric_columns or [], moments.get('mean'), moments.get('std')
+    transform = partial(stats.normalize_chunk, columns=columns, mean=mean, std=std)
+    return _rewrite(path, transform, 'normalized', chunk_rows), mean, std
@@ -0,0 +1,209 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import row_index
+from dataset_cache import iter_chunks, pa, read_working_copy
+from pagination import DEFAULT_PAGE_SIZE
+from readers import iter_raw_frames
+from schema import apply_schema
+
+# Most rows one preview page or sample may return
+MAX_PREVIEW_ROWS = int(os.getenv("MAX_PREVIEW_ROWS", 1000))
+# Most distinct values of the stratification column a stratified sample accepts
+MAX_STRATA = int(os.getenv("MAX_STRATA", 1000))
+
+SAMPLE_METHODS = ('reservoir', 'stratified')
+
+# Stratum of rows whose stratification value is missing
+MISSING_STRATUM = '<missing>'
+
+
+def _is_feather(path):
+    return pa is not None and path.endswith('.feather')
+
+
+def _feather_batches(path, positions):
+    """
+    The record batches of a Feather file holding the given sorted row
+    positions, with the row offset of each. Only those batches are read
+    (and decompressed), however deep into the file the rows are.
+    """
+    offsets = row_index.batch_offsets(path)
+    reader = pa.ipc.open_file(pa.memory_map(path))
+    numbers = np.unique(np.searchsorted(offsets, positions, side='right') - 1)
+    return reader, [(int(offsets[i]), reader.get_batch(int(i))) for i in numbers]
+
+
+def row_count(path, index=None):
+    """Total rows of a file when it can be known without parsing it, else None."""
+    if _is_feather(path):
+        return int(row_index.batch_offsets(path)[-1])
+    index = index or row_index.load_index(path)
+    return index.rows if index is not None else None
+
+
+def _iter_frames(path, chunk_rows=None):
+    """The file as DataFrame chunks: working copies typed, uploads as raw text."""
+    if path.endswith('.feather') or path.endswith('.pkl'):
+        return iter_chunks(path, chunk_rows)
+    return iter_raw_frames(path, chunk_rows)
+
+
+def read_rows(path, start, count, index=None):
+    """
+    Rows [start, start + count) of a dataset file, indexed by row number.
+    Feather working copies are sliced through a memory map and CSV/NDJSON
+    files seek through their row index, so a page deep into a large file
+    costs about the same as the first one. Other formats are scanned.
+    """
+    if _is_feather(path):
+        stop = min(start + count, row_count(path))
+        reader, batches = _feather_batches(path, np.arange(start, max(stop, start)))
+        table = pa.Table.from_batches([batch for _, batch in batches], schema=reader.schema)
+        frame = table.slice(start - batches[0][0] if batches else 0, max(stop - start, 0)).to_pandas()
+        frame.index = range(start, start + len(frame))
+        return frame
+    index = index or row_index.load_index(path)
+    if index is not None:
+        return index.read(path, start, count)
+    if path.endswith('.pkl'):
+        return read_working_copy(path).iloc[start:start + count]
+    pieces, position = [], 0
+    for frame in iter_raw_frames(path):
+        if position + len(frame) > start:
+            pieces.append(frame.iloc[max(start - position, 0):start + count - position])
+        position += len(frame)
+        if position >= start + count:
+            break
+    frame = pd.concat(pieces) if pieces else pd.DataFrame()
+    frame.index = range(start, start + len(frame))
+    return frame
+
+
+def _take_rows(path, positions, index=None):
+    """The rows at sorted positions, reading only the index blocks that hold them."""
+    if _is_feather(path):
+        reader, batches = _feather_batches(path, positions)
+        taken = []
+        for offset, batch in batches:
+            inside = positions[(positions >= offset) & (positions < offset + batch.num_rows)]
+            taken.append(batch.take(pa.array(inside - offset)))
+        frame = pa.Table.from_batches(taken, schema=reader.schema).to_pandas()
+        frame.index = positions
+        return frame
+    pieces = []
+    blocks = positions // index.stride
+    for block in np.unique(blocks):
+        wanted = positions[blocks == block]
+        first = int(block) * index.stride
+        rows = index.read(path, first, int(wanted[-1]) - first + 1)
+        pieces.append(rows.loc[wanted])
+    return pd.concat(pieces) if pieces else index.read(path, 0, 0)
+
+
+def _bottom_k(path, size, seed, by=None, chunk_rows=None):
+    """
+    One pass over the file keeping the size rows with the smallest random
+    keys (per stratum when by is set): a uniform sample without replacement
+    of a file whose length is not known up front. Returns (kept rows, rows
+    seen per stratum).
+    """
+    rng = np.random.default_rng(seed)
+    kept, counts, position = None, pd.Series(dtype='int64'), 0
+    for frame in _iter_frames(path, chunk_rows):
+        frame = frame.set_axis(range(position, position + len(frame)), axis=0).assign(_key=rng.random(len(frame)))
+        position += len(frame)
+        if by is not None:
+            if by not in frame.columns:
+                raise ValueError(f"Column '{by}' not found in dataset.")
+            strata = frame[by].astype(object).where(frame[by].notna(), MISSING_STRATUM)
+            frame = frame.assign(_stratum=strata)
+            counts = counts.add(strata.value_counts(), fill_value=0).astype('int64')
+            if len(counts) > MAX_STRATA:
+                raise ValueError(f"Column '{by}' has more than {MAX_STRATA} distinct values to stratify by.")
+        kept = frame if kept is None else pd.concat([kept, frame])
+        kept = kept.sort_values('_key', kind='stable')
+        kept = kept.groupby('_stratum', sort=False).head(size) if by is not None else kept.head(size)
+    if kept is None:
+        return pd.DataFrame(), counts
+    return kept, counts
+
+
+def _allocate(counts, size):
+    """Proportional allocation of size rows over strata, by largest remainder, never more than a stratum holds."""
+    total = counts.sum()
+    if total == 0:
+        return counts
+    shares = counts * min(size, total) / total
+    allocation = np.floor(shares).astype('int64')
+    leftover = int(min(size, total) - allocation.sum())
+    for key in (shares - allocation).sort_values(ascending=False, kind='stable').index[:leftover]:
+        allocation[key] += 1
+    return allocation.clip(upper=counts)
+
+
+def sample_rows(path, size, method='reservoir', by=None, seed=None, index=None):
+    """
+    A random sample of up to size rows, in file order.
+    reservoir: uniform without replacement. When the row count is known (a
+    Feather working copy or an indexed CSV/NDJSON file) the positions are
+    drawn first and only those rows are read; otherwise one streaming pass
+    keeps the rows with the smallest random keys.
+    stratified: proportional to the frequency of each value of column by,
+    from a single streaming pass that keeps a reservoir per stratum.
+    """
+    if method not in SAMPLE_METHODS:
+        raise ValueError(f"Invalid sampling method. Use one of: {', '.join(SAMPLE_METHODS)}.")
+    if method == 'stratified':
+        if not by:
+            raise ValueError("Stratified sampling needs a 'by' column.")
+        kept, counts = _bottom_k(path, size, seed, by=by)
+        if kept.empty:
+            return kept
+        # kept is in key order, so each stratum's first n rows are its sample
+        rank = kept.groupby('_stratum', sort=False).cumcount()
+        wanted = kept['_stratum'].map(_allocate(counts, size))
+        return kept[rank < wanted].drop(columns=['_key', '_stratum']).sort_index()
+
+    index = None if _is_feather(path) else (index or row_index.load_index(path))
+    total = row_count(path, index) if _is_feather(path) or index is not None else None
+    if total is None:
+        kept, _ = _bottom_k(path, size, seed)
+        return kept.drop(columns='_key', errors='ignore').sort_index()
+    rng = np.random.default_rng(seed)
+    positions = np.sort(rng.choice(total, size=min(size, total), replace=False)) if total else np.empty(0, dtype=np.int64)
+    return _take_rows(path, positions, index)
+
+
+def typed(frame, dataset_schema):
+    """Apply a stored schema to the raw text rows read from an upload."""
+    if not dataset_schema or frame.empty:
+        return frame
+    return apply_schema(frame, dataset_schema)
+
+
+def records(frame):
+    """JSON-ready row dicts, with NaN/NaT as null and timestamps in ISO format."""
+    return json.loads(frame.to_json(orient='records', date_format='iso'))
+
+
+def page_params(args):
+    """(offset, limit) from query args, raising ValueError for bad values."""
+    offset = int(args.get('offset', 0))
+    limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    if offset < 0 or limit < 1:
+        raise ValueError("offset must be >= 0 and limit >= 1.")
+    return offset, min(limit, MAX_PREVIEW_ROWS)
+
+
+def sample_params(args):
+    """(size, method, by, seed) from query args, raising ValueError for bad values."""
+    size = int(args.get('size', 100))
+    if size < 1:
+        raise ValueError("size must be >= 1.")
+    seed = args.get('seed')
+    return min(size, MAX_PREVIEW_ROWS), args.get('method', 'reservoir'), args.get('by') or None, \
+        int(seed) if seed not in (None, '') else None
@@ -0,0 +1,218 @@
+import csv
+import json
+import os
+from contextlib import contextmanager
+
+import pandas as pd
+
+from config import Config
+from dataset_cache import ChunkWriter, write_working_copy
+from schema import SchemaBuilder, apply_schema, arrow_schema
+
+# openpyxl is only needed for XLSX uploads
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# Characters read per step by the incremental JSON array parser
+JSON_BLOCK_SIZE = 1024 * 1024
+
+CSV_EXTENSIONS = ('.csv',)
+XLSX_EXTENSIONS = ('.xlsx',)
+JSON_EXTENSIONS = ('.json', '.ndjson', '.jsonl')
+
+
+def file_format(path):
+    """'csv', 'xlsx' or 'json' from a file's extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in CSV_EXTENSIONS:
+        return 'csv'
+    if ext in XLSX_EXTENSIONS:
+        return 'xlsx'
+    if ext in JSON_EXTENSIONS:
+        return 'json'
+    raise ValueError(f"Unsupported file type: {ext or path}")
+
+
+def iter_xlsx_rows(workbook, sheet=None):
+    """Rows of a worksheet as dicts keyed by its header row; blank header cells get pandas-style names."""
+    worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return
+    header = [str(name) if name is not None else f'Unnamed: {i}' for i, name in enumerate(header)]
+    for values in rows:
+        if all(value is None for value in values):
+            continue
+        yield dict(zip(header, values))
+
+
+def iter_json_array(text, block_size=JSON_BLOCK_SIZE):
+    """
+    Yield the elements of a top-level JSON array from a text stream one at a
+    time. Only the unparsed tail of the last block is kept, so memory is
+    bounded by the largest element rather than the file.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        block = text.read(block_size)
+        eof = not block
+        buffer, pos = buffer[pos:] + block, 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    fill()
+    skip_whitespace()
+    if buffer[pos:pos + 1] != '[':
+        raise ValueError("Expected a JSON array.")
+    pos += 1
+    skip_whitespace()
+    if buffer[pos:pos + 1] == ']':
+        return
+    while True:
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        if end == len(buffer) and not eof:
+            fill()  # A number or literal may continue in the next block
+            continue
+        yield value
+        pos = end
+        skip_whitespace()
+        separator = buffer[pos:pos + 1]
+        pos += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError(f"Malformed JSON array near character {pos}.")
+        skip_whitespace()
+
+
+def iter_ndjson(text):
+    """Yield one value per non-blank line of newline-delimited JSON."""
+    for line in text:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_json_rows(text, path=''):
+    """Rows of a JSON array or NDJSON file; the format is told by the first character."""
+    if path.lower().endswith(('.ndjson', '.jsonl')):
+        yield from iter_ndjson(text)
+        return
+    first = text.read(1)
+    while first.isspace():
+        first = text.read(1)
+    text.seek(0)
+    if first == '[':
+        yield from iter_json_array(text)
+    else:
+        yield from iter_ndjson(text)
+
+
+@contextmanager
+def open_rows(path, sheet=None):
+    """
+    Open a CSV, XLSX or JSON/NDJSON file as an iterator of row dicts.
+    Yields (rows, bytes_read) where bytes_read() is the position in the raw
+    file, or None when it cannot be told (XLSX is a zip archive).
+    """
+    fmt = file_format(path)
+    if fmt == 'xlsx':
+        if openpyxl is None:
+            raise ValueError("XLSX import needs openpyxl installed.")
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            yield iter_xlsx_rows(workbook, sheet), None
+        finally:
+            workbook.close()
+    elif fmt == 'json':
+        with open(path, 'r', encoding='utf-8-sig') as text:
+            yield iter_json_rows(text, path), text.buffer.raw.tell
+    else:
+        with open(path, 'r', newline='') as text:
+            yield csv.DictReader(text), text.buffer.raw.tell
+
+
+def iter_raw_frames(path, chunk_rows=None, sheet=None, on_bad_lines='error'):
+    """
+    A file as DataFrame chunks of untyped values: strings for CSV, the
+    parser's Python values for XLSX and JSON. Non-object JSON rows are
+    skipped; on_bad_lines is passed to pandas for malformed CSV lines.
+    """
+    chunk_rows = chunk_rows or Config.CHUNK_ROWS
+    if file_format(path) == 'csv':
+        try:
+            frames = pd.read_csv(path, dtype=str, chunksize=chunk_rows, on_bad_lines=on_bad_lines)
+        except pd.errors.EmptyDataError:
+            return  # An empty file has no rows, not even a header
+        yield from frames
+        return
+    with open_rows(path, sheet) as (rows, _):
+        batch = []
+        for row in rows:
+            if isinstance(row, dict):
+                batch.append(row)
+            if len(batch) >= chunk_rows:
+                yield pd.DataFrame.from_records(batch)
+                batch = []
+        if batch:
+            yield pd.DataFrame.from_records(batch)
+
+
+def infer_file_schema(path, sheet=None, chunk_rows=None, on_bad_lines='error'):
+    """First streaming pass over a file: the narrowest schema its values fit."""
+    builder = SchemaBuilder()
+    for frame in iter_raw_frames(path, chunk_rows, sheet, on_bad_lines):
+        builder.update(frame)
+    return builder.schema()
+
+
+def _typed_frames(path, dataset_schema, chunk_rows=None, sheet=None):
+    names = [entry["name"] for entry in dataset_schema]
+    for frame in iter_raw_frames(path, chunk_rows, sheet):
+        frame = frame.rename(columns=str).reindex(columns=names)
+        yield apply_schema(frame, dataset_schema)
+
+
+def write_typed_working_copy(path, working_path, dataset_schema, sheet=None, chunk_rows=None, on_chunk=None):
+    """
+    Convert a file to a working copy in the dtypes of dataset_schema, one
+    chunk at a time, so the whole source is never held as text.
+    on_chunk(rows written so far) is called after each chunk. Returns the row count.
+    """
+    rows = 0
+    if working_path.endswith('.feather'):
+        writer = ChunkWriter(working_path, schema=arrow_schema(dataset_schema))
+        try:
+            for frame in _typed_frames(path, dataset_schema, chunk_rows, sheet):
+                writer.write(frame)
+                rows += len(frame)
+                if on_chunk is not None:
+                    on_chunk(rows)
+        finally:
+            writer.close()
+    else:
+        # Without pyarrow the pickle working copy is written whole
+        frames = list(_typed_frames(path, dataset_schema, chunk_rows, sheet))
+        empty = apply_schema(pd.DataFrame(columns=[entry["name"] for entry in dataset_schema]), dataset_schema)
+        data = pd.concat(frames, ignore_index=True) if frames else empty
+        write_working_copy(data, working_path)
+        rows = len(data)
+    return rows
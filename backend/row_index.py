@@ -0,0 +1,263 @@
+import csv
+import io
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# One offset is kept for every INDEX_STRIDE rows, so a seek parses at most this many rows too many
+INDEX_STRIDE = int(os.getenv("ROW_INDEX_STRIDE", 1000))
+# Bytes read per step when indexing a file already on disk
+BLOCK_SIZE = 1024 * 1024
+
+NEWLINE, CARRIAGE_RETURN, QUOTE = ord('\n'), ord('\r'), ord('"')
+INDEX_SUFFIX = '.rowidx.npz'
+
+
+def index_format(path):
+    """'csv' or 'ndjson' for the line-oriented formats a row index can cover, else None."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return 'csv'
+    if ext in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    return None
+
+
+def index_path(path):
+    """Where the row index of a file is kept: next to it."""
+    return path + INDEX_SUFFIX
+
+
+def _signature(path):
+    """Identifies one state of a file; a rewrite, or a rename over it, changes it."""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+
+def _save_arrays(path, **arrays):
+    """np.savez written aside and renamed into place, so a reader never sees half of it."""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            np.savez(out, **arrays)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _load_arrays(source):
+    """The arrays saved next to source, or None when there are none or source has changed since."""
+    stored = index_path(source)
+    if not os.path.exists(stored):
+        return None
+    with np.load(stored) as saved:
+        if 'source' not in saved or saved['source'].tolist() != _signature(source):
+            return None
+        return {name: saved[name] for name in saved.files}
+
+
+class RowIndexBuilder:
+    """
+    Builds a sparse row -> byte offset index from a file's bytes as they
+    stream past (e.g. while an upload is being stored), one block at a time.
+    Rows start after a newline that is not inside a quoted CSV field; blank
+    lines are not rows, matching pandas and the NDJSON reader. Each block is
+    scanned with numpy, so indexing adds little to copying the bytes.
+    """
+
+    def __init__(self, fmt, stride=INDEX_STRIDE):
+        self.fmt = fmt
+        self.stride = stride
+        self.position = 0  # File offset of the next block
+        self.quotes = 0  # Quote characters seen so far; odd while inside a quoted field
+        self.pending = [0]  # Row start candidates at the end of the last block, checked against the next
+        self.header_offset = None
+        self.rows = 0
+        self.offsets = []
+
+    def feed(self, block):
+        data = np.frombuffer(block, dtype=np.uint8)
+        newlines = np.flatnonzero(data == NEWLINE)
+        if self.fmt == 'csv' and len(newlines):
+            quotes = data == QUOTE
+            before = self.quotes + np.cumsum(quotes, dtype=np.int64) - quotes
+            newlines = newlines[before[newlines] % 2 == 0]
+            self.quotes += int(quotes.sum())
+        elif self.fmt == 'csv':
+            self.quotes += int(np.count_nonzero(data == QUOTE))
+        starts = np.concatenate([np.asarray(self.pending, dtype=np.int64), newlines + 1 + self.position])
+        local = starts - self.position
+        inside = local < len(data)
+        self.pending = starts[~inside].tolist()
+        starts, local = starts[inside], local[inside]
+        # A row cannot start on a line break: that is a blank line
+        first = data[local] if len(local) else np.empty(0, dtype=np.uint8)
+        self._add(starts[(first != NEWLINE) & (first != CARRIAGE_RETURN)])
+        self.position += len(data)
+
+    def _add(self, starts):
+        if not len(starts):
+            return
+        if self.fmt == 'csv' and self.header_offset is None:
+            self.header_offset = int(starts[0])
+            starts = starts[1:]
+        numbers = np.arange(self.rows, self.rows + len(starts))
+        self.offsets.extend(starts[numbers % self.stride == 0].tolist())
+        self.rows += len(starts)
+
+    def finish(self):
+        # Candidates left pending sit at the end of the file: there is no row there
+        return RowIndex(self.fmt, self.stride, self.rows, self.header_offset, np.asarray(self.offsets, dtype=np.int64))
+
+
+class RowIndex:
+    """Sparse byte offsets of every stride-th row of a CSV or NDJSON file."""
+
+    def __init__(self, fmt, stride, rows, header_offset, offsets):
+        self.fmt = fmt
+        self.stride = stride
+        self.rows = rows
+        self.header_offset = header_offset
+        self.offsets = offsets
+
+    def save(self, source):
+        """Save the index next to the file it indexes, tied to that file's current state."""
+        _save_arrays(
+            index_path(source), offsets=self.offsets, source=np.array(_signature(source)),
+            meta=np.array(json.dumps({
+                "format": self.fmt, "stride": self.stride, "rows": self.rows, "header_offset": self.header_offset
+            }))
+        )
+
+    @classmethod
+    def load(cls, source):
+        """The saved index of a file, or None when there is none or the file has changed since."""
+        stored = _load_arrays(source)
+        if stored is None or 'meta' not in stored:
+            return None
+        meta = json.loads(str(stored['meta']))
+        return cls(meta['format'], meta['stride'], meta['rows'], meta['header_offset'], stored['offsets'])
+
+    def header(self, path):
+        """Column names from the CSV header line."""
+        if self.header_offset is None:
+            return []
+        with open(path, 'rb') as raw:
+            raw.seek(self.header_offset)
+            text = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+            return next(csv.reader(text), [])
+
+    def read(self, path, start, count):
+        """
+        Rows [start, start + count) of the file as a DataFrame of raw values.
+        Seeks to the nearest indexed row at or before start, so at most
+        stride - 1 rows are parsed and discarded.
+        """
+        start = max(0, min(start, self.rows))
+        count = max(0, min(count, self.rows - start))
+        if count == 0:
+            columns = self.header(path) if self.fmt == 'csv' else []
+            return pd.DataFrame(columns=columns)
+        block = start // self.stride
+        skip = start - block * self.stride
+        with open(path, 'rb') as raw:
+            raw.seek(int(self.offsets[block]))
+            text = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+            if self.fmt == 'csv':
+                frame = pd.read_csv(
+                    text, header=None, names=self.header(path), dtype=str, nrows=skip + count
+                )
+            else:
+                records, seen = [], 0
+                for line in text:
+                    if not line.strip():
+                        continue
+                    if seen >= skip:
+                        records.append(json.loads(line))
+                    seen += 1
+                    if seen == skip + count:
+                        break
+                frame = pd.DataFrame.from_records(records)
+                skip = 0
+        frame = frame.iloc[skip:]
+        frame.index = range(start, start + len(frame))
+        return frame
+
+
+def build_index(path, stride=INDEX_STRIDE):
+    """Index a file already on disk and save the index next to it; None for formats that cannot be indexed."""
+    fmt = index_format(path)
+    if fmt is None:
+        return None
+    builder = RowIndexBuilder(fmt, stride)
+    with open(path, 'rb') as raw:
+        for block in iter(lambda: raw.read(BLOCK_SIZE), b''):
+            builder.feed(block)
+    index = builder.finish()
+    index.save(path)
+    return index
+
+
+def save_stream(stream, path, block_size=BLOCK_SIZE):
+    """
+    Save an upload stream to path, indexing its rows on the way when the
+    format allows, so the index costs no extra pass. Returns the index or None.
+    """
+    fmt = index_format(path)
+    builder = RowIndexBuilder(fmt) if fmt else None
+    # Written aside and renamed into place, so a concurrent reader never sees part of it
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for block in iter(lambda: stream.read(block_size), b''):
+                out.write(block)
+                if builder is not None:
+                    builder.feed(block)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    if builder is None:
+        return None
+    index = builder.finish()
+    index.save(path)
+    return index
+
+
+def load_index(path, build=True):
+    """The saved row index of a file, building it on first use when build is set; None if it cannot have one."""
+    if index_format(path) is None:
+        return None
+    index = RowIndex.load(path)
+    if index is None and build:
+        index = build_index(path)
+    return index
+
+
+def batch_offsets(path):
+    """
+    Row offsets of the record batches of a Feather file: batch i holds rows
+    offsets[i] to offsets[i + 1]. Counting them reads every batch, which
+    decompresses a compressed working copy, so they are saved next to the
+    file like a row index and reused until the file changes.
+    """
+    stored = _load_arrays(path)
+    if stored is not None and 'batches' in stored:
+        return stored['batches']
+    reader = pa.ipc.open_file(pa.memory_map(path))
+    offsets = np.zeros(reader.num_record_batches + 1, dtype=np.int64)
+    for i in range(reader.num_record_batches):
+        offsets[i + 1] = offsets[i] + reader.get_batch(i).num_rows
+    _save_arrays(index_path(path), batches=offsets, source=np.array(_signature(path)))
+    return offsets
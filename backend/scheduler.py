@@ -0,0 +1,207 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+
+from jobs import job_registry
+
+logger = logging.getLogger(__name__)
+
+# Schedule states that are finished and never loaded again
+FINISHED_STATES = ("complete", "failed", "cancelled")
+
+
+def positive(value):
+    """A stored interval or limit if it is a positive integer, else None (entries saved before it was checked)."""
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        return None
+    return value
+
+
+class ImportScheduler:
+    """
+    In-process scheduler for entries in the scheduled_imports collection.
+    Pending entries sit in a heap ordered by run time and one dispatcher
+    thread sleeps on a condition until the earliest is due, so firing does
+    not depend on polling MongoDB. Due imports run on the shared job pool,
+    with at most max_concurrency runs per source at once.
+    A claimed entry is "running" under a lease that this process renews
+    until the run ends; an entry whose lease ran out (its process crashed
+    or was restarted) is claimed again.
+    """
+
+    def __init__(self, collection, run_import, default_concurrency=1, lease_seconds=300):
+        self.collection = collection
+        self.run_import = run_import
+        self.default_concurrency = default_concurrency
+        self.lease_seconds = lease_seconds
+        self._leased = set()  # Entries claimed by this process and not finished
+        self._heap = []  # (fire at, tie-break, entry id, run time the entry must still have)
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._running = defaultdict(int)  # source -> runs in progress
+        self._waiting = defaultdict(deque)  # source -> entries held back by the concurrency limit
+        self._thread = None
+
+    def start(self):
+        """Start the dispatcher thread; it loads pending schedules first, off the caller's thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._dispatch, daemon=True, name='import-scheduler')
+        self._thread.start()
+        threading.Thread(target=self._renew_leases, daemon=True, name='import-scheduler-leases').start()
+
+    def _load(self):
+        cursor = self.collection.find(
+            {"status": {"$nin": list(FINISHED_STATES)}},
+            {"time": 1, "status": 1, "lease_until": 1}
+        )
+        with self._condition:
+            for entry in cursor:
+                # A running entry is retried once its lease is out, in case its process is gone
+                fire_at = max(entry["time"], entry.get("lease_until") or entry["time"]) \
+                    if entry.get("status") == "running" else entry["time"]
+                self._heap.append((fire_at, next(self._counter), entry["_id"], entry["time"]))
+            heapq.heapify(self._heap)
+
+    def add(self, entry_id, run_at, fire_at=None):
+        """Queue a newly inserted schedule entry, to fire at run_at unless fire_at says later."""
+        with self._condition:
+            heapq.heappush(self._heap, (fire_at or run_at, next(self._counter), entry_id, run_at))
+            # Wake the dispatcher in case this entry is due before the one it is sleeping on
+            self._condition.notify()
+
+    def pending_count(self):
+        with self._condition:
+            return len(self._heap)
+
+    def _dispatch(self):
+        try:
+            self._load()
+        except Exception:
+            logger.exception("Failed to load scheduled imports")
+        while True:
+            with self._condition:
+                while not self._heap or self._heap[0][0] > datetime.utcnow():
+                    timeout = (self._heap[0][0] - datetime.utcnow()).total_seconds() if self._heap else None
+                    self._condition.wait(timeout)
+                _, _, entry_id, run_at = heapq.heappop(self._heap)
+            try:
+                self._fire(entry_id, run_at)
+            except Exception:
+                logger.exception("Failed to fire scheduled import %s", entry_id)
+
+    def _renew_leases(self):
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            with self._condition:
+                leased = list(self._leased)
+            if not leased:
+                continue
+            try:
+                self.collection.update_many(
+                    {"_id": {"$in": leased}, "status": "running"},
+                    {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+                )
+            except Exception:
+                logger.exception("Failed to renew scheduled import leases")
+
+    def _fire(self, entry_id, run_at):
+        # Claim the entry atomically so only one process runs it: one not
+        # running, or running under a lease nobody renewed (entries left
+        # running before leases existed have none)
+        now = datetime.utcnow()
+        entry = self.collection.find_one_and_update(
+            {"_id": entry_id, "time": run_at, "$or": [
+                {"status": {"$nin": ["running", *FINISHED_STATES]}},
+                {"status": "running", "lease_until": {"$lt": now}},
+                {"status": "running", "lease_until": None}
+            ]},
+            {"$set": {
+                "status": "running", "last_started_at": now,
+                "lease_until": now + timedelta(seconds=self.lease_seconds)
+            }}
+        )
+        if entry is None:
+            # Another process claimed or rescheduled it; follow its new run time if there is one,
+            # or check back when its lease is due to run out
+            current = self.collection.find_one({"_id": entry_id}, {"time": 1, "status": 1, "lease_until": 1})
+            if current is None or current.get("status") in FINISHED_STATES:
+                return
+            if current.get("status") == "running":
+                self.add(entry_id, current["time"], fire_at=current.get("lease_until"))
+            elif current["time"] != run_at:
+                self.add(entry_id, current["time"])
+            return
+
+        source = entry.get("source")
+        limit = positive(entry.get("max_concurrency")) or self.default_concurrency
+        with self._condition:
+            self._leased.add(entry_id)
+            if self._running[source] >= limit:
+                self._waiting[source].append(entry)
+                return
+            self._running[source] += 1
+        self._submit(entry)
+
+    def _submit(self, entry):
+        job_registry.submit(
+            'scheduled_import', self._run, entry,
+            details={"schedule_id": str(entry["_id"]), "source": entry.get("source")}
+        )
+
+    def _run(self, job, entry):
+        started = time.perf_counter()
+        update = {}
+        try:
+            result = self.run_import(job, entry)
+            update["last_status"] = "complete"
+            return result
+        except Exception as e:
+            update.update(last_status="failed", last_error=str(e))
+            raise
+        finally:
+            update.update(
+                last_run_at=datetime.utcnow(),
+                last_duration_seconds=round(time.perf_counter() - started, 3)
+            )
+            next_run = self._next_run(entry)
+            if next_run is not None:
+                update.update(status="scheduled", time=next_run)
+            else:
+                update["status"] = update["last_status"]
+            try:
+                self.collection.update_one({"_id": entry["_id"]}, {"$set": update, "$inc": {"run_count": 1}})
+            finally:
+                # Even if the write failed: stop renewing the lease so the entry can be reclaimed,
+                # and free the source's slot
+                with self._condition:
+                    self._leased.discard(entry["_id"])
+                if next_run is not None:
+                    self.add(entry["_id"], next_run)
+                self._release(entry.get("source"))
+
+    def _next_run(self, entry):
+        """Next run time of a recurring entry, skipping runs missed while it was busy."""
+        interval = positive(entry.get("interval_seconds"))
+        if not interval:
+            return None
+        step = timedelta(seconds=interval)
+        next_run = entry["time"] + step
+        now = datetime.utcnow()
+        if next_run <= now:
+            next_run += step * ((now - next_run) // step + 1)
+        return next_run
+
+    def _release(self, source):
+        with self._condition:
+            waiting = self._waiting[source]
+            if not waiting:
+                self._running[source] -= 1
+                return
+            entry = waiting.popleft()
+        # The finished run's slot passes straight to the next waiting entry
+        self._submit(entry)
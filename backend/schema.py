@@ -0,0 +1,236 @@
+import json
+import re
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+INT_PATTERN = r'[+-]?(0|[1-9]\d*)'  # Leading zeros (IDs, postcodes) stay text
+FLOAT_PATTERN = r'[+-]?((0|[1-9]\d*)(\.\d*)?|\.\d+)([eE][+-]?\d+)?'
+# Years 1700-2199, well inside the range of nanosecond timestamps
+YEAR_PATTERN = r'(1[7-9]|2[01])\d{2}'
+# Year.month periods such as 2020.06, common in Stats NZ style exports
+PERIOD_PATTERN = YEAR_PATTERN + r'\.(0[1-9]|1[0-2])'
+# ...which look like plain floats, so only columns named like this are read as periods
+PERIOD_NAME_PATTERN = r'(?i)(.*[\W_])?periods?([\W_].*)?'
+ISO_DATE_PATTERN = YEAR_PATTERN + r'-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?'
+BOOL_PATTERN = r'(?i:true|false)'
+
+# Strings become categories when they have at most this many distinct values...
+CATEGORY_MAX_DISTINCT = 256
+# ...and no more distinct values than this share of their non-null count
+CATEGORY_MAX_RATIO = 0.5
+# Decimal significant digits that always survive a round trip through float32 (FLT_DIG)
+FLOAT32_DIGITS = 6
+# Integers up to this magnitude are exact in float32 (used for integer columns with gaps)
+FLOAT32_EXACT_INT = 2 ** 24
+
+INT_TYPES = [('int8', np.int8), ('int16', np.int16), ('int32', np.int32), ('int64', np.int64)]
+DATETIME_FORMATS = {'period': '%Y.%m', 'iso': 'ISO8601'}
+
+
+def as_text(value):
+    """Text form of a raw value, as inference sees it; dicts and lists become JSON."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def _non_null_text(series):
+    values = series[series.notna()]
+    if values.dtype == object:
+        values = values.map(as_text)
+    values = values.astype(str).str.strip()
+    return values[values != '']
+
+
+class SchemaBuilder:
+    """
+    Infers the narrowest dtype of every column from chunks of raw values
+    (strings from CSV, Python values from JSON or XLSX), so a whole file can
+    be typed in one streaming pass. Each chunk is checked with vectorized
+    pattern matches; a column only keeps a type every value so far fits.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.columns = {}
+
+    def _state(self, name):
+        if name not in self.columns:
+            self.columns[name] = {
+                "count": 0, "nulls": self.rows, "min": None, "max": None, "distinct": set(),
+                "int": True, "float": True, "float32": True, "iso": True, "bool": True,
+                "period": re.fullmatch(PERIOD_NAME_PATTERN, name) is not None,
+            }
+        return self.columns[name]
+
+    def update(self, frame):
+        for name in frame.columns:
+            state = self._state(str(name))
+            values = _non_null_text(frame[name])
+            state["count"] += len(values)
+            state["nulls"] += len(frame) - len(values)
+            if not len(values):
+                continue
+            for kind, pattern in (('bool', BOOL_PATTERN), ('int', INT_PATTERN), ('period', PERIOD_PATTERN),
+                                  ('float', FLOAT_PATTERN), ('iso', ISO_DATE_PATTERN)):
+                if state[kind]:
+                    state[kind] = bool(values.str.fullmatch(pattern).all())
+            if state["int"]:
+                numbers = pd.to_numeric(values)
+                if numbers.dtype.kind not in 'iu':
+                    state["int"] = False  # Beyond int64
+                else:
+                    low, high = int(numbers.min()), int(numbers.max())
+                    state["min"] = low if state["min"] is None else min(state["min"], low)
+                    state["max"] = high if state["max"] is None else max(state["max"], high)
+            if state["float"] and state["float32"]:
+                digits = values.str.replace(r'[eE].*$', '', regex=True).str.replace(r'\D', '', regex=True).str.lstrip('0')
+                magnitude = pd.to_numeric(values).abs().max()
+                state["float32"] = bool(digits.str.len().max() <= FLOAT32_DIGITS and magnitude < np.finfo(np.float32).max)
+            if state["distinct"] is not None:
+                state["distinct"].update(values.unique())
+                if len(state["distinct"]) > CATEGORY_MAX_DISTINCT:
+                    state["distinct"] = None
+        for name in set(self.columns) - {str(col) for col in frame.columns}:
+            self.columns[name]["nulls"] += len(frame)
+        self.rows += len(frame)
+
+    def schema(self):
+        """The inferred schema: a list of {"name", "type", ...} entries in column order."""
+        return [dict(name=name, **_resolve(state)) for name, state in self.columns.items()]
+
+
+def _resolve(state):
+    count, nulls = state["count"], state["nulls"]
+    if count == 0:
+        return {"type": "string", "nullable": True}
+    if state["bool"] and not nulls:
+        return {"type": "bool", "nullable": False}
+    if state["int"]:
+        if nulls:
+            exact = max(abs(state["min"]), abs(state["max"])) <= FLOAT32_EXACT_INT
+            return {"type": "float32" if exact else "float64", "nullable": True}
+        for name, dtype in INT_TYPES:
+            info = np.iinfo(dtype)
+            if info.min <= state["min"] and state["max"] <= info.max:
+                return {"type": name, "nullable": False}
+    if state["period"]:
+        return {"type": "datetime", "format": DATETIME_FORMATS['period'], "nullable": bool(nulls)}
+    if state["float"]:
+        return {"type": "float32" if state["float32"] else "float64", "nullable": bool(nulls)}
+    if state["iso"]:
+        return {"type": "datetime", "format": DATETIME_FORMATS['iso'], "nullable": bool(nulls)}
+    distinct = state["distinct"]
+    if distinct is not None and len(distinct) <= CATEGORY_MAX_RATIO * count:
+        return {"type": "category", "categories": sorted(distinct), "nullable": bool(nulls)}
+    return {"type": "string", "nullable": bool(nulls)}
+
+
+def infer_schema(data):
+    """Schema of a loaded frame of raw values."""
+    builder = SchemaBuilder()
+    builder.update(data)
+    return builder.schema()
+
+
+def _convert_column(series, entry):
+    kind = entry["type"]
+    if kind.startswith('int') or kind.startswith('float'):
+        numbers = pd.to_numeric(series, errors='coerce')
+        try:
+            return numbers.astype(kind)
+        except (TypeError, ValueError):
+            return numbers  # Gaps in a column typed as integer; leave it as float
+    if kind == 'bool':
+        if series.dtype == bool:
+            return series
+        return series.map(lambda v: v if isinstance(v, bool) else str(v).strip().lower() == 'true')
+    if kind == 'datetime':
+        if series.dtype.kind == 'M':
+            return series
+        values = series.map(lambda v: v if isinstance(v, (datetime, date)) or pd.isna(v) else as_text(v).strip())
+        parsed = pd.to_datetime(values, format=entry.get("format"), errors='coerce')
+        # Values beyond the nanosecond range become missing like any other unparseable date
+        return parsed.where(parsed.between(pd.Timestamp.min, pd.Timestamp.max)).astype('datetime64[ns]')
+    text = series.map(lambda v: v if pd.isna(v) else as_text(v), na_action='ignore') if series.dtype == object else series
+    if kind == 'category':
+        return pd.Series(pd.Categorical(text, categories=entry["categories"]), index=series.index)
+    return text
+
+
+def apply_schema(data, schema):
+    """Convert the columns of a frame to the dtypes in schema; columns it does not name are left alone."""
+    if not schema:
+        return data
+    data = data.copy()
+    for entry in schema:
+        if entry["name"] in data.columns:
+            data[entry["name"]] = _convert_column(data[entry["name"]], entry)
+    return data
+
+
+def arrow_schema(schema):
+    """Feather schema for a dataset schema, so every chunk of a working copy is written alike."""
+    types = {
+        'int8': pa.int8(), 'int16': pa.int16(), 'int32': pa.int32(), 'int64': pa.int64(),
+        'float32': pa.float32(), 'float64': pa.float64(), 'bool': pa.bool_(),
+        'datetime': pa.timestamp('ns'), 'string': pa.string(),
+        'category': pa.dictionary(pa.int32(), pa.string()),
+    }
+    return pa.schema([(entry["name"], types[entry["type"]]) for entry in schema])
+
+
+def _parse_datetime(text, fmt):
+    if fmt == DATETIME_FORMATS['iso']:
+        return datetime.fromisoformat(text)
+    return datetime.strptime(text, fmt)
+
+
+def row_converter(schema):
+    """
+    Function converting one raw row dict to schema types for a MongoDB insert.
+    BSON has no narrow numbers, so integer types become int and float types
+    float (parsed from the original text, not rounded through float32);
+    categories are stored as strings. Blank values become None, and a value
+    that does not convert is kept as it was.
+    """
+    converters = {}
+    for entry in schema or []:
+        kind = entry["type"]
+        if kind.startswith('int'):
+            converters[entry["name"]] = int
+        elif kind.startswith('float'):
+            converters[entry["name"]] = float
+        elif kind == 'bool':
+            converters[entry["name"]] = lambda v: v if isinstance(v, bool) else str(v).strip().lower() == 'true'
+        elif kind == 'datetime':
+            fmt = entry.get("format")
+            converters[entry["name"]] = lambda v, fmt=fmt: (
+                v if isinstance(v, datetime) else _parse_datetime(as_text(v).strip(), fmt)
+            )
+        else:
+            converters[entry["name"]] = as_text
+
+    def convert(row):
+        converted = {}
+        for key, value in row.items():
+            if value is None or isinstance(value, str) and not value.strip():
+                converted[key] = None
+                continue
+            convert_value = converters.get(key)
+            try:
+                converted[key] = convert_value(value) if convert_value else value
+            except (TypeError, ValueError):
+                converted[key] = value
+        return converted
+
+    return convert
@@ -0,0 +1,75 @@
+import json
+import time
+
+import row_index
+from config import Config
+
+
+def flatten(document, prefix=''):
+    """A document as one row: sub-documents become dotted columns (address.city), arrays JSON text."""
+    row = {}
+    for key, value in document.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            row.update(flatten(value, name + '.'))
+        elif isinstance(value, list):
+            row[name] = json.dumps(value, default=str)
+        else:
+            row[name] = value
+    return row
+
+
+class CursorStream:
+    """
+    Read-only byte stream over a query's documents as NDJSON, one cursor
+    batch per read, so a collection can be saved like an upload without
+    being held in memory. ObjectIds, dates and other BSON values are written
+    as text for schema inference to type. on_batch(rows, bytes) is called
+    after each batch.
+    """
+
+    def __init__(self, cursor, batch_size, on_batch=None):
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.on_batch = on_batch
+        self.rows = 0
+        self.bytes = 0
+
+    def read(self, size=-1):
+        lines = []
+        for document in self.cursor:
+            lines.append(json.dumps(flatten(document), default=str))
+            if len(lines) >= self.batch_size:
+                break
+        if not lines:
+            return b''
+        block = ('\n'.join(lines) + '\n').encode('utf-8')
+        self.rows += len(lines)
+        self.bytes += len(block)
+        if self.on_batch is not None:
+            self.on_batch(self.rows, self.bytes)
+        return block
+
+
+def export_query(collection, path, query=None, projection=None, sort=None, limit=0, batch_size=None,
+                 on_batch=None):
+    """
+    Save the documents a query matches to an NDJSON file, indexing its rows
+    as it goes (see row_index.save_stream). The cursor fetches batch_size
+    documents per round trip. Returns (rows, bytes, seconds).
+    """
+    batch_size = batch_size or Config.SOURCE_BATCH_SIZE
+    started = time.perf_counter()
+    cursor = collection.find(query or {}, projection, sort=sort, limit=limit, batch_size=batch_size)
+    try:
+        stream = CursorStream(cursor, batch_size, on_batch)
+        row_index.save_stream(stream, path)
+    finally:
+        cursor.close()
+    return stream.rows, stream.bytes, time.perf_counter() - started
+
+
+def throughput(rows, size, seconds):
+    """Rows and bytes per second, for progress reports and responses."""
+    seconds = max(seconds, 1e-9)
+    return {"rows_per_second": round(rows / seconds, 1), "bytes_per_second": round(size / seconds, 1)}
@@ -0,0 +1,295 @@
+import os
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import ChunkWriter, iter_chunks
+
+# Centroid budget for approximate quantiles; higher is more accurate
+DIGEST_COMPRESSION = 200
+# Counters kept per column for approximate mode
+HEAVY_HITTER_CAPACITY = 1000
+
+
+class RunningMoments:
+    """
+    Count, mean and variance of numeric columns accumulated chunk by chunk.
+    Each chunk is summarized with vectorized pandas reductions and merged
+    with the pairwise form of Welford's update, so results match a single
+    pass over the whole column.
+    """
+
+    def __init__(self):
+        self.count = None
+        self.mean = None
+        self.m2 = None
+
+    def update(self, frame):
+        count = frame.count().astype(float)
+        mean = frame.mean().fillna(0.0)
+        m2 = ((frame - mean) ** 2).sum()
+        self._combine(count, mean, m2)
+
+    def merge(self, other):
+        """Fold in moments accumulated elsewhere, e.g. over another partition of the file."""
+        if other.count is not None:
+            self._combine(other.count, other.mean, other.m2)
+
+    def _combine(self, count, mean, m2):
+        if self.count is None:
+            self.count, self.mean, self.m2 = count, mean, m2
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        share = (count / total).fillna(0.0)
+        self.mean = self.mean + delta * share
+        self.m2 = self.m2 + m2 + (delta ** 2 * self.count * share).fillna(0.0)
+        self.count = total
+
+    def means(self):
+        return self.mean.where(self.count > 0)
+
+    def stds(self):
+        return np.sqrt(self.m2 / (self.count - 1)).where(self.count > 1)
+
+
+class TDigest:
+    """
+    Merging t-digest for approximate quantiles of one numeric column.
+    Chunks are sorted and pre-aggregated into small equal-count groups
+    before the centroid merge, keeping the Python loop short.
+    """
+
+    def __init__(self, compression=DIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        values = np.sort(values[~np.isnan(values)])
+        if not len(values):
+            return
+        self.min = min(self.min, values[0])
+        self.max = max(self.max, values[-1])
+        groups = min(len(values), self.compression * 5)
+        edges = np.linspace(0, len(values), groups + 1).astype(int)
+        weights = np.diff(edges).astype(float)
+        means = np.add.reduceat(values, edges[:-1]) / weights
+        self._merge(np.concatenate([self.means, means]), np.concatenate([self.weights, weights]))
+
+    def merge(self, other):
+        """Fold in another digest's centroids."""
+        if not len(other.weights):
+            return
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._merge(np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]))
+
+    def _merge(self, means, weights):
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        merged_means, merged_weights = [], []
+        cur_mean, cur_weight, done = means[0], weights[0], 0.0
+        for mean, weight in zip(means[1:], weights[1:]):
+            q = (done + (cur_weight + weight) / 2) / total
+            if cur_weight + weight <= 4 * total * q * (1 - q) / self.compression:
+                cur_mean += (mean - cur_mean) * weight / (cur_weight + weight)
+                cur_weight += weight
+            else:
+                merged_means.append(cur_mean)
+                merged_weights.append(cur_weight)
+                done += cur_weight
+                cur_mean, cur_weight = mean, weight
+        merged_means.append(cur_mean)
+        merged_weights.append(cur_weight)
+        self.means, self.weights = np.array(merged_means), np.array(merged_weights)
+
+    def quantile(self, q):
+        if not len(self.weights):
+            return np.nan
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(
+            q * self.weights.sum(),
+            np.concatenate([[0.0], centers, [self.weights.sum()]]),
+            np.concatenate([[self.min], self.means, [self.max]])
+        ))
+
+
+class ExactQuantiles:
+    """Keeps every value of a column so quantiles are exact; memory grows with the column."""
+
+    def __init__(self):
+        self.parts = []
+
+    def update(self, values):
+        self.parts.append(values[~np.isnan(values)])
+
+    def merge(self, other):
+        self.parts.extend(other.parts)
+
+    def quantile(self, q):
+        values = np.concatenate(self.parts) if self.parts else np.empty(0)
+        return float(np.quantile(values, q)) if len(values) else np.nan
+
+
+class HeavyHitters:
+    """
+    Misra-Gries frequent-value summary of one column.
+    With capacity=None every distinct value is counted and the mode is exact.
+    """
+
+    def __init__(self, capacity=HEAVY_HITTER_CAPACITY):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype=float)
+
+    def update(self, series):
+        self._add(series.value_counts().astype(float))
+
+    def merge(self, other):
+        """Fold in another summary; the result keeps the Misra-Gries error bound of their sum."""
+        if len(other.counts):
+            self._add(other.counts)
+
+    def _add(self, counts):
+        merged = self.counts.add(counts, fill_value=0) if len(self.counts) else counts
+        if self.capacity is not None and len(merged) > self.capacity:
+            merged = merged.sort_values(ascending=False)
+            merged = merged.iloc[:self.capacity] - merged.iloc[self.capacity]
+            merged = merged[merged > 0]
+        self.counts = merged
+
+    def mode(self):
+        if not len(self.counts):
+            return np.nan
+        tied = self.counts.index[self.counts == self.counts.max()]
+        try:
+            return min(tied)  # The smallest, as DataFrame.mode() orders ties, whatever order chunks merged in
+        except TypeError:
+            return tied[0]
+
+
+class ColumnStatistics:
+    """Accumulates the statistics named in `need` over a stream of chunks."""
+
+    def __init__(self, need=('mean', 'std'), exact=False):
+        self.need = set(need)
+        self.exact = exact
+        self.columns = None
+        self.numeric_columns = None
+        self.moments = RunningMoments()
+        self.quantiles = {}
+        self.heavy_hitters = {}
+
+    def update(self, chunk):
+        if self.columns is None:
+            # Column types come from the first chunk so every chunk is treated alike
+            self.columns = list(chunk.columns)
+            self.numeric_columns = list(chunk.select_dtypes(include=['number']).columns)
+        numeric = chunk[self.numeric_columns].apply(pd.to_numeric, errors='coerce')
+        if self.need & {'mean', 'std'}:
+            self.moments.update(numeric)
+        if 'median' in self.need:
+            for col in self.numeric_columns:
+                if col not in self.quantiles:
+                    self.quantiles[col] = ExactQuantiles() if self.exact else TDigest()
+                self.quantiles[col].update(numeric[col].to_numpy(dtype=float))
+        if 'mode' in self.need:
+            for col in self.columns:
+                if col not in self.heavy_hitters:
+                    self.heavy_hitters[col] = HeavyHitters(None if self.exact else HEAVY_HITTER_CAPACITY)
+                self.heavy_hitters[col].update(chunk[col])
+
+    def merge(self, other):
+        """Fold in statistics gathered over another part of the same dataset."""
+        if other.columns is None:
+            return
+        if self.columns is None:
+            self.columns, self.numeric_columns = other.columns, other.numeric_columns
+        self.moments.merge(other.moments)
+        for summaries, other_summaries in ((self.quantiles, other.quantiles), (self.heavy_hitters, other.heavy_hitters)):
+            for col, summary in other_summaries.items():
+                if col in summaries:
+                    summaries[col].merge(summary)
+                else:
+                    summaries[col] = summary
+
+    def get(self, name):
+        if name == 'mean':
+            return self.moments.means()
+        if name == 'std':
+            return self.moments.stds()
+        if name == 'median':
+            return self.quantile(0.5)
+        if name == 'mode':
+            return pd.Series({col: self.heavy_hitters[col].mode() for col in self.columns}, dtype=object)
+        raise ValueError(f"Unknown statistic: {name}")
+
+    def quantile(self, q):
+        """Quantile q of every numeric column; needs 'median' in `need`."""
+        return pd.Series({col: self.quantiles[col].quantile(q) for col in self.numeric_columns}, dtype=float)
+
+
+def gather_statistics(path, need, exact=False, chunk_rows=None, transform=None):
+    """
+    First pass: stream a dataset file once and return its ColumnStatistics,
+    optionally of transform(chunk) rather than the chunk itself.
+    """
+    stats = ColumnStatistics(need, exact)
+    for chunk in iter_chunks(path, chunk_rows):
+        stats.update(transform(chunk) if transform else chunk)
+    return stats
+
+
+def _rewrite(path, transform, suffix, chunk_rows=None):
+    """Second pass: stream a dataset file through transform into a new file."""
+    base, ext = os.path.splitext(path)
+    out_path = f'{base}.{suffix}{ext}'
+    writer = ChunkWriter(out_path, path)
+    try:
+        for chunk in iter_chunks(path, chunk_rows):
+            writer.write(transform(chunk))
+    finally:
+        writer.close()
+    return out_path
+
+
+def fill_chunk(chunk, fill_values):
+    return chunk.fillna(fill_values)
+
+
+def normalize_chunk(chunk, columns, mean, std):
+    chunk = chunk.copy()
+    chunk[columns] = (chunk[columns] - mean) / std
+    return chunk
+
+
+def fill_missing_file(path, strategy='mean', exact=False, chunk_rows=None):
+    """Fill missing values in two bounded-memory passes; returns (new file path, fill values)."""
+    if strategy not in ('mean', 'median', 'mode'):
+        raise ValueError("Invalid strategy.")
+    fill_values = gather_statistics(path, [strategy], exact, chunk_rows).get(strategy).dropna()
+    return _rewrite(path, partial(fill_chunk, fill_values=fill_values), 'filled', chunk_rows), fill_values
+
+
+def _moments(path, known, chunk_rows):
+    """Numeric columns with their mean and std, from `known` (a column profile) when given."""
+    if known is not None:
+        mean, std = known
+        return list(mean.index), mean, std
+    stats = gather_statistics(path, ['mean', 'std'], chunk_rows=chunk_rows)
+    return stats.numeric_columns or [], stats.get('mean'), stats.get('std')
+
+
+def normalize_file(path, known=None, chunk_rows=None):
+    """
+    Z-score normalize numeric columns in two passes, or one when the mean
+    and std are already known; returns (new file path, mean, std).
+    """
+    columns, mean, std = _moments(path, known, chunk_rows)
+    transform = partial(normalize_chunk, columns=columns, mean=mean, std=std)
+    return _rewrite(path, transform, 'normalized', chunk_rows), mean, std
+
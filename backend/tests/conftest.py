@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODULE9_PREFIX = '/api/module9/api/module9'
+
+
+@pytest.fixture(scope='session')
+def apps(tmp_path_factory):
+    """The backend app and module8's app against mongomock, writing uploads under a temporary directory."""
+    pytest.importorskip('mongomock')
+    os.chdir(tmp_path_factory.mktemp('workdir'))
+    os.makedirs('uploads', exist_ok=True)
+    from benchmark import use_mongomock
+    from mongo import mongo
+    use_mongomock(mongo)
+    import app as backend_app
+    import module8
+    return backend_app.app.test_client(), module8.app.test_client()
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+import dedup
+
+
+def test_hash_collisions_do_not_drop_distinct_rows(tmp_path, monkeypatch):
+    frame = pd.DataFrame({"a": [1, 2, 1, 3, 2], "b": ["x", "y", "x", "z", "w"]})
+    path = str(tmp_path / 'd.csv')
+    frame.to_csv(path, index=False)
+    # Every row hashes alike, as if all of them collided
+    monkeypatch.setattr(dedup, 'hash_rows', lambda chunk, subset=None: np.zeros(len(chunk), dtype=np.uint64))
+
+    out_path, dropped, total_rows = dedup.dedup_file(path, partitions=4, chunk_rows=2)
+    assert dropped.tolist() == [2] and total_rows == 5
+    assert pd.read_csv(out_path)["b"].tolist() == ["x", "y", "z", "w"]
+
+    out_path, dropped, _ = dedup.dedup_file(path, subset=["a"], keep='last', partitions=4, chunk_rows=2)
+    assert dropped.tolist() == [0, 1]
+
+
+def test_in_memory_dedup_compares_values():
+    frame = pd.DataFrame({"a": [1, 2, 1, np.nan, np.nan]})
+    data, dropped = dedup.dedup_in_memory(frame)
+    assert dropped.tolist() == [2, 4]
+    assert len(data) == 3
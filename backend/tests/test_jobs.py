@@ -0,0 +1,31 @@
+import time
+
+from jobs import JobRegistry
+
+
+def wait_for(registry, job_id):
+    for _ in range(200):
+        state = registry.get(job_id)
+        if state is None or state["status"] in ("complete", "failed"):
+            return state
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_finished_jobs_beyond_the_cap_are_evicted():
+    registry = JobRegistry(max_workers=1, max_finished=2)
+    job_ids = [registry.submit('test', lambda job, n: n, n) for n in range(4)]
+    for job_id in job_ids:
+        wait_for(registry, job_id)
+    assert registry.get(job_ids[0]) is None and registry.get(job_ids[1]) is None
+    assert [registry.get(job_id)["result"] for job_id in job_ids[2:]] == [2, 3]
+
+
+def test_finished_jobs_expire_after_the_ttl():
+    registry = JobRegistry(max_workers=1, finished_ttl=0.05)
+    job_id = registry.submit('test', lambda job: 'done')
+    assert wait_for(registry, job_id)["result"] == 'done'
+    time.sleep(0.1)
+    running = registry.submit('test', lambda job: time.sleep(0.2))  # Submitting evicts expired jobs
+    assert registry.get(job_id) is None
+    assert registry.get(running) is not None
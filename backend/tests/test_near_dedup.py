@@ -0,0 +1,38 @@
+import io
+
+import pandas as pd
+
+import near_dedup
+from conftest import MODULE9_PREFIX
+
+PEOPLE = pd.DataFrame({
+    "name": ["Jane Smith", "jane  smith", "Jane Smith.", "Robert Brown", "Alice Johnson", "Bob Brown"],
+    "city": ["Auckland", "Auckland", "Wellington", "Auckland", "Hamilton", "Auckland"],
+})
+
+
+def test_near_identical_names_cluster():
+    found = near_dedup.find_near_duplicates(lambda: iter([PEOPLE]), ["name"], threshold=0.8)
+    assert [sorted(cluster.tolist()) for cluster in found.clusters] == [[0, 1, 2]]
+    assert found.dropped.tolist() == [1, 2]
+
+
+def test_block_by_keeps_blocks_apart():
+    found = near_dedup.find_near_duplicates(lambda: iter([PEOPLE]), ["name"], threshold=0.8, block_by=["city"])
+    assert found.dropped.tolist() == [1]
+
+
+def test_unknown_block_by_is_a_bad_request(apps):
+    client, _ = apps
+    response = client.post(MODULE9_PREFIX + '/import',
+                           data={'file': (io.BytesIO(PEOPLE.to_csv(index=False).encode()), 'people.csv')},
+                           content_type='multipart/form-data')
+    file_id = response.get_json()["file_id"]
+    for options in ({'block_by': 'postcode'}, {'subset': ['nickname']}, {'block_by': [7]}):
+        response = client.post(MODULE9_PREFIX + '/remove_duplicates',
+                               json={'file_id': file_id, 'match': 'fuzzy', **options})
+        assert response.status_code == 400, response.get_json()
+    response = client.post(MODULE9_PREFIX + '/remove_duplicates',
+                           json={'file_id': file_id, 'match': 'fuzzy', 'subset': 'name', 'dry_run': True})
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()["duplicates_found"] == 2
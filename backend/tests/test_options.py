@@ -0,0 +1,57 @@
+import io
+
+import pytest
+
+from conftest import MODULE9_PREFIX
+
+
+@pytest.mark.parametrize('value', ['many', None, -1, 2.5, True])
+def test_bad_max_indices_is_a_bad_request(apps, value):
+    client, _ = apps
+    response = client.post(MODULE9_PREFIX + '/remove_duplicates', json={'file_id': 'x', 'max_indices': value})
+    assert response.status_code == 400
+    assert 'max_indices' in response.get_json()["message"]
+
+
+def test_bad_outlier_max_indices_is_a_bad_request(apps):
+    client, _ = apps
+    response = client.post(MODULE9_PREFIX + '/detect_outliers', json={'file_id': 'x', 'max_indices': 'all'})
+    assert response.status_code == 400
+    assert 'max_indices' in response.get_json()["message"]
+
+
+def test_bad_max_clusters_is_a_bad_request(apps):
+    client, _ = apps
+    response = client.post(MODULE9_PREFIX + '/import', data={'file': (io.BytesIO(b"a\nx\nx\n"), 'c.csv')},
+                           content_type='multipart/form-data')
+    file_id = response.get_json()["file_id"]
+    response = client.post(MODULE9_PREFIX + '/remove_duplicates',
+                           json={'file_id': file_id, 'match': 'fuzzy', 'max_clusters': '10 please'})
+    assert response.status_code == 400
+    assert 'max_clusters' in response.get_json()["message"]
+
+
+@pytest.mark.parametrize('step', [{'op': 'remove_duplicates', 'keep': 'bogus'},
+                                  {'op': 'remove_duplicates', 'subset': [1]},
+                                  {'op': 'remove_duplicates', 'subset': ['nope']},
+                                  {'op': 'remove_duplicates', 'subset': 'nope'}])
+def test_bad_pipeline_dedup_step_is_a_bad_request(apps, step):
+    client, _ = apps
+    response = client.post(MODULE9_PREFIX + '/import', data={'file': (io.BytesIO(b"a,b\n1,x\n1,x\n"), 'p.csv')},
+                           content_type='multipart/form-data')
+    file_id = response.get_json()["file_id"]
+    response = client.post(MODULE9_PREFIX + '/pipeline', json={'file_id': file_id, 'steps': [step]})
+    assert response.status_code == 400, response.get_json()
+    response = client.post(MODULE9_PREFIX + '/remove_duplicates', json={'file_id': file_id, **step})
+    assert response.status_code == 400, response.get_json()
+
+
+def test_pipeline_dedup_on_a_named_column(apps):
+    client, _ = apps
+    response = client.post(MODULE9_PREFIX + '/import', data={'file': (io.BytesIO(b"a,b\n1,x\n1,y\n2,y\n"), 'q.csv')},
+                           content_type='multipart/form-data')
+    file_id = response.get_json()["file_id"]
+    response = client.post(MODULE9_PREFIX + '/pipeline',
+                           json={'file_id': file_id, 'steps': [{'op': 'remove_duplicates', 'subset': 'a'}]})
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()["steps"][0]["details"]["duplicates_removed"] == 1
@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import outliers
+
+
+@pytest.mark.parametrize('threshold', [float('nan'), float('inf'), 0, -1, 'high', [3]])
+def test_bad_threshold(threshold):
+    with pytest.raises(ValueError):
+        outliers.validate_options('zscore', threshold)
+
+
+def test_streaming_detection_matches_in_memory(tmp_path):
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({"x": rng.normal(size=500), "y": rng.normal(size=500)})
+    data.loc[[3, 77, 400], "x"] = [25.0, -30.0, 40.0]
+    path = tmp_path / 'data.csv'
+    data.to_csv(path, index=False)
+    for method in outliers.METHODS:
+        threshold = outliers.validate_options(method)
+        in_memory = outliers.detect(data, method, threshold, 'indices', 1000)
+        streamed = outliers.detect_file(str(path), method, threshold, 'indices', 1000, exact=True)
+        assert streamed == in_memory, method
+        assert {3, 77, 400} <= set(in_memory["outlier_indices"]["x"]), method
@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from pagination import decode_cursor, encode_cursor, fetch_page
+
+
+def test_pages_follow_the_cursor():
+    mongomock = pytest.importorskip('mongomock')
+    collection = mongomock.MongoClient().db.files
+    start = datetime(2024, 1, 1)
+    collection.insert_many([{"n": i, "uploaded_at": start + timedelta(days=i % 4)} for i in range(10)]
+                           + [{"n": 10}])
+    seen, after = [], None
+    while True:
+        docs, after = fetch_page(collection, sort_field="uploaded_at", limit=3, after=after)
+        seen.extend(doc["n"] for doc in docs)
+        if after is None:
+            break
+    assert sorted(seen) == list(range(11))
+    assert seen[-1] == 10  # Undated documents come last
+    assert decode_cursor(encode_cursor({"_id": 7, "uploaded_at": start}, "uploaded_at")) == {"id": 7, "v": start}
+
+
+@pytest.mark.parametrize('after', ['garbage', 'bnVsbA=='])
+def test_bad_cursor_is_a_bad_request(apps, after):
+    _, module8_client = apps
+    response = module8_client.get(f'/api/data/view-imported?after={after}')
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "Invalid cursor."
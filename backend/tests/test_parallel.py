@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import parallel
+import stats
+from config import Config
+from dataset_cache import read_working_copy, write_working_copy
+
+pytest.importorskip('pyarrow')
+
+
+@pytest.fixture
+def working_copy(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'PARALLEL_WORKERS', 3)
+    rng = np.random.default_rng(2)
+    data = pd.DataFrame({"x": rng.normal(size=1001), "y": rng.integers(0, 50, 1001).astype(float),
+                         "label": rng.choice(['a', 'b', None], 1001)})
+    data.loc[rng.choice(1001, 100, replace=False), ["x", "y"]] = np.nan
+    path = str(tmp_path / 'data.feather')
+    write_working_copy(data, path)
+    return path
+
+
+def test_partitions_cover_every_row(working_copy):
+    partitions = parallel.row_partitions(working_copy)
+    assert len(partitions) == 3
+    assert partitions[0][0] == 0 and partitions[-1][1] == 1001
+    assert all(a[1] == b[0] for a, b in zip(partitions, partitions[1:]))
+    rows = pd.concat(chunk for start, stop in partitions
+                     for chunk in parallel.iter_partition(working_copy, start, stop, chunk_rows=100))
+    pd.testing.assert_frame_equal(rows.reset_index(drop=True), read_working_copy(working_copy))
+
+
+@pytest.mark.parametrize('strategy', ['mean', 'mode'])
+def test_process_pool_fill_matches_one_process(working_copy, strategy):
+    parallel_path, parallel_values = parallel.fill_missing_file(working_copy, strategy, exact=True, chunk_rows=100)
+    serial_path, serial_values = stats.fill_missing_file(working_copy, strategy, exact=True, chunk_rows=100)
+    pd.testing.assert_series_equal(parallel_values, serial_values)
+    pd.testing.assert_frame_equal(read_working_copy(parallel_path), read_working_copy(serial_path))
+
+
+def test_process_pool_normalize_matches_one_process(working_copy):
+    parallel_path, mean, std = parallel.normalize_file(working_copy, chunk_rows=100)
+    serial_path, serial_mean, serial_std = stats.normalize_file(working_copy, chunk_rows=100)
+    pd.testing.assert_series_equal(mean, serial_mean)
+    pd.testing.assert_series_equal(std, serial_std)
+    pd.testing.assert_frame_equal(read_working_copy(parallel_path), read_working_copy(serial_path))
@@ -0,0 +1,66 @@
+import json
+
+import pandas as pd
+import pytest
+
+import preview
+import row_index
+
+
+@pytest.fixture
+def quoted_csv(tmp_path):
+    rows = pd.DataFrame({"id": [str(i) for i in range(53)],
+                         "note": [f'line one\nline "two" of {i}' if i % 3 == 0 else f'plain, {i}' for i in range(53)]})
+    path = str(tmp_path / 'notes.csv')
+    rows.to_csv(path, index=False)
+    return path, rows
+
+
+def test_seeks_past_quoted_newlines(quoted_csv):
+    path, rows = quoted_csv
+    index = row_index.build_index(path, stride=5)
+    assert index.rows == 53
+    for start, count in ((0, 3), (4, 7), (25, 10), (50, 10)):
+        frame = index.read(path, start, count)
+        expected = rows.iloc[start:start + count]
+        assert frame.index.tolist() == list(expected.index)
+        assert frame.to_dict('list') == expected.to_dict('list')
+
+
+def test_indexing_in_small_blocks_matches_one_block(quoted_csv):
+    path, _ = quoted_csv
+    with open(path, 'rb') as source:
+        content = source.read()
+    whole = row_index.RowIndexBuilder('csv', stride=5)
+    whole.feed(content)
+    pieces = row_index.RowIndexBuilder('csv', stride=5)
+    for start in range(0, len(content), 7):  # Blocks split rows and quoted fields
+        pieces.feed(content[start:start + 7])
+    whole, pieces = whole.finish(), pieces.finish()
+    assert pieces.rows == whole.rows == 53
+    assert pieces.offsets.tolist() == whole.offsets.tolist()
+    assert len(whole.offsets) == 11
+
+
+def test_saved_upload_is_indexed(quoted_csv):
+    path, _ = quoted_csv
+    with open(path, 'rb') as source:
+        copy = path.replace('notes', 'copy')
+        index = row_index.save_stream(source, copy, block_size=7)
+    assert index.rows == 53
+    assert row_index.load_index(copy, build=False).rows == 53
+
+
+def test_ndjson_pages_and_samples(tmp_path):
+    path = str(tmp_path / 'events.ndjson')
+    with open(path, 'w') as out:
+        for i in range(40):
+            out.write(json.dumps({"n": i, "kind": "odd" if i % 2 else "even"}) + '\n')
+            if i % 7 == 0:
+                out.write('\n')
+    row_index.build_index(path, stride=4)
+    assert preview.row_count(path) == 40
+    assert preview.read_rows(path, 18, 4)["n"].tolist() == [18, 19, 20, 21]
+    sample = preview.sample_rows(path, 10, seed=3)
+    assert len(sample) == 10
+    assert sample["n"].tolist() == sorted(sample.index.tolist())
@@ -0,0 +1,57 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from scheduler import ImportScheduler
+
+
+def test_entry_left_running_is_claimed_again():
+    mongomock = pytest.importorskip('mongomock')
+    collection = mongomock.MongoClient().db.scheduled_imports
+    now = datetime.utcnow().replace(microsecond=0)
+    stale = collection.insert_one({"time": now - timedelta(minutes=5), "status": "running",
+                                   "lease_until": now - timedelta(minutes=1)}).inserted_id
+    legacy = collection.insert_one({"time": now - timedelta(minutes=5), "status": "running"}).inserted_id
+    leased = collection.insert_one({"time": now - timedelta(minutes=5), "status": "running",
+                                    "lease_until": now + timedelta(hours=1)}).inserted_id
+    ran, done = [], threading.Event()
+
+    def run_import(job, entry):
+        ran.append(entry["_id"])
+        if len(ran) == 2:
+            done.set()
+
+    ImportScheduler(collection, run_import, default_concurrency=2, lease_seconds=60).start()
+    assert done.wait(10)
+    assert sorted(ran) == sorted([stale, legacy])
+    assert collection.find_one({"_id": leased})["status"] == "running"
+
+
+@pytest.mark.parametrize('option, value', [('interval_seconds', -10), ('interval_seconds', 'hourly'),
+                                           ('max_concurrency', 0), ('max_concurrency', -1)])
+def test_schedule_rejects_non_positive_options(apps, option, value):
+    _, module8_client = apps
+    response = module8_client.post('/api/data/schedule-import', json={'time': '2030-01-01T00:00:00', option: value})
+    assert response.status_code == 400
+    assert option in response.get_json()["message"]
+
+
+def test_stored_negative_interval_does_not_repeat():
+    scheduler = ImportScheduler(None, None)
+    assert scheduler._next_run({"time": datetime.utcnow(), "interval_seconds": -10}) is None
+
+
+def test_failed_status_write_still_frees_the_slot():
+    class FailingCollection:
+        def update_one(self, *args, **kwargs):
+            raise RuntimeError("connection reset")
+
+    scheduler = ImportScheduler(FailingCollection(), lambda job, entry: None)
+    entry = {"_id": 1, "time": datetime.utcnow(), "source": "s.csv"}
+    scheduler._leased.add(1)
+    scheduler._running["s.csv"] = 1
+    with pytest.raises(RuntimeError):
+        scheduler._run(None, entry)
+    assert not scheduler._leased
+    assert scheduler._running["s.csv"] == 0
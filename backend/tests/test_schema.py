@@ -0,0 +1,22 @@
+import pandas as pd
+import pytest
+
+from schema import apply_schema, infer_schema
+
+
+def test_year_month_looking_floats_stay_numeric():
+    raw = pd.DataFrame({"value": ['2019.05', '1999.12', '2001.10', '1850.07'],
+                        "Period": ['2019.05', '1999.12', '2001.10', '1850.07']})
+    types = {entry["name"]: entry for entry in infer_schema(raw)}
+    assert types["value"]["type"].startswith('float')
+    assert types["Period"]["type"] == 'datetime'
+    typed = apply_schema(raw, list(types.values()))
+    assert typed["value"].tolist() == pytest.approx([2019.05, 1999.12, 2001.10, 1850.07], rel=1e-6)
+    assert typed["Period"][0] == pd.Timestamp('2019-05-01')
+
+
+def test_narrowest_types():
+    raw = pd.DataFrame({"id": ['1', '2', '300'], "flag": ['true', 'False', 'TRUE'], "zip": ['007', '010', '123'],
+                        "when": ['2020-01-02', '2020-03-04 05:06', None]})
+    types = {entry["name"]: entry["type"] for entry in infer_schema(raw)}
+    assert types == {"id": 'int16', "flag": 'bool', "zip": 'string', "when": 'datetime'}
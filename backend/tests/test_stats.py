@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import cleaning
+import stats
+from dataset_cache import iter_chunks
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(1)
+    data = pd.DataFrame({"x": rng.normal(10, 3, 1000), "y": rng.exponential(2, 1000), "label": list('abcd') * 250})
+    data.loc[rng.choice(1000, 80, replace=False), "x"] = np.nan
+    data.loc[rng.choice(1000, 30, replace=False), "y"] = np.nan
+    return data
+
+
+def read_back(path):
+    return pd.concat(iter_chunks(path), ignore_index=True)
+
+
+def test_merged_moments_match_one_pass(frame):
+    numeric = frame[["x", "y"]]
+    left, right = stats.RunningMoments(), stats.RunningMoments()
+    for start in range(0, 600, 70):
+        left.update(numeric.iloc[start:min(start + 70, 600)])
+    right.update(numeric.iloc[600:])
+    left.merge(right)
+    pd.testing.assert_series_equal(left.means(), numeric.mean())
+    pd.testing.assert_series_equal(left.stds(), numeric.std())
+
+
+def test_merged_digests_approximate_quantiles(frame):
+    values = frame["y"].to_numpy()
+    digest, other = stats.TDigest(), stats.TDigest()
+    for start in range(0, 500, 100):
+        digest.update(values[start:start + 100])
+    other.update(values[500:])
+    digest.merge(other)
+    for q in (0.1, 0.5, 0.9):
+        assert digest.quantile(q) == pytest.approx(np.nanquantile(values, q), rel=0.02)
+
+
+@pytest.mark.parametrize('strategy', ['mean', 'median', 'mode'])
+def test_streaming_fill_matches_in_memory(tmp_path, frame, strategy):
+    path = str(tmp_path / 'data.csv')
+    frame.to_csv(path, index=False)
+    out_path, _ = stats.fill_missing_file(path, strategy, exact=True, chunk_rows=128)
+    expected, _ = cleaning.fill_missing(frame, strategy)
+    pd.testing.assert_frame_equal(read_back(out_path), expected, check_exact=False)
+
+
+def test_streaming_normalize_matches_in_memory(tmp_path, frame):
+    path = str(tmp_path / 'data.csv')
+    frame.to_csv(path, index=False)
+    out_path, _, _ = stats.normalize_file(path, chunk_rows=128)
+    expected, _ = cleaning.normalize(frame)
+    pd.testing.assert_frame_equal(read_back(out_path), expected, check_exact=False)
+
+
+def test_mode_ties_go_to_the_smallest_value():
+    first, merged = stats.HeavyHitters(None), stats.HeavyHitters(None)
+    first.update(pd.Series([5.0, 3.0, 4.0]))
+    assert first.mode() == 3.0
+    merged.merge(first)
+    merged.update(pd.Series([1.0]))
+    assert merged.mode() == 1.0
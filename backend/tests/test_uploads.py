@@ -0,0 +1,57 @@
+import io
+
+import pandas as pd
+import pytest
+
+from conftest import MODULE9_PREFIX
+
+
+def xlsx_bytes():
+    pytest.importorskip('openpyxl')
+    buffer = io.BytesIO()
+    pd.DataFrame({"Series_reference": ["A", "B"], "Period": ["2020.01", "2020.02"], "value": [1.5, 2.5]}) \
+        .to_excel(buffer, index=False)
+    buffer.seek(0)
+    return buffer
+
+
+def test_xlsx_upload_is_not_taken_for_a_zip(apps):
+    client, module8_client = apps
+    response = module8_client.post('/api/data/upload', data={'file': (xlsx_bytes(), 'sheet.xlsx')},
+                                   content_type='multipart/form-data')
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()["metadata"]["row_count"] == 2
+
+    response = client.post(MODULE9_PREFIX + '/import', data={'file': (xlsx_bytes(), 'sheet.xlsx')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()["file_id"]
+
+
+def test_same_named_imports_keep_their_own_data(apps):
+    client, _ = apps
+
+    def imported(name, content):
+        response = client.post(MODULE9_PREFIX + '/import', data={'file': (io.BytesIO(content), name)},
+                               content_type='multipart/form-data')
+        return response.get_json()["file_id"]
+
+    first = imported('d.csv', b"a,b\n1,x\n2,y\n")
+    second = imported('d.json', b'[{"a": 10, "b": "z"}]')
+    third = imported('d.csv', b"a,b\n3,w\n")
+    from dataset_cache import dataset_cache
+    for file_id in (first, second, third):
+        dataset_cache.invalidate(file_id)  # Read back from disk
+    rows = {file_id: client.get(MODULE9_PREFIX + f'/preview?file_id={file_id}').get_json()["rows"]
+            for file_id in (first, second, third)}
+    assert [row["a"] for row in rows[first]] == [1, 2]
+    assert [row["a"] for row in rows[second]] == [10]
+    assert [row["a"] for row in rows[third]] == [3]
+
+
+def test_empty_csv_upload_imports_no_rows(apps):
+    _, module8_client = apps
+    response = module8_client.post('/api/data/upload', data={'file': (io.BytesIO(b''), 'empty.csv')},
+                                   content_type='multipart/form-data')
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()["metadata"]["row_count"] == 0
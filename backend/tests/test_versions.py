@@ -0,0 +1,23 @@
+import io
+
+from conftest import MODULE9_PREFIX
+
+
+def test_rollback_restores_its_own_dataset(apps):
+    client, _ = apps
+
+    def imported(content):
+        response = client.post(MODULE9_PREFIX + '/import', data={'file': (io.BytesIO(content), 'v.csv')},
+                               content_type='multipart/form-data')
+        return response.get_json()["file_id"]
+
+    first = imported(b"a,b\n1,x\n1,x\n2,y\n")
+    second = imported(b"a,b\n7,p\n7,p\n8,q\n9,r\n")
+    for file_id in (first, second):
+        response = client.post(MODULE9_PREFIX + '/remove_duplicates', json={'file_id': file_id})
+        assert response.get_json()["version"] == 1
+
+    response = client.post(MODULE9_PREFIX + '/rollback', json={'file_id': first, 'version': 0})
+    assert response.status_code == 200, response.get_json()
+    rows = client.get(MODULE9_PREFIX + f'/preview?file_id={first}').get_json()["rows"]
+    assert [row["a"] for row in rows] == [1, 1, 2]
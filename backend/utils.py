@@ -3,7 +3,7 @@ import logging
 from datetime import datetime
 
 # Allowed file extensions
-ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'json'}
+ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'json', 'ndjson', 'jsonl'}
 
 # Setup logging configuration
 logging.basicConfig(
@@ -0,0 +1,224 @@
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from dataset_cache import ChunkWriter, dataset_path, iter_chunks, replacing, write_working_copy
+from schema import apply_schema
+
+# Fields of a module9 record that describe its versions
+RECORD_FIELDS = ('version_base_path', 'base_version', 'version', 'versions')
+
+
+# Deltas: each mutating op is stored as the change it made to the previous
+# version, not as a copy of the result. Positions are row numbers in that
+# previous version.
+
+def drop_delta(dropped, total_rows):
+    """Rows removed (e.g. duplicates), as a bitmap over the previous version's rows."""
+    bits = np.zeros(total_rows, dtype=bool)
+    bits[np.asarray(dropped, dtype=np.int64)] = True
+    return {"kind": "drop", "rows": int(total_rows), "bitmap": np.packbits(bits)}
+
+
+def patch_delta(cells, values):
+    """Cells set to a value (e.g. filled nulls): positions per column and the value written there."""
+    return {
+        "kind": "patch",
+        "cells": {column: (np.asarray(positions, dtype=np.int64), values[column])
+                  for column, positions in cells.items() if len(positions)}
+    }
+
+
+def affine_delta(mean, std):
+    """Columns rescaled as (x - shift) / scale (e.g. normalized), one shift and scale per column."""
+    return {"kind": "affine", "shift": mean, "scale": std}
+
+
+def null_positions(data, columns):
+    """Positions of the missing cells of each column, as a fill would patch them."""
+    return {column: np.flatnonzero(data[column].isna().to_numpy()) for column in columns if column in data.columns}
+
+
+def file_null_positions(path, columns, chunk_rows=None):
+    """null_positions for a dataset file, one chunk at a time."""
+    found, offset = {column: [] for column in columns}, 0
+    for chunk in iter_chunks(path, chunk_rows):
+        for column, positions in null_positions(chunk, columns).items():
+            found[column].append(positions + offset)
+        offset += len(chunk)
+    return {column: np.concatenate(parts) for column, parts in found.items() if parts}
+
+
+def apply_delta(chunk, delta, start):
+    """Apply a delta to a chunk holding rows [start, start + len(chunk)) of the version it was taken against."""
+    stop = start + len(chunk)
+    if delta["kind"] == "drop":
+        bits = np.unpackbits(delta["bitmap"], count=delta["rows"])[start:stop].astype(bool)
+        return chunk[~bits]
+    if delta["kind"] == "patch":
+        for column, (positions, value) in delta["cells"].items():
+            inside = positions[(positions >= start) & (positions < stop)] - start
+            if len(inside):
+                mask = np.zeros(len(chunk), dtype=bool)
+                mask[inside] = True
+                # In the column's own dtype, as fillna writes it (a float64 mean into float32 stays float32)
+                chunk[column] = chunk[column].mask(mask, value).astype(chunk[column].dtype)
+        return chunk
+    if delta["kind"] == "affine":
+        columns = list(delta["shift"].index)
+        chunk = chunk.copy()
+        chunk[columns] = (chunk[columns] - delta["shift"]) / delta["scale"]
+        return chunk
+    raise ValueError(f"Unknown delta kind: {delta['kind']}")
+
+
+# Version store: <file_id>.versions/ holds the base (the oldest version still
+# restorable) and one delta file per later version. The head is the
+# dataset's working copy itself, so reads never pay for versioning.
+
+def versions_dir(file_record):
+    """<upload folder>/<file_id>.versions; a store made before it was keyed by file_id stays where its base is."""
+    if file_record.get('version_base_path'):
+        return os.path.dirname(file_record['version_base_path'])
+    return os.path.join(os.path.dirname(file_record['file_path']), f"{file_record['file_id']}.versions")
+
+
+def delta_path(file_record, version):
+    return os.path.join(versions_dir(file_record), f'{version}.delta')
+
+
+def link_or_copy(source, path):
+    """Hard-link source at path, copying it where links are not possible."""
+    if os.path.exists(path):
+        os.remove(path)
+    try:
+        os.link(source, path)
+    except OSError:
+        shutil.copyfile(source, path)
+
+
+def create_base(file_record):
+    """
+    Start versioning a dataset: its current state becomes version 0. A
+    working copy is hard-linked, which costs no space because every write
+    replaces it with a new file; the original upload is copied, since
+    export writes over it.
+    """
+    source = dataset_path(file_record)
+    os.makedirs(versions_dir(file_record), exist_ok=True)
+    base_path = os.path.join(versions_dir(file_record), 'base' + os.path.splitext(source)[1])
+    if source == file_record['file_path']:
+        shutil.copyfile(source, base_path)
+    else:
+        link_or_copy(source, base_path)
+    file_record.update({'version_base_path': base_path, 'base_version': 0, 'version': 0, 'versions': []})
+    return base_path
+
+
+def add_version(file_record, operation, deltas):
+    """Save an op's deltas as the next version after the head and make it the head."""
+    version = file_record['version'] + 1
+    path = delta_path(file_record, version)
+    pd.to_pickle(deltas, path)
+    entry = {
+        "version": version,
+        "operation": operation,
+        "kinds": [delta["kind"] for delta in deltas],
+        "delta_bytes": os.path.getsize(path),
+        "created_at": datetime.now()
+    }
+    file_record['versions'].append(entry)
+    file_record['version'] = version
+    return entry
+
+
+def restorable(file_record, version):
+    """Whether a version can still be rebuilt: not folded into the base, not past the head."""
+    return file_record.get('base_version', 0) <= version <= file_record.get('version', 0)
+
+
+def _base_chunks(file_record, chunk_rows=None):
+    path = file_record['version_base_path']
+    if path.endswith('.csv') and file_record.get('schema'):
+        # An original upload: parse as text and apply the import schema, as load_dataset does
+        for chunk in pd.read_csv(path, dtype=str, chunksize=chunk_rows or Config.CHUNK_ROWS):
+            yield apply_schema(chunk, file_record['schema'])
+    else:
+        yield from iter_chunks(path, chunk_rows)
+
+
+def iter_version(file_record, version, chunk_rows=None):
+    """
+    Yield a version of the dataset chunk by chunk: base chunks with every
+    delta up to that version applied in order. Each delta only needs the
+    rows of the chunk in hand, so memory stays at one chunk.
+    """
+    if not restorable(file_record, version):
+        raise ValueError(f"Version {version} is not available.")
+    deltas = []
+    for number in range(file_record['base_version'] + 1, version + 1):
+        deltas.extend(pd.read_pickle(delta_path(file_record, number)))
+    offsets = [0] * len(deltas)
+    for chunk in _base_chunks(file_record, chunk_rows):
+        for i, delta in enumerate(deltas):
+            start, offsets[i] = offsets[i], offsets[i] + len(chunk)
+            chunk = apply_delta(chunk, delta, start)
+        yield chunk.reset_index(drop=True)
+
+
+def rebuild(file_record, version, out_path, chunk_rows=None):
+    """Write a version of the dataset to out_path (Feather, CSV or pickle, by extension)."""
+    source = file_record['version_base_path']
+    if out_path.endswith('.pkl'):
+        chunks = list(iter_version(file_record, version, chunk_rows))
+        write_working_copy(pd.concat(chunks, ignore_index=True), out_path)
+        return out_path
+    with replacing(out_path) as temp_path:
+        writer = ChunkWriter(temp_path, source if source.endswith('.feather') else None)
+        try:
+            for chunk in iter_version(file_record, version, chunk_rows):
+                writer.write(chunk)
+        finally:
+            writer.close()
+    return out_path
+
+
+def discard_after(file_record, version):
+    """Drop the versions after version, e.g. on rollback."""
+    for entry in file_record['versions']:
+        if entry['version'] > version and os.path.exists(delta_path(file_record, entry['version'])):
+            os.remove(delta_path(file_record, entry['version']))
+    file_record['versions'] = [entry for entry in file_record['versions'] if entry['version'] <= version]
+    file_record['version'] = version
+
+
+def compact(file_record, max_deltas=None):
+    """
+    Keep the delta chain short: once more than max_deltas versions sit on
+    top of the base, rebuild a newer base and delete the deltas folded into
+    it, leaving half the limit restorable. Returns the new base version, or
+    None when nothing was folded.
+    """
+    max_deltas = max_deltas or Config.VERSION_MAX_DELTAS
+    if file_record['version'] - file_record['base_version'] <= max_deltas:
+        return None
+    new_base = file_record['version'] - max_deltas // 2
+    base_path = file_record['version_base_path']
+    if os.path.splitext(base_path)[1] == '.csv':
+        # An uploaded CSV base becomes a working copy format base
+        base_path = os.path.join(versions_dir(file_record), 'base' + os.path.splitext(dataset_path(file_record))[1])
+    temp_path = os.path.join(versions_dir(file_record), 'base.part' + os.path.splitext(base_path)[1])
+    rebuild(file_record, new_base, temp_path)
+    if base_path != file_record['version_base_path']:
+        os.remove(file_record['version_base_path'])
+    os.replace(temp_path, base_path)
+    for entry in file_record['versions']:
+        if entry['version'] <= new_base and not entry.get('compacted'):
+            os.remove(delta_path(file_record, entry['version']))
+            entry['compacted'] = True
+    file_record.update({'version_base_path': base_path, 'base_version': new_base})
+    return new_base